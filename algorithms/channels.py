@@ -0,0 +1,56 @@
+import numpy as np
+import cv2
+from skimage import color
+
+# values of the 'color mode' parameter of the deconvolution algorithms
+GRAYSCALE = 0       # RGB input is converted to grayscale
+RGB = 1             # every RGB channel is deconvolved
+LUMINANCE = 2       # only the luminance (Y of YCrCb) is deconvolved, chroma channels are kept
+
+
+def split_channels(img, color_mode=GRAYSCALE):
+    """Returns the planes to deconvolve as a (C, H, W) float32 array normalized to [0, 1]
+    and the state merge_channels needs to put the result back together."""
+    if len(img.shape) != 3 or color_mode == GRAYSCALE:
+        state = {'mode': GRAYSCALE, 'dtype': img.dtype}
+        if len(img.shape) == 3:
+            img = color.rgb2gray(img)
+        img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+        return img[np.newaxis], state
+
+    # channels are normalized together to keep the colour balance
+    rgb = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+    state = {'mode': color_mode, 'dtype': img.dtype}
+
+    if color_mode == LUMINANCE:
+        ycrcb = cv2.cvtColor(rgb, cv2.COLOR_RGB2YCrCb)
+        state['ycrcb'] = ycrcb
+        return ycrcb[np.newaxis, :, :, 0].copy(), state
+    if color_mode == RGB:
+        return np.ascontiguousarray(rgb.transpose(2, 0, 1)), state
+    raise ValueError(f"Invalid color mode {color_mode}. Expected {GRAYSCALE} (grayscale), {RGB} (RGB) "
+                     f"or {LUMINANCE} (luminance only).")
+
+
+def merge_channels(planes, state):
+    """Turns deconvolved planes back into an output image of the input dtype, grayscale or RGB
+    (float inputs give float32 scaled to [0, 255])."""
+    if state['mode'] == GRAYSCALE:
+        rgb = planes[0]
+    elif state['mode'] == LUMINANCE:
+        ycrcb = state['ycrcb']
+        ycrcb[:, :, 0] = planes[0]
+        rgb = cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB)
+    else:
+        rgb = planes.transpose(1, 2, 0)
+
+    return to_dtype(rgb, state['dtype'])
+
+
+def to_dtype(img, dtype):
+    """Converts an image normalized to [0, 1] to dtype, float dtypes give float32 scaled to [0, 255]."""
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        maximum = np.iinfo(dtype).max
+        return np.rint(np.clip(img, 0, 1) * maximum).astype(dtype)
+    return (img * 255).astype(np.float32)
@@ -1,36 +1,225 @@
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import cv2
-from skimage import color
+from scipy.signal import fftconvolve, oaconvolve
+from algorithms.threads import get_cpu_count
 
+# kernels of this size and bigger are correlated in the frequency domain by correlate_valid. Unlike the crossover of
+# correlate_same it is not measured: the direct path it is compared with is the shifted-accumulate, one NumPy pass
+# per kernel weight, which loses to the FFT from about 5x5 on any machine, while the cv2.filter2D of correlate_same
+# is vectorized and its crossover with the FFT depends on the machine (often no probed size at all).
+FFT_KERNEL_SIZE = 5
 
-def my_convolution(img, kernel):
+# kernels are split into at most this many (column, row) pairs of 1D kernels
+SEPARABLE_MAX_RANK = 3
+# singular values below this fraction of the largest one are treated as zero
+SEPARABLE_TOLERANCE = 1e-6
+# float results of integer images this close to an integer are taken as that integer before they are truncated
+INTEGER_TOLERANCE = 1e-6
+
+# row bands per worker thread, more than one evens out bands finishing at different times
+BANDS_PER_WORKER = 2
+MIN_BAND_HEIGHT = 32
+# row bands of a single-threaded run reporting progress, so a cancellation is noticed before the whole image is done
+PROGRESS_BANDS = 8
+
+# image and kernel sizes timed to find where overlap-add FFT correlation beats the direct one
+CROSSOVER_PROBE_SIZE = 512
+CROSSOVER_KERNEL_SIZES = (3, 7, 11, 15, 23, 31, 47, 63)
+
+
+def my_convolution(img, kernel, workers=1, progress=None):
+    kernel = np.asarray(kernel)
     kernel_shape = kernel.shape
     if len(kernel_shape) != 2 or kernel_shape[0] != kernel_shape[1]:
         raise ValueError("Kernel is not a square matrix.")
 
-    shape = img.shape
-    if len(shape) == 3:
-        return np.dstack([my_convolution(img[:, :, z], kernel) for z in range(3)])
-
-    result = img.copy()
-
     size = kernel_shape[0]
     if size % 2 == 0:
         raise ValueError("Invalid kernel, size should be an odd number.")
 
+    shape = img.shape
+    result = img.copy()
+
     Y, X = shape[0], shape[1]
-    offset = int(size / 2)
+    offset = size // 2
+    if Y <= 2 * offset or X <= 2 * offset:
+        return result
+
+    if len(shape) == 3:
+        channels = [(img[:, :, z], result[:, :, z]) for z in range(3)]
+    else:
+        channels = [(img, result)]
+
+    if workers <= 0:
+        workers = get_cpu_count()
+    bands = get_row_bands(Y, offset, workers if progress is None or workers > 1 else PROGRESS_BANDS // BANDS_PER_WORKER)
+
+    # border pixels (closer than offset to the edge) are left unchanged
+    def convolve_band(task):
+        (source, target), (start, stop) = task
+        target[start:stop, offset:X - offset] = correlate_valid(source[start - offset:stop + offset], kernel)
+
+    tasks = [(channel, band) for channel in channels for band in bands]
+    if workers == 1 or len(tasks) == 1:
+        for i, task in enumerate(tasks):
+            convolve_band(task)
+            if progress is not None:
+                progress.update(i + 1, len(tasks))
+    else:
+        # numpy, scipy.fft and OpenCV release the GIL, so the bands run in parallel on threads
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for i, future in enumerate(as_completed([executor.submit(convolve_band, task) for task in tasks])):
+                future.result()
+                if progress is not None:
+                    progress.update(i + 1, len(tasks))
+        finally:
+            # on an error or a cancellation the bands not started yet are dropped
+            executor.shutdown(cancel_futures=True)
+
+    return result
+
+
+def get_row_bands(height, offset, workers):
+    """Splits the output rows (offset, height - offset) into bands, each read with an offset-sized halo."""
+    rows = height - 2 * offset
+    if workers == 1:
+        return [(offset, height - offset)]
+    count = max(1, min(workers * BANDS_PER_WORKER, rows // MIN_BAND_HEIGHT))
+    edges = np.linspace(offset, height - offset, count + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def correlate_valid(img, kernel):
+    """Correlates a 2D image with a kernel, returning only the 'valid' part (no padding).
 
-    for j in range(offset, Y-offset):
-        for i in range(offset, X-offset):
-            start = i - offset
-            end = i + offset
-            context = np.array([img[index, start:end + 1] for index in range(j - offset, j + offset + 1)])
-            result[j][i] = np.sum(context * kernel)
+    Integer images correlated with float kernels give the exact result up to INTEGER_TOLERANCE, so truncating it
+    to the image dtype does not depend on the rounding errors of the path taken."""
+    dtype = np.result_type(img.dtype, kernel.dtype)
+    if np.issubdtype(dtype, np.integer):     # integer results stay exact with dense paths
+        result = _correlate_fft(img, kernel, dtype) if kernel.shape[0] >= FFT_KERNEL_SIZE \
+            else _correlate_shifted(img, kernel, dtype)
+    else:
+        factors = separate_kernel(kernel)
+        if factors is not None:
+            result = _correlate_separable(img, factors, kernel.shape, dtype)
+        elif kernel.shape[0] >= FFT_KERNEL_SIZE:
+            result = _correlate_fft(img, kernel, dtype)
+        else:
+            result = _correlate_shifted(img, kernel, dtype)
 
+        if np.issubdtype(img.dtype, np.integer):
+            nearest = np.rint(result)
+            result = np.where(np.abs(result - nearest) <= INTEGER_TOLERANCE, nearest, result)
     return result
 
 
+def _correlate_shifted(img, kernel, dtype):
+    # shifted-accumulate: one multiply-add pass over the image per nonzero kernel weight
+    kh, kw = kernel.shape
+    h, w = img.shape[0] - kh + 1, img.shape[1] - kw + 1
+    img = img.astype(dtype, copy=False)
+    acc = np.zeros((h, w), dtype=dtype)
+    tmp = np.empty_like(acc)
+    for dy in range(kh):
+        for dx in range(kw):
+            weight = kernel[dy, dx]
+            if weight == 0:
+                continue
+            np.multiply(img[dy:dy + h, dx:dx + w], weight, out=tmp)
+            acc += tmp
+    return acc
+
+
+def correlate_same(img, kernel):
+    """Correlates a 2D float image with a kernel, zero padded, returning an image of the same size.
+
+    Kernels smaller than the crossover measured by direct_fft_crossover are correlated directly,
+    bigger ones with an overlap-add FFT convolution."""
+    if max(kernel.shape) < direct_fft_crossover():
+        return cv2.filter2D(img, -1, kernel, borderType=cv2.BORDER_CONSTANT)
+    return oaconvolve(img, kernel[::-1, ::-1], mode='same')
+
+
+@functools.lru_cache(maxsize=None)
+def direct_fft_crossover():
+    """Smallest kernel size for which overlap-add FFT correlation was faster than the direct one on this machine.
+
+    Measured once per process, returns infinity when the direct correlation always won."""
+    probe = np.random.default_rng(0).random((CROSSOVER_PROBE_SIZE, CROSSOVER_PROBE_SIZE)).astype(np.float32)
+    for size in CROSSOVER_KERNEL_SIZES:
+        kernel = np.full((size, size), 1 / size ** 2, dtype=np.float32)
+        direct = _best_time(lambda: cv2.filter2D(probe, -1, kernel, borderType=cv2.BORDER_CONSTANT))
+        overlap_add = _best_time(lambda: oaconvolve(probe, kernel, mode='same'))
+        if overlap_add < direct:
+            return size
+    return float('inf')
+
+
+def _best_time(func, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def separate_kernel(kernel):
+    """Splits a kernel into a list of (column, row) 1D kernels whose outer products sum up to it.
+
+    Returns None when the kernel's rank is too high for the 1D passes to be cheaper than a dense one.
+    Factorizations are cached per kernel content."""
+    kernel = np.ascontiguousarray(kernel)
+    return _separate_kernel(kernel.tobytes(), kernel.shape, kernel.dtype.str)
+
+
+@functools.lru_cache(maxsize=64)
+def _separate_kernel(data, shape, dtype):
+    kernel = np.frombuffer(data, dtype=dtype).reshape(shape).astype(np.float64)
+    if kernel.ndim != 2 or not np.all(np.isfinite(kernel)):
+        return None
+
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0:
+        return None
+    rank = int(np.sum(s > s[0] * SEPARABLE_TOLERANCE))
+
+    # r pairs cost r * (kh + kw) multiply-adds per pixel, a dense pass costs kh * kw
+    if rank > SEPARABLE_MAX_RANK or rank * (shape[0] + shape[1]) >= shape[0] * shape[1]:
+        return None
+
+    factors = []
+    for i in range(rank):
+        scale = np.sqrt(s[i])
+        column, row = u[:, i] * scale, vt[i] * scale
+        column.setflags(write=False)
+        row.setflags(write=False)
+        factors.append((column, row))
+    return tuple(factors)
+
+
+def _correlate_separable(img, factors, kernel_shape, dtype):
+    oy, ox = kernel_shape[0] // 2, kernel_shape[1] // 2
+    h, w = img.shape[0] - 2 * oy, img.shape[1] - 2 * ox
+    img = img.astype(np.float64, copy=False)
+    acc = np.zeros((h, w), dtype=np.float64)
+    for column, row in factors:
+        # row pass followed by column pass, the border handling only affects the cropped margin
+        acc += cv2.sepFilter2D(img, cv2.CV_64F, row, column, borderType=cv2.BORDER_REPLICATE)[oy:oy + h, ox:ox + w]
+    return acc.astype(dtype, copy=False)
+
+
+def _correlate_fft(img, kernel, dtype):
+    result = fftconvolve(img.astype(np.float64), kernel[::-1, ::-1].astype(np.float64), mode='valid')
+    if np.issubdtype(dtype, np.integer):
+        result = np.rint(result)
+    return result.astype(dtype, copy=False)
+
+
 if __name__ == '__main__':
     image = cv2.imread('../input_images/lena_color_blurred.jpg', cv2.IMREAD_COLOR)
     kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
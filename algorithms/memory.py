@@ -0,0 +1,10 @@
+def get_memory_status(field):
+    # VmRSS is the current and VmHWM the peak resident set size of this process, in bytes, Linux only
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
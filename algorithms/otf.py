@@ -0,0 +1,185 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy import fft
+from skimage.restoration import uft
+from algorithms.convolution import separate_kernel
+
+OTF_CACHE_MAX_BYTES = 512 * 2 ** 20
+# upper bound of the spectra filtered at once by a parameter sweep
+SWEEP_MAX_BYTES = 256 * 2 ** 20
+
+
+class OTFCache:
+    """Least recently used cache of transfer functions, bounded by their total size in bytes.
+
+    Entries are keyed by a hash of the PSF bytes, the target shape and dtype, and the kind of transform,
+    so the cache can be shared by every FFT based algorithm. Cached arrays are read-only."""
+
+    def __init__(self, max_bytes=OTF_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind, psf, shape, dtype, compute):
+        psf = np.ascontiguousarray(psf)
+        key = (kind, hashlib.sha1(psf.tobytes()).hexdigest(), psf.shape, psf.dtype.str,
+               tuple(int(n) for n in shape), np.dtype(dtype).str)
+
+        with self._lock:
+            otf = self._entries.get(key)
+            if otf is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return otf
+            self.misses += 1
+
+        otf = compute()
+        otf.setflags(write=False)
+        if otf.nbytes > self.max_bytes:
+            return otf
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = otf
+                self.nbytes += otf.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return otf
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.nbytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+otf_cache = OTFCache()
+
+
+def psf2otf(psf, shape, real=False, dtype=np.complex128):
+    """Transfer function of a PSF centered at the origin, zero padded to the given shape.
+
+    With real=True only the non-negative frequencies of the last axis are returned, matching rfft2."""
+    if np.all(psf == 0):
+        return np.zeros_like(psf)
+    if real:
+        return otf_cache.get('psf2rotf', psf, shape, dtype, lambda: _psf2rotf(psf, shape).astype(dtype))
+    return otf_cache.get('psf2otf', psf, shape, dtype, lambda: _psf2otf(psf, shape).astype(dtype, copy=False))
+
+
+def fast_shape(shape):
+    """Smallest shape not smaller than the given one whose sides are 5-smooth, i.e. fast real FFT lengths."""
+    return tuple(fft.next_fast_len(int(n), real=True) for n in shape)
+
+
+def pad_to_shape(img, shape):
+    """Pads the bottom and right edges of an image (or a stack of planes) to the given shape by mirroring it."""
+    leading = img.ndim - len(shape)
+    pad = [(0, 0)] * leading + [(0, target - n) for n, target in zip(img.shape[leading:], shape)]
+    if not any(after for _, after in pad):
+        return img
+    return np.pad(img, pad, mode='symmetric')
+
+
+def sweep_chunks(count, item_bytes, max_bytes=SWEEP_MAX_BYTES):
+    """Slices splitting count swept values into chunks whose stacked spectra fit in max_bytes."""
+    size = max(1, int(max_bytes // max(item_bytes, 1)))
+    return [slice(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def skimage_transfer_functions(psf, shape):
+    """Returns the psf (or its transfer function) and the regularization transfer function
+    to pass to skimage.restoration wiener functions for a real image of the given shape."""
+    reg_impulse_response = uft.laplacian(len(shape), (3,) * len(shape))[1]
+    reg = otf_cache.get('ir2tf', reg_impulse_response, shape, np.complex128,
+                        lambda: uft.ir2tf(reg_impulse_response, shape, is_real=True))
+    trans_func = otf_cache.get('ir2tf', psf, shape, np.complex128, lambda: uft.ir2tf(psf, shape, is_real=True))
+
+    # skimage only keeps the real part of a given transfer function, which is exact for symmetric PSFs only
+    if np.allclose(trans_func.imag, 0):
+        return trans_func, reg
+    return psf, reg
+
+
+def _psf2otf(psf, shape):
+    inshape = psf.shape
+
+    factors = separate_kernel(psf)
+    if factors is not None:
+        # separable PSF: the 2D transform is a sum of outer products of 1D transforms
+        otf = sum(np.outer(psf2otf_1d(column, shape[0]), psf2otf_1d(row, shape[1])) for column, row in factors)
+    else:
+        psf = zero_pad(psf, shape, position='corner')
+
+        for axis, axis_size in enumerate(inshape):
+            psf = np.roll(psf, -int(axis_size / 2), axis=axis)
+
+        otf = np.fft.fft2(psf)
+
+    n_ops = np.sum(np.prod(shape) * np.log2(shape))
+    otf = np.real_if_close(otf, tol=n_ops)
+
+    return otf
+
+
+def _psf2rotf(psf, shape):
+    factors = separate_kernel(psf)
+    if factors is not None:
+        return sum(np.outer(psf2otf_1d(column, shape[0]), psf2otf_1d(row, shape[1], real=True))
+                   for column, row in factors)
+
+    padded = zero_pad(psf, shape, position='corner')
+    padded = np.roll(padded, (-int(psf.shape[0] / 2), -int(psf.shape[1] / 2)), axis=(0, 1))
+    return fft.rfft2(padded)
+
+
+def psf2otf_1d(kernel, size, real=False):
+    padded = np.zeros(size, dtype=np.float64)
+    padded[:len(kernel)] = kernel
+    padded = np.roll(padded, -int(len(kernel) / 2))
+    return fft.rfft(padded) if real else fft.fft(padded)
+
+
+def zero_pad(image, shape, position='corner'):
+    shape = np.asarray(shape, dtype=int)
+    imshape = np.asarray(image.shape, dtype=int)
+
+    if np.all(imshape == shape):
+        return image
+
+    if np.any(shape <= 0):
+        raise ValueError("ZERO_PAD: null or negative shape given")
+
+    dshape = shape - imshape
+    if np.any(dshape < 0):
+        raise ValueError("ZERO_PAD: target size smaller than source one")
+
+    pad_img = np.zeros(shape, dtype=image.dtype)
+
+    if position == 'center':
+        if np.any(dshape % 2 != 0):
+            raise ValueError("ZERO_PAD: source and target shapes "
+                             "have different parity.")
+        offx, offy = dshape // 2
+    else:
+        offx, offy = (0, 0)
+
+    pad_img[offx:offx + imshape[0], offy:offy + imshape[1]] = image
+
+    return pad_img
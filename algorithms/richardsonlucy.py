@@ -1,103 +1,289 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 import cv2
-from scipy.signal import convolve2d
 from skimage import color
-
-
-def conv2(x, y, mode='same'):
-    return np.rot90(convolve2d(np.rot90(x, 2), np.rot90(y, 2), mode=mode), 2)
-
-
-def psf2otf(psf, shape):
-    if np.all(psf == 0):
-        return np.zeros_like(psf)
-
-    inshape = psf.shape
-
-    psf = zero_pad(psf, shape, position='corner')
-
-    for axis, axis_size in enumerate(inshape):
-        psf = np.roll(psf, -int(axis_size / 2), axis=axis)
-
-    otf = np.fft.fft2(psf)
-
-    n_ops = np.sum(psf.size * np.log2(psf.shape))
-    otf = np.real_if_close(otf, tol=n_ops)
-
-    return otf
-
-
-def zero_pad(image, shape, position='corner'):
-    shape = np.asarray(shape, dtype=int)
-    imshape = np.asarray(image.shape, dtype=int)
-
-    if np.alltrue(imshape == shape):
-        return image
-
-    if np.any(shape <= 0):
-        raise ValueError("ZERO_PAD: null or negative shape given")
-
-    dshape = shape - imshape
-    if np.any(dshape < 0):
-        raise ValueError("ZERO_PAD: target size smaller than source one")
-
-    pad_img = np.zeros(shape, dtype=image.dtype)
-
-    idx, idy = np.indices(imshape)
-
-    if position == 'center':
-        if np.any(dshape % 2 != 0):
-            raise ValueError("ZERO_PAD: source and target shapes "
-                             "have different parity.")
-        offx, offy = dshape // 2
-    else:
-        offx, offy = (0, 0)
-
-    pad_img[idx + offx, idy + offy] = image
-
-    return pad_img
-
-
-def my_RL_deconvolution(img, psf, iterations):
+from scipy import fft
+from algorithms.otf import psf2otf, fast_shape, pad_to_shape
+from algorithms.threads import get_cpu_count
+from algorithms.channels import split_channels, merge_channels, GRAYSCALE
+from algorithms.convolution import correlate_same
+from algorithms.spans import span
+
+# lower bound of the blurred estimate, keeps the ratio finite on black regions
+RL_EPSILON = 1e-7
+# upper bound of the extrapolation factor of the accelerated Richardson-Lucy
+RL_MAX_ACCELERATION = 0.99
+# upper bound of the total size of the workspaces kept as checkpoints
+RL_CHECKPOINT_MAX_BYTES = 1024 * 2 ** 20
+# iterations between two previews of the estimate
+RL_PREVIEW_EVERY = 5
+
+
+def my_RL_deconvolution(img, psf, iterations, progress=None, profiler=None):
     if len(img.shape) == 3:
         img = color.rgb2gray(img)
     img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-    latent_est = img.copy()
-    latent_est += 0.1
-    psf_hat = np.flipud(np.fliplr(psf))  # odwrocenie macierzy pionowo i poziomo
+    latent_est = img + np.float32(0.1)
+    psf = np.asarray(psf, dtype=np.float32)
+    psf_hat = np.ascontiguousarray(psf[::-1, ::-1])  # odwrocenie macierzy pionowo i poziomo
 
+    # convolution with the PSF is correlation with the flipped PSF and the other way round
     for i in range(iterations):
-        print('iter ' + str(i+1))
-        est_conv = conv2(latent_est, psf, 'same').astype(np.uint8)
-        relative_blur = img / est_conv
-        error_est = conv2(relative_blur, psf_hat, 'same').astype(np.uint8)
-        latent_est *= error_est
+        with span(profiler, 'RL iteration', {'iteration': i + 1}):
+            est_conv = correlate_same(latent_est, psf_hat)
+            np.maximum(est_conv, RL_EPSILON, out=est_conv)
+            relative_blur = np.divide(img, est_conv, out=est_conv)
+            latent_est *= correlate_same(relative_blur, psf)
+        if progress is not None:
+            progress.update(i + 1, iterations)
 
     return cv2.normalize(latent_est, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
 
 
-def my_RL_deconvolution_FFT(img, psf, iterations):
-    if len(img.shape) == 3:
-        img = color.rgb2gray(img)
-    img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+def my_RL_deconvolution_FFT(img, psf, iterations, color_mode=GRAYSCALE, tolerance=0.0, residual_tolerance=0.0,
+                            preview=None, preview_every=RL_PREVIEW_EVERY, checkpoint=False, progress=None,
+                            profiler=None):
+    return deconvolve_planes(img, psf, iterations, color_mode, tolerance, RLWorkspace, richardson_lucy,
+                             preview, preview_every, checkpoint, progress, profiler, residual_tolerance)
+
+
+def my_RL_deconvolution_accelerated(img, psf, iterations, color_mode=GRAYSCALE, tolerance=0.0,
+                                    residual_tolerance=0.0, preview=None, preview_every=RL_PREVIEW_EVERY,
+                                    checkpoint=False, progress=None, profiler=None):
+    return deconvolve_planes(img, psf, iterations, color_mode, tolerance, AcceleratedRLWorkspace,
+                             richardson_lucy_accelerated, preview, preview_every, checkpoint, progress, profiler,
+                             residual_tolerance)
+
+
+def deconvolve_planes(img, psf, iterations, color_mode, tolerance, workspace_class, run,
+                      preview=None, preview_every=RL_PREVIEW_EVERY, checkpoint=False, progress=None, profiler=None,
+                      residual_tolerance=0.0):
+    """Richardson-Lucy deconvolution of an image with the given workspace class and iteration function.
+
+    Iterations stop early at the tolerance and residual_tolerance of the iteration function (see richardson_lucy).
+
+    preview(image, iterations) is called with the current estimate every preview_every iterations.
+    With checkpoint=True the workspace is kept after the run, and a later call on the same image, PSF and colour
+    mode asking for at least as many iterations resumes from it instead of starting over.
+    progress.update(iterations, total) is called after every iteration, a run stopped at a tolerance ends with
+    fewer iterations than the total; a cancelled run still keeps its checkpoint.
+    With a profiler, the setup, every iteration and the merge of the channels are recorded as spans; the span of
+    the merge holds the number of iterations the estimate had and the number it was resumed from."""
+    key = rl_checkpoints.key(workspace_class, img, psf, color_mode) if checkpoint else None
+    workspace, channels_state = rl_checkpoints.take(key, iterations) if checkpoint else (None, None)
+    resumed = workspace.iterations if workspace is not None else 0
+    if workspace is None:
+        # all colour planes are deconvolved at once, the FFTs run over the last two axes
+        with span(profiler, 'RL setup'):
+            planes, channels_state = split_channels(img, color_mode)
+            workspace = workspace_class(planes, psf)
+
+    height, width = workspace.size
+    try:
+        while workspace.iterations < iterations:
+            step = iterations - workspace.iterations
+            if preview is not None:
+                step = min(step, preview_every - workspace.iterations % preview_every)
+            if progress is not None:
+                progress.check()
+            if progress is not None or profiler is not None:
+                step = 1
+            with span(profiler, 'RL iteration', {'iteration': workspace.iterations + 1}):
+                run(workspace, step, tolerance, residual_tolerance)
+            if progress is not None:
+                progress.update(workspace.iterations, iterations)
+            if workspace.converged:
+                break
+            if preview is not None and workspace.iterations % preview_every == 0 and workspace.iterations < iterations:
+                preview(merge_channels(workspace.estimate[:, :height, :width], channels_state), workspace.iterations)
+    except Exception:
+        # progress raises between iterations, the workspace is still consistent
+        if checkpoint and progress is not None and progress.cancelled:
+            rl_checkpoints.put(key, workspace, channels_state)
+        raise
+
+    if checkpoint:
+        rl_checkpoints.put(key, workspace, channels_state)
+    with span(profiler, 'RL merge', {'iterations': workspace.iterations, 'resumed': resumed}):
+        return merge_channels(workspace.estimate[:, :height, :width], channels_state)
+
+
+class RLCheckpoints:
+    """Least recently used Richardson-Lucy workspaces, bounded by their total size in bytes.
+
+    Entries are keyed by a hash of the input image and the PSF, the colour mode and the workspace class.
+    A workspace is taken out of the store while it is iterated, so an interrupted run never leaves
+    a half updated checkpoint behind."""
+
+    def __init__(self, max_bytes=RL_CHECKPOINT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, workspace_class, img, psf, color_mode):
+        img, psf = np.ascontiguousarray(img), np.ascontiguousarray(psf)
+        return (workspace_class.__name__, hashlib.sha1(img).hexdigest(), img.shape, img.dtype.str,
+                hashlib.sha1(psf).hexdigest(), psf.shape, psf.dtype.str, color_mode)
+
+    def take(self, key, iterations):
+        """Removes and returns the (workspace, channels state) checkpoint of the key,
+        or (None, None) when there is none with at most the given number of iterations."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None, None
+            self.nbytes -= entry[2]
+        if entry[0].iterations > iterations:
+            return None, None
+        return entry[0], entry[1]
+
+    def put(self, key, workspace, channels_state):
+        nbytes = workspace.nbytes()
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[2]
+            self._entries[key] = (workspace, channels_state, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+rl_checkpoints = RLCheckpoints()
+
+
+class RLWorkspace:
+    """Buffers of a Richardson-Lucy deconvolution of (C, H, W) float32 planes, padded to a fast FFT shape.
+
+    Iterations update the buffers in place, so a workspace can also be iterated further later on."""
+
+    def __init__(self, planes, psf):
+        self.size = planes.shape[1:]
+        self.shape = fast_shape(self.size)
+        self.observed = pad_to_shape(planes, self.shape).astype(np.float32, copy=False)
+        self.estimate = self.observed.copy()
+        self.work = np.empty_like(self.observed)
+        self.otf = psf2otf(psf, self.shape, real=True, dtype=np.complex64)
+        self.otf_conj = np.conj(self.otf)
+        self.observed_norm = max(float(np.linalg.norm(self.observed)), RL_EPSILON)
+        self.iterations = 0
+        self.relative_change = None
+        self.residual = None
+        self.converged = False      # the last run stopped at a tolerance
+
+    def nbytes(self):
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+
+    def blur(self, x, otf):
+        spectrum = fft.rfft2(x, workers=get_cpu_count())
+        spectrum *= otf
+        return fft.irfft2(spectrum, s=self.shape, overwrite_x=True, workers=get_cpu_count())
+
+    def correction(self, x, track_residual=False):
+        """Multiplicative update of an estimate x, the adjoint blur of observed / blurred x."""
+        blurred = self.blur(x, self.otf)
+        if track_residual:
+            np.subtract(self.observed, blurred, out=self.work)
+            self.residual = float(np.linalg.norm(self.work)) / self.observed_norm
+
+        np.maximum(blurred, RL_EPSILON, out=blurred)
+        np.divide(self.observed, blurred, out=blurred)
+        return self.blur(blurred, self.otf_conj)
+
+    def track_change(self, change):
+        norm = max(float(np.linalg.norm(self.estimate)), RL_EPSILON)
+        self.relative_change = float(np.linalg.norm(change)) / norm
+        return self.relative_change
+
+
+class AcceleratedRLWorkspace(RLWorkspace):
+    """Richardson-Lucy workspace with the extra buffers of the vector extrapolation."""
+
+    def __init__(self, planes, psf):
+        super().__init__(planes, psf)
+        self.previous = self.estimate.copy()
+        self.predicted = np.empty_like(self.estimate)
+        self.step = np.zeros_like(self.estimate)
+        self.previous_step = np.zeros_like(self.estimate)
+        self.alpha = 0.0
+
+
+def richardson_lucy(workspace, iterations, tolerance=0.0, residual_tolerance=0.0):
+    """Runs up to the given number of Richardson-Lucy iterations on a workspace.
+
+    Stops early when the relative change of the estimate drops below tolerance or the relative residual
+    of the blurred estimate below residual_tolerance, which sets workspace.converged.
+    Returns the number of iterations run by this call."""
+    estimate, work = workspace.estimate, workspace.work
+    workspace.converged = False
+
+    for i in range(iterations):
+        correction = workspace.correction(estimate, residual_tolerance > 0)
+        if residual_tolerance > 0 and workspace.residual < residual_tolerance:
+            workspace.converged = True
+            return i
+
+        # estimate * correction written as estimate + estimate * (correction - 1) to measure the change
+        np.subtract(correction, 1, out=work)
+        work *= estimate
+        estimate += work
+        workspace.iterations += 1
+
+        if tolerance > 0 and workspace.track_change(work) < tolerance:
+            workspace.converged = True
+            return i + 1
+
+    return iterations
+
 
-    fn = img.copy()
-    otf = psf2otf(psf, img.shape)
+def richardson_lucy_accelerated(workspace, iterations, tolerance=0.0, residual_tolerance=0.0):
+    """Richardson-Lucy accelerated by vector extrapolation (Biggs and Andrews, 1997).
 
+    Every update is applied to the estimate extrapolated along the last step, y = x + alpha * (x - x_previous),
+    with alpha estimated from the correlation of the last two RL steps. Takes the same arguments as richardson_lucy."""
+    workspace.converged = False
     for i in range(iterations):
-        print('iter ' + str(i+1))
-        ffn = np.fft.fft2(fn)
-        Hfn = otf * ffn
-        iHfn = np.fft.ifft2(Hfn)
-        ratio = img / iHfn
-        iratio = np.fft.fft2(ratio)
-        res = otf * iratio
-        ires = np.fft.ifft2(res)
-        fn = ires * fn
-
-    result = np.abs(fn)
-    return result * 255
-    # return cv2.normalize(result, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+        estimate, previous, predicted = workspace.estimate, workspace.previous, workspace.predicted
+
+        np.subtract(estimate, previous, out=predicted)
+        predicted *= workspace.alpha
+        predicted += estimate
+        np.maximum(predicted, 0, out=predicted)     # the extrapolation can leave the non-negative orthant
+
+        correction = workspace.correction(predicted, residual_tolerance > 0)
+        if residual_tolerance > 0 and workspace.residual < residual_tolerance:
+            workspace.converged = True
+            return i
+
+        # the buffer of the previous estimate receives the new one
+        workspace.estimate, workspace.previous = previous, estimate
+        np.multiply(predicted, correction, out=workspace.estimate)
+
+        workspace.step, workspace.previous_step = workspace.previous_step, workspace.step
+        np.subtract(workspace.estimate, predicted, out=workspace.step)
+        denominator = float(np.vdot(workspace.previous_step, workspace.previous_step))
+        alpha = float(np.vdot(workspace.step, workspace.previous_step)) / denominator if denominator > 0 else 0.0
+        workspace.alpha = min(max(alpha, 0.0), RL_MAX_ACCELERATION)
+        workspace.iterations += 1
+
+        if tolerance > 0:
+            np.subtract(workspace.estimate, workspace.previous, out=workspace.work)
+            if workspace.track_change(workspace.work) < tolerance:
+                workspace.converged = True
+                return i + 1
+
+    return iterations
 
 
 if __name__ == '__main__':
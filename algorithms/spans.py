@@ -0,0 +1,6 @@
+from contextlib import nullcontext
+
+
+def span(profiler, name, args=None):
+    """Span of the profiler passed to an algorithm (see src/profiling.py), an empty context without one."""
+    return profiler.span(name, 'algorithm', args) if profiler is not None else nullcontext()
@@ -0,0 +1,12 @@
+import os
+
+# environment variable limiting the CPU cores an algorithm uses. Callers running several algorithms side by side,
+# e.g. the worker processes of src/batch.py, set it to their share of the cores.
+THREADS_VARIABLE = 'DECONVOLUTION_THREADS'
+
+
+def get_cpu_count():
+    """CPU cores an algorithm may use for its threads, FFTs and worker processes: all of them unless
+    THREADS_VARIABLE limits them."""
+    threads = os.environ.get(THREADS_VARIABLE, '')
+    return max(1, int(threads)) if threads.isdigit() else os.cpu_count() or 1
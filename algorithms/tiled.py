@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import cv2
+from skimage import color
+from algorithms.wiener import wiener_deconvolution
+from algorithms.richardsonlucy import RLWorkspace, richardson_lucy
+from algorithms.threads import get_cpu_count
+from algorithms.channels import to_dtype, GRAYSCALE, RGB, LUMINANCE
+from algorithms.memory import get_memory_status
+
+TILE_SIZE = 1024
+# tiles are read with a margin of this many PSF sizes around them, the margin is cropped from the result.
+# The regularized inverse filters reach further than the PSF itself, smaller margins leave visible seams.
+TILE_MARGIN_PSF_SIZES = 8
+# rows read at once while looking for the intensity range of the image
+RANGE_ROWS = 1024
+
+
+def tiled_wiener(img, psf, K, color_mode=GRAYSCALE, tile_size=TILE_SIZE, workers=0, progress=None):
+    return deconvolve_in_memory(img, psf, 'wiener', (K,), color_mode, tile_size, workers, progress)
+
+
+def tiled_RL(img, psf, iterations, color_mode=GRAYSCALE, tile_size=TILE_SIZE, workers=0, progress=None):
+    return deconvolve_in_memory(img, psf, 'richardson_lucy', (iterations,), color_mode, tile_size, workers, progress)
+
+
+def deconvolve_in_memory(img, psf, method, params, color_mode, tile_size, workers, progress=None):
+    # tiles are exchanged with the worker processes through memory-mapped files
+    with tempfile.TemporaryDirectory() as directory:
+        source, target = os.path.join(directory, 'source.npy'), os.path.join(directory, 'target.npy')
+        np.save(source, img)
+        tiled_deconvolution(source, target, psf, method, params, tile_size, workers=workers, progress=progress,
+                            color_mode=color_mode)
+        # same dtype as the full-frame algorithms give
+        return to_dtype(np.load(target) / 255, img.dtype)
+
+
+def tiled_deconvolution(source_path, target_path, psf, method, params, tile_size=TILE_SIZE, margin=None, workers=0,
+                        progress=None, color_mode=RGB):
+    """Deconvolves a (H, W) or (H, W, C) image stored as .npy into a float32 .npy of the same shape,
+    (H, W) for an RGB image in grayscale color mode (see algorithms/channels.py).
+
+    Both files are memory-mapped and the image is processed in overlapping tiles (overlap-save: every tile is
+    read with a margin which is dropped from its result), so peak memory depends on the tile size and the worker
+    count rather than on the image size. method is 'wiener' (params: K) or 'richardson_lucy' (params: iterations).
+    The result is scaled to [0, 255] like the full-frame algorithms. progress.update(tiles, total) is called
+    after every finished tile.
+    Returns the largest peak resident memory of a process deconvolving tiles in bytes, when the system reports it."""
+    if method not in TILE_METHODS:
+        raise ValueError(f"Unknown tiled method '{method}'. Expected one of: {', '.join(TILE_METHODS)}.")
+    if color_mode not in (GRAYSCALE, RGB, LUMINANCE):
+        raise ValueError(f"Invalid color mode {color_mode}. Expected {GRAYSCALE} (grayscale), {RGB} (RGB) "
+                         f"or {LUMINANCE} (luminance only).")
+
+    psf = np.asarray(psf, dtype=np.float64)
+    if margin is None:
+        margin = TILE_MARGIN_PSF_SIZES * max(psf.shape)
+
+    source = np.load(source_path, mmap_mode='r')
+    if len(source.shape) != 3:
+        color_mode = GRAYSCALE
+    shape = source.shape[:2] if color_mode == GRAYSCALE else source.shape
+    # the tiles share one intensity range, normalizing each on its own would leave visible seams
+    value_range = get_value_range(source, color_mode)
+    del source
+
+    target = np.lib.format.open_memmap(target_path, mode='w+', dtype=np.float32, shape=shape)
+    target.flush()
+    del target
+
+    tasks = [(source_path, target_path, box, margin, psf, method, params, value_range, color_mode)
+             for box in get_tiles(shape[:2], tile_size)]
+
+    if workers <= 0:
+        workers = get_cpu_count()
+    peaks = []
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            peaks.append(deconvolve_tile(task))
+            if progress is not None:
+                progress.update(len(peaks), len(tasks))
+    else:
+        # spawned workers do not inherit the memory of the calling process, only the tiles they read
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            for future in as_completed([executor.submit(deconvolve_tile, task) for task in tasks]):
+                peaks.append(future.result())
+                if progress is not None:
+                    progress.update(len(peaks), len(tasks))
+        finally:
+            # on an error or a cancellation the tiles not started yet are dropped
+            executor.shutdown(cancel_futures=True)
+
+    peaks = [peak for peak in peaks if peak is not None]
+    return max(peaks) if peaks else None
+
+
+def get_tiles(shape, tile_size):
+    """Splits an image of the given (H, W) shape into (y0, y1, x0, x1) tiles."""
+    return [(y, min(y + tile_size, shape[0]), x, min(x + tile_size, shape[1]))
+            for y in range(0, shape[0], tile_size)
+            for x in range(0, shape[1], tile_size)]
+
+
+def get_value_range(source, color_mode=RGB):
+    minimum, maximum = np.inf, -np.inf
+    for start in range(0, source.shape[0], RANGE_ROWS):
+        rows = to_gray(source[start:start + RANGE_ROWS], color_mode)
+        minimum, maximum = min(minimum, float(rows.min())), max(maximum, float(rows.max()))
+    return minimum, maximum
+
+
+def to_gray(img, color_mode):
+    # as split_channels, RGB images are converted to grayscale before the intensity range is taken
+    return color.rgb2gray(img) if color_mode == GRAYSCALE and img.ndim == 3 else img
+
+
+def deconvolve_tile(task):
+    source_path, target_path, (y0, y1, x0, x1), margin, psf, method, params, (minimum, maximum), color_mode = task
+    source = np.load(source_path, mmap_mode='r')
+    height, width = source.shape[:2]
+
+    # margins are clamped to the image, at the image edges the tile behaves like the full frame
+    ry0, ry1 = max(y0 - margin, 0), min(y1 + margin, height)
+    rx0, rx1 = max(x0 - margin, 0), min(x1 + margin, width)
+    tile = np.array(to_gray(source[ry0:ry1, rx0:rx1], color_mode), dtype=np.float32)
+    del source
+
+    tile -= minimum
+    tile /= max(maximum - minimum, np.finfo(np.float32).eps)
+    if color_mode == LUMINANCE:
+        ycrcb = cv2.cvtColor(tile, cv2.COLOR_RGB2YCrCb)
+        planes = ycrcb[np.newaxis, :, :, 0].copy()
+    else:
+        planes = tile[np.newaxis] if tile.ndim == 2 else np.ascontiguousarray(tile.transpose(2, 0, 1))
+
+    result = TILE_METHODS[method](planes, psf, *params)
+    result = result[:, y0 - ry0:y1 - ry0, x0 - rx0:x1 - rx0]
+    if color_mode == LUMINANCE:
+        ycrcb = ycrcb[y0 - ry0:y1 - ry0, x0 - rx0:x1 - rx0]
+        ycrcb[:, :, 0] = result[0]
+        result = cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2RGB).transpose(2, 0, 1)
+
+    target = np.load(target_path, mmap_mode='r+')
+    target[y0:y1, x0:x1] = (result[0] if target.ndim == 2 else result.transpose(1, 2, 0)) * 255
+    target.flush()
+    # high water mark of the current address space, unlike ru_maxrss it does not count the parent before exec
+    return get_memory_status('VmHWM')
+
+
+def seam_error(tiled, reference, tile_size, width=2, border=0):
+    """Compares a tiled result with a full-frame one.
+
+    Returns the maximum and RMS absolute errors over the whole image and over the pixels within width
+    of an inner tile boundary. Pixels within border of the image edges, where the full frame wraps around
+    and the tiles do not, are left out."""
+    error = np.abs(np.asarray(tiled, dtype=np.float64) - np.asarray(reference, dtype=np.float64))
+    height, width_ = error.shape[:2]
+    inside = np.zeros((height, width_), dtype=bool)
+    inside[border:height - border, border:width_ - border] = True
+
+    seams = np.zeros_like(inside)
+    for position in range(tile_size, height, tile_size):
+        seams[max(position - width, 0):position + width] = True
+    for position in range(tile_size, width_, tile_size):
+        seams[:, max(position - width, 0):position + width] = True
+    seams &= inside
+
+    error_inside = error[inside]
+    seam_pixels = error[seams] if seams.any() else np.zeros(1)
+    return {
+        'max': float(error_inside.max()),
+        'rms': float(np.sqrt(np.mean(error_inside ** 2))),
+        'seam_max': float(seam_pixels.max()),
+        'seam_rms': float(np.sqrt(np.mean(seam_pixels ** 2)))
+    }
+
+
+def _richardson_lucy_planes(planes, psf, iterations):
+    height, width = planes.shape[1:]
+    workspace = RLWorkspace(planes, psf)
+    richardson_lucy(workspace, iterations)
+    return workspace.estimate[:, :height, :width]
+
+
+TILE_METHODS = {
+    'wiener': wiener_deconvolution,
+    'richardson_lucy': _richardson_lucy_planes
+}
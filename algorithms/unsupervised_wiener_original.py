@@ -1,14 +1,16 @@
 import numpy as np
-from skimage import restoration, color
+from skimage import restoration
 import cv2
+from algorithms.otf import skimage_transfer_functions
+from algorithms.channels import split_channels, merge_channels, GRAYSCALE
 
 
-def unsupervised_wiener_original(img, psf):
-    if len(img.shape) == 3:
-        img = color.rgb2gray(img)
-    img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-    result, _ = restoration.unsupervised_wiener(img, psf)
-    return result * 255
+def unsupervised_wiener_original(img, psf, color_mode=GRAYSCALE):
+    planes, channels_state = split_channels(img, color_mode)
+    trans_func, reg = skimage_transfer_functions(psf, planes.shape[1:])
+    # noise and image priors are sampled per plane, the transfer functions are shared
+    result = np.stack([restoration.unsupervised_wiener(plane, trans_func, reg=reg)[0] for plane in planes])
+    return merge_channels(result, channels_state)
 
 if __name__ == '__main__':
 
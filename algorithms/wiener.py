@@ -1,20 +1,53 @@
 import numpy as np
 import cv2
-from skimage import color
-
-
-def my_wiener(img, kernel, K):
-    if len(img.shape) == 3:
-        img = color.rgb2gray(img)
-    img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-    kernel /= np.sum(kernel)
-    dummy = np.copy(img)
-    dummy = np.fft.fft2(dummy)
-    kernel = np.fft.fft2(kernel, s=img.shape)
-    kernel = np.conj(kernel) / (np.abs(kernel) ** 2 + K)
-    dummy = dummy * kernel
-    dummy = np.abs(np.fft.ifft2(dummy))
-    return dummy * 255
+from scipy import fft
+from algorithms.otf import psf2otf, fast_shape, pad_to_shape, sweep_chunks
+from algorithms.threads import get_cpu_count
+from algorithms.channels import split_channels, merge_channels, GRAYSCALE
+from algorithms.spans import span
+
+
+def my_wiener(img, kernel, K, color_mode=GRAYSCALE, profiler=None):
+    with span(profiler, 'split channels'):
+        planes, channels_state = split_channels(img, color_mode)
+    with span(profiler, 'Wiener filter'):
+        result = wiener_deconvolution(planes, kernel, K)
+    with span(profiler, 'merge channels'):
+        return merge_channels(result, channels_state)
+
+
+def my_wiener_sweep(img, kernel, Ks, color_mode=GRAYSCALE):
+    """my_wiener for every value of K in Ks, returns the list of results."""
+    planes, channels_state = split_channels(img, color_mode)
+    return [merge_channels(result, channels_state) for result in wiener_deconvolution_stack(planes, kernel, Ks)]
+
+
+def wiener_deconvolution(planes, kernel, K):
+    """Wiener deconvolution of (C, H, W) planes normalized to [0, 1]."""
+    return wiener_deconvolution_stack(planes, kernel, [K])[0]
+
+
+def wiener_deconvolution_stack(planes, kernel, Ks):
+    """Wiener deconvolution of (C, H, W) planes for every value of K, returns an (N, C, H, W) array.
+
+    The image spectrum and the OTF are computed once and the filters of all values are applied as one broadcast stack."""
+    # all colour planes are filtered at once, the FFTs run over the last two axes
+    height, width = planes.shape[1:]
+    kernel = kernel / np.sum(kernel)
+    shape = fast_shape((height, width))
+    spectrum = fft.rfft2(pad_to_shape(planes, shape).astype(np.float32, copy=False), workers=get_cpu_count())
+    otf = psf2otf(kernel, shape, real=True, dtype=np.complex64)
+    # conj(H) / (|H|^2 + K): the numerator is shared by all values, only the real denominator is swept
+    spectrum *= np.conj(otf)
+    power = np.abs(otf) ** 2
+    Ks = np.asarray(Ks, dtype=np.float32).reshape(-1, 1, 1, 1)
+
+    result = np.empty((len(Ks),) + planes.shape, dtype=np.float32)
+    for chunk in sweep_chunks(len(Ks), spectrum.nbytes):
+        filtered = spectrum * (1 / (power + Ks[chunk]))
+        deconvolved = fft.irfft2(filtered, s=shape, overwrite_x=True, workers=get_cpu_count())
+        np.abs(deconvolved[..., :height, :width], out=result[chunk])
+    return result
 
 
 if __name__ == '__main__':
@@ -1,17 +1,53 @@
-from skimage import restoration, color
+from skimage import restoration
+from skimage.restoration import uft
+from scipy import fft
 import cv2
 import numpy as np
+from algorithms.otf import skimage_transfer_functions, otf_cache, sweep_chunks
+from algorithms.threads import get_cpu_count
+from algorithms.channels import split_channels, merge_channels, GRAYSCALE
 
 
-def wiener_original(img, psf, balance):
-    if len(img.shape) == 3:
-        img = color.rgb2gray(img)
-    img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-    result = restoration.wiener(img, psf, balance)
-    return result * 255
+def wiener_original(img, psf, balance, color_mode=GRAYSCALE):
+    planes, channels_state = split_channels(img, color_mode)
+    trans_func, reg = skimage_transfer_functions(psf, planes.shape[1:])
+    if trans_func is psf:
+        result = np.stack([restoration.wiener(plane, psf, balance, reg=reg) for plane in planes])
+    else:
+        # the transfer function is constant along the plane axis, so one transform filters every plane
+        result = restoration.wiener(planes, trans_func, balance, reg=reg)
+    return merge_channels(result, channels_state)
     # return cv2.normalize(result, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
 
 
+def wiener_original_sweep(img, psf, balances, color_mode=GRAYSCALE):
+    """wiener_original for every value of balance in balances, returns the list of results.
+
+    Follows restoration.wiener, but the image spectrum and the transfer functions are computed once
+    and the filters of all values are applied as one broadcast stack."""
+    planes, channels_state = split_channels(img, color_mode)
+    shape = planes.shape[1:]
+    trans_func, reg = skimage_transfer_functions(psf, shape)
+    if trans_func is psf:
+        trans_func = otf_cache.get('ir2tf', psf, shape, np.complex128, lambda: uft.ir2tf(psf, shape, is_real=True))
+    else:
+        trans_func = trans_func.real
+
+    spectrum = fft.rfft2(planes, workers=get_cpu_count())
+    spectrum *= np.conj(trans_func).astype(np.complex64)
+    power = (np.abs(trans_func) ** 2).astype(np.float32)
+    reg_power = (np.abs(reg.real) ** 2).astype(np.float32)
+    balances = np.asarray(balances, dtype=np.float32).reshape(-1, 1, 1, 1)
+
+    results = []
+    for chunk in sweep_chunks(len(balances), spectrum.nbytes):
+        filtered = spectrum * (1 / (power + balances[chunk] * reg_power))
+        deconvolved = fft.irfft2(filtered, s=shape, overwrite_x=True, workers=get_cpu_count())
+        np.clip(deconvolved, -1, 1, out=deconvolved)
+        results += [merge_channels(result, channels_state) for result in deconvolved]
+    return results
+
+
 if __name__ == '__main__':
 
     image = cv2.imread('../input_images/astro_blurred.png', cv2.IMREAD_GRAYSCALE)
@@ -21,4 +57,3 @@ if __name__ == '__main__':
     cv2.imshow('original', image)
     cv2.imshow('algorithm', result)
     cv2.waitKey(0)
-
@@ -0,0 +1,35 @@
+import time
+import numpy as np
+import cv2
+from algorithms.convolution import my_convolution
+
+SIZES = [(512, 512), (2048, 2048), (4000, 6000)]
+KERNEL_SIZES = [3, 7, 15, 31]
+
+
+def best_time(func, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run():
+    rng = np.random.default_rng(0)
+    print(f"{'image':>12} {'kernel':>7} {'my_convolution [s]':>19} {'all cores [s]':>14} "
+          f"{'cv2.filter2D [s]':>17} {'ratio':>8}")
+    for shape in SIZES:
+        image = rng.integers(0, 256, size=shape, dtype=np.uint8)
+        for size in KERNEL_SIZES:
+            kernel = np.ones((size, size)) / size ** 2
+            mine = best_time(lambda: my_convolution(image, kernel, 1))
+            threaded = best_time(lambda: my_convolution(image, kernel, 0))
+            reference = best_time(lambda: cv2.filter2D(image, -1, kernel))
+            print(f"{shape[0]}x{shape[1]:<7} {size:>4}x{size:<2} {mine:>19.4f} {threaded:>14.4f} "
+                  f"{reference:>17.4f} {threaded / reference:>8.1f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,65 @@
+import time
+import tracemalloc
+import numpy as np
+import cv2
+from algorithms.otf import psf2otf, otf_cache
+from algorithms.wiener import my_wiener
+from algorithms.richardsonlucy import my_RL_deconvolution_FFT
+
+# prime or nearly prime sides hit the slowest FFT paths
+SIZES = [(1009, 1511), (2003, 2999), (3001, 4001)]
+RL_ITERATIONS = 5
+
+
+def legacy_wiener(img, kernel, K):
+    # complex FFTs at the image size, as before the real-input path
+    img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+    kernel = kernel / np.sum(kernel)
+    dummy = np.fft.fft2(img)
+    kernel = np.fft.fft2(kernel, s=img.shape)
+    kernel = np.conj(kernel) / (np.abs(kernel) ** 2 + K)
+    return np.abs(np.fft.ifft2(dummy * kernel)) * 255
+
+
+def legacy_RL(img, psf, iterations):
+    img = cv2.normalize(img, None, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+    fn = img.copy()
+    otf = psf2otf(psf, img.shape)
+    for _ in range(iterations):
+        iHfn = np.fft.ifft2(otf * np.fft.fft2(fn))
+        fn = np.fft.ifft2(otf * np.fft.fft2(img / iHfn)) * fn
+    return np.abs(fn) * 255
+
+
+def measure(func):
+    otf_cache.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def run():
+    rng = np.random.default_rng(0)
+    psf = np.ones((5, 5)) / 25
+    cases = [
+        ('wiener', lambda img: legacy_wiener(img, psf, 0.01), lambda img: my_wiener(img, psf, 0.01)),
+        (f'RL x{RL_ITERATIONS}', lambda img: legacy_RL(img, psf, RL_ITERATIONS),
+         lambda img: my_RL_deconvolution_FFT(img, psf, RL_ITERATIONS))
+    ]
+
+    print(f"{'image':>10} {'algorithm':>9} {'before [s]':>11} {'after [s]':>10} {'before [MiB]':>13} {'after [MiB]':>12}")
+    for shape in SIZES:
+        image = rng.integers(0, 256, size=shape, dtype=np.uint8)
+        for name, before, after in cases:
+            before_time, before_memory = measure(lambda: before(image))
+            after_time, after_memory = measure(lambda: after(image))
+            print(f"{shape[0]}x{shape[1]:<5} {name:>9} {before_time:>11.3f} {after_time:>10.3f} "
+                  f"{before_memory:>13.1f} {after_memory:>12.1f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,51 @@
+import time
+import numpy as np
+import cv2
+from algorithms.richardsonlucy import RLWorkspace, AcceleratedRLWorkspace, richardson_lucy, \
+    richardson_lucy_accelerated
+
+SHAPE = (1024, 1536)
+PSF_SIZES = [5, 9, 15]
+# the plain RL residual after this many iterations is the tolerance both variants have to reach
+REFERENCE_ITERATIONS = 200
+
+
+def get_test_planes(psf):
+    rng = np.random.default_rng(0)
+    img = np.zeros(SHAPE, dtype=np.float32)
+    for _ in range(300):
+        y, x = rng.integers(0, SHAPE[0]), rng.integers(0, SHAPE[1])
+        cv2.circle(img, (int(x), int(y)), int(rng.integers(1, 20)), float(rng.random()), -1)
+    blurred = cv2.filter2D(img, -1, psf, borderType=cv2.BORDER_REFLECT) + 0.01
+    blurred += rng.normal(0, 0.001, SHAPE).astype(np.float32)
+    return np.clip(blurred, 0, None)[np.newaxis]
+
+
+def run_to_tolerance(workspace_class, run, planes, psf, residual_tolerance):
+    workspace = workspace_class(planes, psf)
+    start = time.perf_counter()
+    used = run(workspace, 10 * REFERENCE_ITERATIONS, residual_tolerance=residual_tolerance)
+    return used, time.perf_counter() - start
+
+
+def run():
+    print(f"{'PSF':>7} {'residual':>10} {'RL iterations':>14} {'RL [s]':>8} "
+          f"{'accelerated iterations':>23} {'accelerated [s]':>16}")
+    for size in PSF_SIZES:
+        psf = np.ones((size, size)) / size ** 2
+        planes = get_test_planes(psf)
+
+        reference = RLWorkspace(planes, psf)
+        richardson_lucy(reference, REFERENCE_ITERATIONS)
+        reference.correction(reference.estimate, track_residual=True)
+        tolerance = reference.residual * 1.001
+
+        plain_iterations, plain_time = run_to_tolerance(RLWorkspace, richardson_lucy, planes, psf, tolerance)
+        fast_iterations, fast_time = run_to_tolerance(AcceleratedRLWorkspace, richardson_lucy_accelerated,
+                                                      planes, psf, tolerance)
+        print(f"{size:>3}x{size:<3} {tolerance:>10.2e} {plain_iterations:>14} {plain_time:>8.2f} "
+              f"{fast_iterations:>23} {fast_time:>16.2f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,239 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+from src.validation import Validation, get_validation_cache_file
+from src.helpers import ErrorType, format_errors
+from src.batch import get_parameter_strings, evaluate_parameters
+from src.pipeline import Pipeline
+from algorithms.memory import get_memory_status
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+SIZES = [256, 512, 1024, 2048, 4096, 8192]
+CHANNELS = ['gray', 'rgb']
+DTYPES = ['uint8', 'float32']
+REPEATS = 3
+# relative increase of the wall time or of the memory used over the baseline reported as a regression
+TIME_THRESHOLD = 0.1
+MEMORY_THRESHOLD = 0.1
+# absolute increases below these are measurement noise, not regressions
+MIN_TIME_INCREASE = 0.01
+MIN_MEMORY_INCREASE_MIB = 8
+
+
+def get_rss_mib(field):
+    # VmHWM is the peak and VmRSS the current resident set size of this process.
+    # Without /proc the peak ru_maxrss stands for both, None where neither is available
+    size = get_memory_status(field)
+    if size is None and resource is not None:
+        # ru_maxrss is in bytes on macOS and in KiB elsewhere
+        size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return size / 2 ** 20 if size is not None else None
+
+
+def make_image(size, channels, dtype):
+    """Deterministic square test image with values in [0, 255], smooth like a photograph rather than noise."""
+    shape = (size, size, 3) if channels == 'rgb' else (size, size)
+    noise = np.random.default_rng(0).integers(0, 256, size=shape, dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (0, 0), 2).astype(dtype)
+
+
+def run_case(task):
+    """Times one algorithm or pipeline on one image. Runs in a fresh process, so the peak RSS belongs to this
+    case alone."""
+    module, method, stages, parameters, size, channels, dtype, repeats = task
+    method = Pipeline(stages) if stages is not None else getattr(importlib.import_module(module), method)
+    base_rss_mib = get_rss_mib('VmRSS')
+    img = make_image(size, channels, dtype)
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        method(img, *parameters)
+        times.append(time.perf_counter() - start)
+    return {
+        'times': times,
+        'wall_time': min(times),
+        'megapixels_per_second': size * size / 1e6 / min(times) if min(times) > 0 else None,
+        'base_rss_mib': base_rss_mib,
+        'peak_rss_mib': get_rss_mib('VmHWM')
+    }
+
+
+def get_cases(algorithms, sizes=SIZES, channels=CHANNELS, dtypes=DTYPES):
+    return [(algorithm, size, channel, dtype)
+            for algorithm in algorithms for size in sizes for channel in channels for dtype in dtypes]
+
+
+def run_suite(algorithms, sizes=SIZES, channels=CHANNELS, dtypes=DTYPES, repeats=REPEATS, log=print):
+    """Runs every algorithm with its default parameters on every image size, channel count and type.
+
+    Every case runs in its own spawned process; an algorithm failing or running out of memory on a case
+    is recorded with the error and the suite goes on. Returns the list of case results."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for algorithm, size, channel, dtype in get_cases(algorithms, sizes, channels, dtypes):
+        result = {'algorithm': algorithm['name'], 'size': size, 'channels': channel, 'dtype': dtype}
+        try:
+            parameters = evaluate_parameters(algorithm, get_parameter_strings(algorithm))
+            # pipelines have stages instead of a method
+            task = (algorithm['module'], algorithm['config'].get('method', None),
+                    algorithm['config'].get('stages', None), parameters, size, channel, dtype, repeats)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result.update(executor.submit(run_case, task).result())
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+        results.append(result)
+
+        case = f"{algorithm['name']} {size}x{size} {channel} {dtype}"
+        if 'error' in result:
+            log(f'{case}: FAILED - {result["error"]}')
+        else:
+            log(f"{case}: {result['wall_time']:.4f} s, {result['megapixels_per_second']:.2f} MP/s"
+                + (f", peak RSS {result['peak_rss_mib']:.0f} MiB" if result['peak_rss_mib'] is not None else ''))
+    return results
+
+
+def get_machine():
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__
+    }
+
+
+def get_case_key(result):
+    return result['algorithm'], result['size'], result['channels'], result['dtype']
+
+
+def is_regression(current, baseline, threshold, min_increase):
+    return current > baseline * (1 + threshold) and current - baseline > min_increase
+
+
+def compare_results(baseline, current, time_threshold=TIME_THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    """Compares the cases of two benchmark runs.
+
+    The memory of a case is its peak RSS above the RSS of its process before the image was made, it is not
+    compared when either run could not measure it.
+    Returns (case key, message) of every regression: a case slower or using more memory than the thresholds
+    allow, or failing while it passed in the baseline."""
+    baseline_results = {get_case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = get_case_key(result)
+        reference = baseline_results.get(key)
+        if reference is None or 'error' in reference:
+            continue
+        if 'error' in result:
+            regressions.append((key, f"failed: {result['error']}"))
+            continue
+
+        if is_regression(result['wall_time'], reference['wall_time'], time_threshold, MIN_TIME_INCREASE):
+            regressions.append((key, f"wall time {reference['wall_time']:.4f} s -> {result['wall_time']:.4f} s "
+                                     f"({result['wall_time'] / reference['wall_time']:.2f}x)"))
+        if None in (result['peak_rss_mib'], result['base_rss_mib'], reference['peak_rss_mib'],
+                    reference['base_rss_mib']):
+            continue    # measured where the RSS is not available
+        memory = result['peak_rss_mib'] - result['base_rss_mib']
+        reference_memory = reference['peak_rss_mib'] - reference['base_rss_mib']
+        if is_regression(memory, reference_memory, memory_threshold, MIN_MEMORY_INCREASE_MIB):
+            regressions.append((key, f'memory {reference_memory:.0f} MiB -> {memory:.0f} MiB'))
+    return regressions
+
+
+def save_results(path, config, results):
+    with open(path, 'w') as f:
+        json.dump({'config': config, 'machine': get_machine(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def run_command(args):
+    validation = Validation()
+    cache_file = get_validation_cache_file(args.config)
+    algorithms, error_type, errors = validation.get_algorithms(args.config, cache_file=cache_file, lazy=True)
+    if errors:
+        print(format_errors(f'{str(error_type)} errors occurred:\n', errors), file=sys.stderr)
+    if args.algorithm:
+        unknown = [name for name in args.algorithm if name not in [a['name'] for a in algorithms]]
+        if unknown:
+            print(f"No valid algorithm {', '.join(repr(name) for name in unknown)} found in config file.",
+                  file=sys.stderr)
+            return 2
+        algorithms = [a for a in algorithms if a['name'] in args.algorithm]
+
+    # only the algorithms to benchmark are executed, the ones failing it are left out
+    pending = [a for a in algorithms if a['pending']]
+    failed = [{'detail': algorithm['name'], 'errors': [error]}
+              for algorithm, error in zip(pending, validation.validate_pending(pending, cache_file=cache_file)) if error]
+    if failed:
+        print(format_errors(f'{str(ErrorType.VALIDATION)} errors occurred:\n', failed), file=sys.stderr)
+        algorithms = [a for a in algorithms if a['name'] not in [data['detail'] for data in failed]]
+
+    results = run_suite(algorithms, args.sizes, args.channels, args.dtypes, args.repeats)
+    save_results(args.output, args.config, results)
+    print(f'Results of {len(results)} cases written to {args.output}.')
+    return 0
+
+
+def compare_command(args):
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    if baseline['machine'] != current['machine']:
+        print('Warning: the results were measured on different machines or library versions.', file=sys.stderr)
+
+    regressions = compare_results(baseline, current, args.time_threshold, args.memory_threshold)
+    for (algorithm, size, channels, dtype), message in regressions:
+        print(f'REGRESSION {algorithm} {size}x{size} {channels} {dtype}: {message}')
+    print(f"{len(regressions)} regressions in {len(current['results'])} cases.")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the algorithms of the config file with their default '
+                                                 'parameters and compares benchmark results.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='times the algorithms over the image sizes and types')
+    run_parser.add_argument('-c', '--config', default='config.yaml', help='config file')
+    run_parser.add_argument('-o', '--output', default='benchmark_results.json', help='JSON results file')
+    run_parser.add_argument('-a', '--algorithm', action='append', default=[],
+                            help='name of an algorithm to benchmark, all of them when not given')
+    run_parser.add_argument('-s', '--sizes', type=int, nargs='+', default=SIZES, help='sides of the square images')
+    run_parser.add_argument('--channels', nargs='+', default=CHANNELS, choices=CHANNELS)
+    run_parser.add_argument('--dtypes', nargs='+', default=DTYPES, choices=DTYPES)
+    run_parser.add_argument('-r', '--repeats', type=int, default=REPEATS,
+                            help='runs of every case, the fastest one is reported')
+    run_parser.set_defaults(handler=run_command)
+
+    compare_parser = commands.add_parser('compare', help='flags regressions of results against a baseline')
+    compare_parser.add_argument('baseline', help='JSON results file of the baseline')
+    compare_parser.add_argument('current', help='JSON results file to check')
+    compare_parser.add_argument('--time-threshold', type=float, default=TIME_THRESHOLD,
+                                help='relative wall time increase reported as a regression')
+    compare_parser.add_argument('--memory-threshold', type=float, default=MEMORY_THRESHOLD,
+                                help='relative memory increase reported as a regression')
+    compare_parser.set_defaults(handler=compare_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import os
+import resource
+import tempfile
+import time
+import numpy as np
+import cv2
+from algorithms.tiled import tiled_deconvolution, seam_error, TILE_MARGIN_PSF_SIZES
+from algorithms.wiener import my_wiener
+from algorithms.richardsonlucy import my_RL_deconvolution_FFT
+
+SHAPE = (4000, 6000)
+TILE_SIZES = [512, 1024, 2048]
+# at least two workers, so the tiles run in worker processes whose peak RSS is reported
+WORKERS = max(2, os.cpu_count() or 1)
+RL_ITERATIONS = 10
+
+
+def get_test_image():
+    noise = np.random.default_rng(0).integers(0, 256, size=SHAPE, dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (0, 0), 3)
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run():
+    image = get_test_image()
+    psf = np.ones((5, 5)) / 25
+    # the RSS of this process includes the test image and the full-frame references
+    cases = [
+        ('wiener', (0.01,), lambda: my_wiener(image, psf, 0.01)),
+        ('richardson_lucy', (RL_ITERATIONS,), lambda: my_RL_deconvolution_FFT(image, psf, RL_ITERATIONS))
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        source, target = os.path.join(directory, 'source.npy'), os.path.join(directory, 'target.npy')
+        np.save(source, image)
+
+        print(f"{'method':>16} {'tile':>6} {'tiled [s]':>10} {'worker peak RSS [MiB]':>22} "
+              f"{'seam max':>9} {'seam RMS':>9}")
+        for method, params, full_frame in cases:
+            start = time.perf_counter()
+            reference = full_frame()
+            print(f"{method:>16} {'full':>6} {time.perf_counter() - start:>10.2f} "
+                  f"{peak_rss_mib():>22.0f}")
+
+            for tile_size in TILE_SIZES:
+                start = time.perf_counter()
+                worker_peak = tiled_deconvolution(source, target, psf, method, params, tile_size, workers=WORKERS)
+                elapsed = time.perf_counter() - start
+                error = seam_error(np.load(target, mmap_mode='r'), reference, tile_size,
+                                   border=TILE_MARGIN_PSF_SIZES * max(psf.shape))
+                print(f"{method:>16} {tile_size:>6} {elapsed:>10.2f} {(worker_peak or 0) / 2 ** 20:>22.0f} "
+                      f"{error['seam_max']:>9.3f} {error['seam_rms']:>9.4f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,251 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
+import cv2
+from algorithms.threads import THREADS_VARIABLE
+from src.validation import Validation, get_validation_cache_file
+from src.helpers import format_errors, evaluate_string_parameter, get_keyword_parameters
+from src.cache import ResultCache
+from src.image_io import IMAGE_EXTENSIONS, read_image, read_image_shape, write_image
+from src.memory import MemoryTracker, fit_memory_budget, format_memory_stats
+from src.pipeline import Pipeline
+from src.progress import ProgressToken
+
+# images submitted to the pool per worker, keeps the next images decoding while the current ones are processed
+IN_FLIGHT_PER_WORKER = 2
+
+
+def get_parameter_strings(algorithm, overrides=None):
+    """Parameter value strings of an algorithm: config defaults replaced by the name=value overrides."""
+    overrides = dict(overrides or {})
+    names = [param['name'] for param in algorithm['params']]
+    unknown = [name for name in overrides if name not in names]
+    if unknown:
+        raise ValueError(f"Unknown parameters of algorithm '{algorithm['name']}': {', '.join(unknown)}. "
+                         f"Expected one of: {', '.join(names)}.")
+
+    param_strings = [overrides.get(param['name'], param.get('default', None)) for param in algorithm['params']]
+    return ['1' if p == 'True' else '0' if p == 'False' else p for p in param_strings]
+
+
+def evaluate_parameters(algorithm, param_strings):
+    parameters = []
+    for i, (param, value) in enumerate(zip(algorithm['params'], param_strings)):
+        parameter = evaluate_string_parameter(param['type'], value)
+        if parameter is None:
+            raise ValueError(f"Parameter #{i + 1} ({param['name']}) is null.")
+        parameters.append(parameter)
+    return parameters
+
+
+def parse_overrides(values):
+    overrides = {}
+    for value in values:
+        name, separator, expression = value.partition('=')
+        if not separator:
+            raise ValueError(f"Invalid parameter '{value}'. Expected name=value.")
+        overrides[name.strip()] = expression.strip()
+    return overrides
+
+
+def get_input_paths(inputs):
+    """Image files given as directories or glob patterns, in a stable order."""
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern)
+        paths += sorted(path for path in matches
+                        if os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+    return list(dict.fromkeys(paths))
+
+
+def get_output_path(path, output_dir, extension):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, f'{name}.{extension}')
+
+
+@lru_cache(maxsize=None)
+def get_result_cache(directory):
+    # every image of a batch is processed once, so the workers only use the disk tier
+    return ResultCache(max_bytes=0, directory=directory)
+
+
+def limit_threads(threads):
+    # every worker process gets its share of the cores, algorithms would otherwise each use all of them
+    os.environ[THREADS_VARIABLE] = str(threads)
+    cv2.setNumThreads(threads)
+
+
+def process_file(task):
+    """Decodes, processes and encodes one image. Runs in a pool worker, so every step of an image
+    overlaps with the other images of the batch. Results found in the cache directory are not processed again,
+    pipelines cache the output of every stage and run only from the first stage without a cached output.
+    Returns the timings of the steps, the peak memory of the processing and whether an iterative algorithm
+    stopped before its iterations."""
+    path, output_path, method, parameters, cache_directory = task
+    start = time.perf_counter()
+
+    img = read_image(path)
+    decoded = time.perf_counter()
+
+    cache = get_result_cache(cache_directory) if cache_directory is not None else None
+    key = cache.key(method, img, parameters) if cache is not None else None
+    result = cache.get(key) if cache is not None else None
+    cached = result is not None
+    memory = None
+    progress = ProgressToken()
+    if not cached:
+        with MemoryTracker() as tracker:
+            if isinstance(method, Pipeline) and cache is not None:
+                result, _ = method.run(img, parameters, cache=cache)
+            elif 'progress' in get_keyword_parameters(method):
+                result = method(img, *parameters, progress=progress)
+            else:
+                result = method(img, *parameters)
+        memory = tracker.stats()
+        error = Validation().validate_image(result)
+        if error is not None:
+            raise ValueError(error)
+        if cache is not None:
+            cache.put(key, result)
+    processed = time.perf_counter()
+
+    write_image(output_path, result)
+    encoded = time.perf_counter()
+
+    return {
+        'pixels': img.shape[0] * img.shape[1],
+        'cached': cached,
+        'memory': memory,
+        'stopped': progress.stopped_early(),
+        'decode': decoded - start,
+        'process': processed - decoded,
+        'encode': encoded - processed
+    }
+
+
+def run_batch(method, parameters, paths, output_dir, workers=0, extension='png', cache_directory=None, log=print,
+              plan=None):
+    """Runs an algorithm over the images, writing the results to output_dir.
+    Results are cached in cache_directory when given, so repeated runs skip the unchanged images.
+    plan(shape), when given, returns the method and parameters used on an image of the given shape, it is called
+    with the shape from the file header before the image is decoded and raises for images not to be processed.
+
+    Images are processed by a pool of worker processes (workers <= 0 uses every CPU core, 1 runs in this process).
+    The algorithms of each worker process share its part of the CPU cores, with as many threads as cores per worker.
+    Returns the per-image timings and the list of (path, error) failures."""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers if workers > 0 else os.cpu_count()
+    timings, failures = [], []
+    tasks = []
+    for path in paths:
+        try:
+            image_method, image_parameters = plan(read_image_shape(path)) if plan is not None else (method, parameters)
+        except Exception as e:
+            failures.append((path, e))
+            log(f'{path}: FAILED - {e}')
+            continue
+        tasks.append((path, get_output_path(path, output_dir, extension), image_method, image_parameters,
+                      cache_directory))
+
+    def report(path, run):
+        try:
+            timing = run()
+        except Exception as e:
+            failures.append((path, e))
+            log(f'{path}: FAILED - {e}')
+            return
+        timings.append(timing)
+        log(f"{path}: decode {timing['decode']:.3f} s, process {timing['process']:.3f} s"
+            f"{' (cached)' if timing['cached'] else ''}, encode {timing['encode']:.3f} s"
+            f"{'' if timing['memory'] is None else ', ' + format_memory_stats(timing['memory'])}"
+            f"{'' if timing['stopped'] is None else ', ' + timing['stopped']}")
+
+    start = time.perf_counter()
+    if workers == 1:
+        for task in tasks:
+            report(task[0], lambda: process_file(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_threads,
+                                 initargs=(max(1, (os.cpu_count() or 1) // workers),)) as executor:
+            pending = {}
+            for task in tasks:
+                pending[executor.submit(process_file, task)] = task[0]
+                if len(pending) < workers * IN_FLIGHT_PER_WORKER:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report(pending.pop(future), future.result)
+            for future in list(pending):
+                report(pending.pop(future), future.result)
+    elapsed = time.perf_counter() - start
+
+    megapixels = sum(timing['pixels'] for timing in timings) / 1e6
+    cached = sum(timing['cached'] for timing in timings)
+    log(f'Processed {len(timings)} of {len(paths)} images ({cached} cached) in {elapsed:.2f} s: '
+        f'{len(timings) / elapsed if elapsed > 0 else 0:.2f} images/s, '
+        f'{megapixels / elapsed if elapsed > 0 else 0:.2f} MP/s.')
+    return timings, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs an algorithm from the config file over a batch of images.')
+    parser.add_argument('inputs', nargs='+', help='image directories or glob patterns')
+    parser.add_argument('-a', '--algorithm', required=True, help='name of the algorithm in the config file')
+    parser.add_argument('-p', '--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='parameter value, the config default is used for parameters not given')
+    parser.add_argument('-o', '--output', default='output_images', help='output directory')
+    parser.add_argument('-c', '--config', default='config.yaml', help='config file')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='worker processes, 0 uses every CPU core')
+    parser.add_argument('-f', '--format', default='png', choices=('png', 'jpg', 'tif', 'npy'),
+                        help='output image format, png, tif and npy keep 16-bit results')
+    parser.add_argument('--cache-dir', default=None, help='directory of cached results reused by later runs')
+    args = parser.parse_args(argv)
+
+    algorithms, error_type, errors = Validation().get_algorithms(args.config,
+                                                                 cache_file=get_validation_cache_file(args.config))
+    if errors:
+        print(format_errors(f'{str(error_type)} errors occurred:\n', errors), file=sys.stderr)
+
+    selected = [a for a in algorithms if a['name'] == args.algorithm]
+    if not selected:
+        print(f"No valid algorithm '{args.algorithm}' found in config file.", file=sys.stderr)
+        return 2
+
+    try:
+        param_strings = get_parameter_strings(selected[0], parse_overrides(args.param))
+        parameters = evaluate_parameters(selected[0], param_strings)
+    except Exception as e:
+        print(f'Parameter error: {e}', file=sys.stderr)
+        return 2
+
+    paths = get_input_paths(args.inputs)
+    if not paths:
+        print('No input images found.', file=sys.stderr)
+        return 2
+
+    def plan(shape):
+        # algorithms predicted to exceed their memory budget on an image run their fallback or skip the image
+        algorithm, planned = fit_memory_budget(selected[0], algorithms, shape, parameters)
+        if algorithm is not selected[0]:
+            print(f"'{selected[0]['name']}' is over its memory budget on an image of "
+                  f"{'x'.join(str(size) for size in shape)} values, running '{algorithm['name']}' instead.")
+        return algorithm['method'], planned
+
+    try:
+        _, failures = run_batch(selected[0]['method'], parameters, paths, args.output, args.workers, args.format,
+                                args.cache_dir, plan=plan)
+    except Exception as e:
+        print(f'Batch error: {e}', file=sys.stderr)
+        return 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+
+RESULT_CACHE_MAX_BYTES = 1024 * 2 ** 20
+
+
+class ResultCache:
+    """Cache of algorithm results keyed by a hash of the input image, the algorithm and its parameter values.
+
+    Results are kept in a least recently used memory tier bounded by their total size in bytes and, when a directory
+    is given, in an on-disk tier of compressed .npz files shared between processes and runs. The disk tier is bounded
+    by max_disk_bytes when given, dropping the least recently used files. Cached arrays are read-only."""
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, directory=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, method, img, parameters):
+        digest = hashlib.sha256()
+        digest.update(get_method_identity(method).encode())
+        for value in [img, *parameters]:
+            if isinstance(value, np.ndarray):
+                value = np.ascontiguousarray(value)
+                digest.update(f'ndarray{value.shape}{value.dtype.str}'.encode())
+                digest.update(value)
+            else:
+                digest.update(f'{type(value).__name__}({value!r})'.encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        result = self._load(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        result.setflags(write=False)
+        self._remember(key, result)
+        if self.directory is not None:
+            self._save(key, result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.nbytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+    def _remember(self, key, result):
+        if result.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = result
+                self.nbytes += result.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                result = data['result']
+            os.utime(path)      # the modification time orders the files for eviction
+        except (OSError, KeyError, ValueError):
+            return None
+        result.setflags(write=False)
+        return result
+
+    def _save(self, key, result):
+        # written next to the target and renamed, so other processes never read a partial file
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.npz', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                np.savez_compressed(f, result=result)
+            os.replace(temporary_path, self._path(key))
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+        if self.max_disk_bytes is not None:
+            self._prune()
+
+    def _prune(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz') and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+@lru_cache(maxsize=None)
+def _file_digest(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def get_file_digest(path):
+    """Hash of the content of a file, recomputed only when its modification time changes."""
+    try:
+        return _file_digest(path, os.path.getmtime(path))
+    except OSError:
+        return ''
+
+
+def get_source_digest(path):
+    """Hash of the source of a module and of the other modules of its package. Algorithms import helpers
+    from their package (e.g. algorithms/otf.py), a change of any of them changes the results."""
+    directory = os.path.dirname(path)
+    if not os.path.isfile(os.path.join(directory, '__init__.py')):
+        return get_file_digest(path)
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.py'))
+    except OSError:
+        return get_file_digest(path)
+    digests = ''.join(get_file_digest(os.path.join(directory, name)) for name in names)
+    return hashlib.sha1(digests.encode()).hexdigest()
+
+
+def get_module_digest(module_name):
+    """Source hash of a loaded module and its package, so cached results are dropped when the algorithm changes."""
+    path = getattr(sys.modules.get(module_name), '__file__', None)
+    return get_source_digest(path) if path is not None else ''
+
+
+def get_method_identity(method):
+    """Name and source hash of an algorithm method, methods made of other methods such as pipelines
+    provide their own with cache_identity()."""
+    if hasattr(method, 'cache_identity'):
+        return method.cache_identity()
+    return f'{method.__module__}.{method.__qualname__}' + get_module_digest(method.__module__)
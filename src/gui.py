@@ -9,10 +9,25 @@ import threading
 import sys
 import numpy as np
 import time
-import skimage
+import queue
 import math     # do not touch - needed for parameters values
-from src.validation import Validation
-from src.helpers import ParamType, get_traceback_data, format_errors
+from src.validation import Validation, get_validation_cache_file
+from src.helpers import ParamType, get_traceback_data, format_errors, evaluate_string_parameter, evaluate_sweep_values, \
+    get_keyword_parameters
+from src.sweep import run_sweep, get_sweep_shape
+from src.cache import ResultCache
+from src.progress import ProgressToken, Cancelled
+from src.workers import WorkerPool, WorkerError
+from src.proxy import make_proxy, get_proxy_parameters
+from src.viewer import PyramidView, to_display
+from src.image_io import IMAGE_EXTENSIONS, get_extension, read_image, read_reduced_image, write_image
+from src.profiling import profiler, STAGE, summarize, format_summary
+from src.memory import MemoryBudgetError, fit_memory_budget, format_memory_stats
+from src.pipeline import Pipeline, StageError
+
+CONFIG_FILE = '../config.yaml'
+# results of validating the config algorithms, algorithms with a stored result are not executed at startup
+VALIDATION_CACHE_FILE = get_validation_cache_file(CONFIG_FILE)
 
 
 class App(TkinterDnD.Tk):
@@ -29,7 +44,9 @@ class App(TkinterDnD.Tk):
         self.state('zoomed')
 
         self.validation = Validation()
-        algorithms, error_type, config_errors = self.validation.get_algorithms('../config.yaml')
+        algorithms, error_type, config_errors = self.validation.get_algorithms(CONFIG_FILE,
+                                                                               cache_file=VALIDATION_CACHE_FILE,
+                                                                               lazy=True)
 
         if config_errors:
             if algorithms is not None and len(algorithms) > 0:
@@ -51,12 +68,35 @@ class App(TkinterDnD.Tk):
             self.ALGORITHMS = algorithms
 
             # region basic config
+            # algorithms run in worker processes, the processing thread only waits for them
+            self.worker_pool = WorkerPool([a['module'] for a in self.ALGORITHMS])
+            # live previews have their own worker, so they never wait for a full resolution run
+            self.preview_pool = WorkerPool([a['module'] for a in self.ALGORITHMS])
+            self.preview_job = None
+            self.preview_progress = None
+            self.proxy = None
+            self.protocol("WM_DELETE_WINDOW", lambda: self.on_close())
+            self.loading_path = None        # path of the image read at full resolution in the background
+            self.loaded_image = None
             self.processing_image_thread = None
+            self.processing_progress = None
+            self.processing_outcome = None
+            self.stages_started = None      # perf_counter time of the last load or run, the status bar shows its stages
+            self.result_cache = ResultCache()
+            self.selected_algorithm_name = None
+
+            self.PENDING_SUFFIX = ' (pending)'
+            self.validation_results = queue.Queue()
+            self.validation_errors = []
+            self.validation_thread = None
 
             self.IMG_SIZE = self.winfo_screenheight() / 2
-            self.IMG_EXTENSIONS = ('.png', '.jpg')
-            self.GIF_SIZE = 100
             self.PARAM_NAME_MAX_LENGTH = 20
+            self.SWEEP_THUMBNAIL_SIZE = 160
+            self.SWEEP_COLUMNS = 5
+            self.SWEEP_MAX_RESULTS = 200
+            self.PREVIEW_DEBOUNCE_MS = 150
+            self.PREVIEW_CANCEL_GRACE = 0.5     # seconds a cancelled preview may take to stop before its worker is killed
 
             self.BG_COLOR = '#bfbcb4'
             self.DARK_COLOR = 'black'
@@ -64,25 +104,14 @@ class App(TkinterDnD.Tk):
             self.configure(background=self.BG_COLOR)
             # endregion
 
-            #region loading animation variables
-            self.gif_frames = []
-            self.gif_frames_count = 0
-            self.loading_indicator_animation_obj = None
-            self.init_loading_indicator('assets/loading-indicator.gif')
-            self.current_gif_frame = None
-            #endregion
-
             self.data = {
                 'image_before': None,
                 'image_after': None,
-                'parameters': []
+                'parameters': [],
+                'preview': None,
+                'live_preview': None
             }
 
-            self.input_image_displayed = None
-            self.output_image_displayed = None
-
-            self.input_canvas_image = None
-            self.output_canvas_image = None
             self.output_canvas_button = None
 
             self.rowconfigure(0, weight=1)
@@ -105,13 +134,15 @@ class App(TkinterDnD.Tk):
 
             self.select_parameters_btn = self.CustomButton(self.buttons_frame, text='Select parameters', font=self.my_font,
                                                    width=20, command=self.open_select_parameters_window)
+            self.sweep_btn = self.CustomButton(self.buttons_frame, text='Sweep', font=self.my_font, width=10,
+                                               command=self.open_sweep_window)
 
             self.selected_algorithm_var = tk.StringVar()
             self.selected_algorithm_var.trace('w', lambda x, y, z: self.on_combobox_change())
 
             self.select_algorithm_combobox = ttk.Combobox(self.buttons_frame, width=20, font=self.my_font_bigger,
                                                      state="readonly", textvar=self.selected_algorithm_var)
-            self.select_algorithm_combobox['values'] = [a['name'] for a in self.ALGORITHMS]
+            self.select_algorithm_combobox['values'] = [self.get_algorithm_display_name(a) for a in self.ALGORITHMS]
             self.option_add("*TCombobox*Font", self.my_font)
 
             self.selected_algorithm_var.set(self.select_algorithm_combobox['values'][0])
@@ -119,10 +150,13 @@ class App(TkinterDnD.Tk):
 
             self.select_algorithm_combobox.pack(side=tk.LEFT, padx=10)
             self.select_parameters_btn.pack(side=tk.LEFT, padx=10)
+            self.sweep_btn.pack(side=tk.LEFT, padx=10)
 
             self.clear_btn = self.CustomButton(self.buttons_frame, text='✖', font=self.my_font, width=5, command=self.clear_data)
             self.clear_btn.pack(side=tk.LEFT, padx=10)
 
+            self.start_pending_validation()
+
             # images
             self.images_frame = tk.Frame(self.main_frame, bg=self.BG_COLOR)
             # self.images_frame = tk.Frame(self.main_frame, bg='red')
@@ -141,6 +175,14 @@ class App(TkinterDnD.Tk):
             self.output_canvas.bind("<Enter>", lambda x: self.show_save_output_button())
             self.output_canvas.bind("<Leave>", lambda x: self.hide_save_output_button())
 
+            # zoom with the mouse wheel, pan by dragging, double click fits the image; both views move together
+            view_size = (int(self.IMG_SIZE), int(self.IMG_SIZE))
+            self.input_view = PyramidView(self.input_canvas, view_size, self.make_tile_photo)
+            self.output_view = PyramidView(self.output_canvas, view_size, self.make_tile_photo)
+            self.input_view.link(self.output_view)
+            self.input_view.bind()
+            self.output_view.bind()
+
             self.algorithm_btn = self.CustomButton(self.images_frame, text='➡', font=fnt.Font(size=32), width=4,
                                            command=self.on_start_processing_image)
 
@@ -148,9 +190,31 @@ class App(TkinterDnD.Tk):
             self.algorithm_btn.pack(side=tk.LEFT, padx=10)
             self.output_canvas.pack(side=tk.LEFT)
 
+            # progress of the running algorithm
+            self.progress_frame = tk.Frame(self.main_frame, bg=self.BG_COLOR)
+            self.progress_bar = ttk.Progressbar(self.progress_frame, length=self.IMG_SIZE, maximum=1.0)
+            self.cancel_btn = self.CustomButton(self.progress_frame, text='Cancel', font=self.my_font, width=10,
+                                                state=tk.DISABLED, command=self.cancel_processing)
+            self.progress_bar.pack(side=tk.LEFT, padx=10)
+            self.cancel_btn.pack(side=tk.LEFT, padx=10)
+
+            # time spent in the stages of the last run, the spans of the session can be exported as a trace
+            self.status_frame = tk.Frame(self.main_frame, bg=self.BG_COLOR)
+            self.status_var = tk.StringVar()
+            self.status_label = tk.Label(self.status_frame, textvariable=self.status_var, font=self.my_font,
+                                         bg=self.BG_COLOR, anchor=tk.W, width=90)
+            self.export_trace_btn = self.CustomButton(self.status_frame, text='Export trace', font=self.my_font,
+                                                      width=12, command=self.open_export_trace_dialog)
+            self.status_label.pack(side=tk.LEFT, padx=10)
+            self.export_trace_btn.pack(side=tk.LEFT, padx=10)
+
             self.buttons_frame.pack()
             tk.Frame(self.main_frame, height=20, bg=self.BG_COLOR).pack()
             self.images_frame.pack()
+            tk.Frame(self.main_frame, height=20, bg=self.BG_COLOR).pack()
+            self.progress_frame.pack()
+            tk.Frame(self.main_frame, height=10, bg=self.BG_COLOR).pack()
+            self.status_frame.pack()
 
             self.icon = tk.PhotoImage(file='assets/save_icon24.png')
             self.save_output_btn = self.CustomButton(self.output_canvas, image=self.icon, height=36, width=36,
@@ -161,6 +225,13 @@ class App(TkinterDnD.Tk):
 
             self.parameters_window = None
             self.parameter_variables = []
+            self.live_preview_var = tk.IntVar(value=0)
+
+            self.sweep_window = None
+            self.sweep_variables = []
+            self.sweep_thread = None
+            self.sweep_data = None
+            self.sweep_thumbnails = []
 
     def open_context_menu(self, event, canvas):
         if canvas == self.input_canvas:
@@ -178,11 +249,18 @@ class App(TkinterDnD.Tk):
                 m.grab_release()
 
     def on_combobox_change(self):
+        selected = self.get_selected_algorithm_object()
+        if selected['name'] == self.selected_algorithm_name:
+            return  # only the pending mark changed
+        self.selected_algorithm_name = selected['name']
+
         self.init_params_by_algorithm()
         if len(self.data['parameters']) > 0:
             self.select_parameters_btn['state'] = tk.NORMAL
+            self.sweep_btn['state'] = tk.NORMAL
         else:
             self.select_parameters_btn['state'] = tk.DISABLED
+            self.sweep_btn['state'] = tk.DISABLED
 
     def init_params_by_algorithm(self):
         selected_alg = self.get_selected_algorithm_object()
@@ -190,37 +268,67 @@ class App(TkinterDnD.Tk):
         self.data['parameters'] = ['1' if p == 'True' else '0' if p == 'False' else p for p in param_strings]
 
     def load_image_from_path(self, path):
-        img = cv2.imread(path)
+        # a reduced resolution decode is shown at once, the full image is read on a background thread
+        self.stages_started = time.perf_counter()
+        try:
+            with profiler.span('reduced decode', args={'path': path}):
+                reduced = read_reduced_image(path, int(self.IMG_SIZE))
+        except (ValueError, OSError):
+            messagebox.showerror('Error', 'An error occurred while selecting image.')
+            return
 
-        if img is not None:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        self.data['image_before'] = None
+        self.clear_output_canvas()
+        self.input_view.set_image(reduced)
 
-            self.data['image_before'] = img
-            img_output = self.get_displayable_image(self.data['image_before'])
-            self.input_img = ImageTk.PhotoImage(image=Image.fromarray(img_output))
-            self.input_canvas_image = self.input_canvas.create_image(self.IMG_SIZE / 2, self.IMG_SIZE / 2,
-                                                                     anchor=tk.CENTER, image=self.input_img)
-            self.clear_output_canvas()
-        else:
-            messagebox.showerror('Error', 'An error occurred while selecting image.')
+        self.loading_path = path
+        thread = threading.Thread(target=self.load_full_image, args=(path,), daemon=True)
+        thread.start()
+        self.after(20, lambda: self.check_image_loading(thread, path))
+
+    def load_full_image(self, path):
+        try:
+            with profiler.span('decode', args={'path': path}):
+                self.loaded_image = (path, read_image(path))
+        except (ValueError, OSError) as e:
+            self.loaded_image = (path, e)
+
+    def check_image_loading(self, thread, path):
+        if thread.is_alive():
+            self.after(20, lambda: self.check_image_loading(thread, path))
+            return
+
+        loaded_path, img = self.loaded_image
+        if path != self.loading_path or loaded_path != path:
+            return      # another image was selected or the input was cleared meanwhile
+        self.loading_path = None
+        if isinstance(img, Exception):
+            self.input_view.clear()
+            messagebox.showerror('Error', f'An error occurred while loading image:\n{img}')
+            return
+
+        self.data['image_before'] = img
+        with profiler.span('display'):
+            self.input_view.set_image(img, keep_view=True)
+        self.show_stage_times('Image loaded')
 
     def open_file_dialog(self):
         path = filedialog.askopenfilename(initialdir=os.getcwd() + '/input_images',
-                                          filetypes=[('Images', self.IMG_EXTENSIONS)])
+                                          filetypes=[('Images', IMAGE_EXTENSIONS)])
         if path:
             self.load_image_from_path(path)
 
     def open_save_dialog(self):
-        if self.output_image_displayed:
+        if self.data['image_after'] is not None:
             path = filedialog.asksaveasfilename(initialdir=os.getcwd() + '/output_images',
                                                 defaultextension="*.*",
-                                                filetypes=[('JPG (*.jpg)', '.jpg'), ('PNG (*.png)', '.png')])
+                                                filetypes=[('JPG (*.jpg)', '.jpg'), ('PNG (*.png)', '.png'),
+                                                           ('TIFF (*.tif)', '.tif'), ('NumPy array (*.npy)', '.npy')])
             if path:
-                image_to_save = self.data['image_after']
-                if len(image_to_save.shape) == 3:
-                    image_to_save = cv2.cvtColor(image_to_save, cv2.COLOR_RGB2BGR)
-
-                cv2.imwrite(path, image_to_save)
+                try:
+                    write_image(path, self.data['image_after'])
+                except (ValueError, OSError) as e:
+                    messagebox.showerror('Error', f'An error occurred while saving image:\n{e}')
 
     def on_file_drop(self, event):
         path = event.data
@@ -228,76 +336,196 @@ class App(TkinterDnD.Tk):
             messagebox.showwarning('Warning', 'You can only drag a single image file.')
             return
 
-        if '.' + path.split('.')[-1] in self.IMG_EXTENSIONS:
+        if get_extension(path) in IMAGE_EXTENSIONS:
             self.load_image_from_path(path)
         else:
             messagebox.showerror('Error', 'This file type is not supported.')
 
-    def get_displayable_image(self, image):
-        max_dim = max(*(image.shape[:2]))
-        diff = self.IMG_SIZE / max_dim
-
-        if diff < 1:
-            return cv2.resize(image, (0, 0), fx=diff, fy=diff)
-        return image
-
     def on_start_processing_image(self):
+        if self.loading_path is not None:
+            messagebox.showinfo('Info', 'The image is still being loaded.')
+            return
         if self.data.get('image_before', None) is None:
             messagebox.showerror('Error', 'No image selected.')
             return
-
-        self.algorithm_btn['state'] = tk.DISABLED
-        self.output_canvas.delete(self.output_canvas_image)
-        self.output_canvas.itemconfigure(self.output_canvas_button, state=tk.HIDDEN)
-        # self.processing_image_thread = threading.Thread(target=self.run_process_image)
-
-        self.loading_animation(0)
-        self.processing_image_thread = KillableThread(target=self.run_process_image, daemon=True)
-        self.processing_image_thread.start()
-        self.after(20, self.check_processing_thread)
-
-    def run_process_image(self):
-        # self.loading_animation(0)
+        if self.get_selected_algorithm_object()['pending']:
+            messagebox.showinfo('Info', 'The algorithm is still being validated.')
+            return
 
         selected = self.get_selected_algorithm_object()
         param_types = [p['type'] for p in selected['params']]
-        parameters = [self.evaluate_string_parameter(type, param) for type, param in zip(param_types, self.data['parameters'])]
+        self.stages_started = time.perf_counter()
+        with profiler.span('evaluate parameters'):
+            parameters = [self.evaluate_string_parameter(type, param) for type, param in zip(param_types, self.data['parameters'])]
 
         for i, p in enumerate(parameters):
             if p is None:
-                self.stop_loading_animation()
                 messagebox.showerror('Error', f"Parameter #{i+1} ({selected['params'][i]['name']}) is null.")
-                self.algorithm_btn['state'] = tk.NORMAL
                 return
 
-        process_result = None
+        # algorithms predicted to exceed their memory budget on the image run their fallback or are refused
         try:
-            process_result = selected['method'](self.data['image_before'], *parameters)
-        except Exception as e:
-            self.stop_loading_animation()
-            self.data['image_after'] = None
-            time.sleep(0.1)
-            messagebox.showerror('Error', f"Error while processing input image with algorithm '{selected['name']}':\n"
-                                          f"{get_traceback_data(e, ignore_file=sys.argv[0])}")
-            self.algorithm_btn['state'] = tk.NORMAL
-            self.processing_image_thread.kill()
-
-        error = self.validation.validate_image(process_result)
-
-        if error is None:
-            img_output = self.get_displayable_image(process_result)
-            self.data['image_after'] = process_result
-            self.render_right_image(img_output)
-        else:
-            messagebox.showerror('Error', error)
+            algorithm, parameters = fit_memory_budget(selected, self.ALGORITHMS, self.data['image_before'].shape,
+                                                      parameters)
+        except MemoryBudgetError as e:
+            messagebox.showerror('Memory budget', str(e))
+            return
+        if algorithm['pending']:
+            messagebox.showinfo('Info', f"The algorithm '{algorithm['name']}' is still being validated.")
+            return
 
-        self.algorithm_btn['state'] = tk.NORMAL
+        self.algorithm_btn['state'] = tk.DISABLED
+        self.cancel_btn['state'] = tk.NORMAL
+        self.output_view.clear()
+        self.output_canvas.itemconfigure(self.output_canvas_button, state=tk.HIDDEN)
+
+        self.processing_progress = ProgressToken()
+        self.processing_outcome = None
+        self.progress_bar.configure(mode='indeterminate', value=0)
+        self.progress_bar.start(20)
+        self.processing_image_thread = threading.Thread(target=self.run_process_image,
+                                                        args=(algorithm, parameters, self.processing_progress,
+                                                              selected),
+                                                        daemon=True)
+        self.processing_image_thread.start()
+        self.after(20, self.check_processing_thread)
+
+    def run_process_image(self, selected, parameters, progress, requested=None):
+        # runs on the processing thread, the outcome is shown by check_processing_thread.
+        # requested is the algorithm chosen by the user when selected is its memory fallback
+        outcome = {'progress': progress, 'algorithm': selected, 'requested': requested or selected,
+                   'result': None, 'error': None, 'memory': None}
+        try:
+            if isinstance(selected['method'], Pipeline):
+                process_result, outcome['memory'] = self.run_pipeline(selected, parameters, progress)
+            else:
+                with profiler.span('cache lookup'):
+                    cache_key = self.result_cache.key(selected['method'], self.data['image_before'], parameters)
+                    process_result = self.result_cache.get(cache_key)
+                if process_result is None:
+                    memory = {}
+                    algorithm_args = {'algorithm': selected['name']}
+                    with profiler.span('algorithm', args=algorithm_args):
+                        process_result = self.worker_pool.run(selected['module'], selected['config']['method'],
+                                                              self.data['image_before'], parameters,
+                                                              options=self.get_algorithm_options(selected['method']),
+                                                              progress=progress, preview=self.on_algorithm_preview,
+                                                              profiler=profiler, memory=memory)
+                        algorithm_args.update(memory)
+                    outcome['memory'] = memory
+                    with profiler.span('validate image'):
+                        outcome['error'] = self.validation.validate_image(process_result)
+                    if outcome['error'] is None:
+                        self.result_cache.put(cache_key, process_result)
+            outcome['result'] = process_result
+        except Cancelled:
+            pass
+        except (WorkerError, StageError) as e:
+            outcome['error'] = f"Error while processing input image with algorithm '{selected['name']}':\n{e}"
+        except Exception as e:
+            outcome['error'] = f"Error while processing input image with algorithm '{selected['name']}':\n" \
+                               f"{get_traceback_data(e, ignore_file=sys.argv[0])}"
+        self.processing_outcome = outcome
+
+    def run_pipeline(self, pipeline, parameters, progress):
+        # the stages run one at a time in the worker pool and their outputs are cached, so after a change of
+        # the parameters of a stage only the stages from it onward run again.
+        # Returns the result and the peak memory of the stage that used the most.
+        stage_memory = []
+
+        def run_stage(i, stage, img, stage_parameters):
+            memory = {}
+            algorithm_args = {'algorithm': pipeline['name'], 'stage': stage['name']}
+            with profiler.span('algorithm', args=algorithm_args):
+                result = self.worker_pool.run(stage['module'], stage['method'], img, stage_parameters,
+                                              options=self.get_algorithm_options(pipeline['method'].get_methods()[i]),
+                                              progress=progress, preview=self.on_algorithm_preview,
+                                              profiler=profiler, memory=memory)
+                algorithm_args.update(memory)
+            stage_memory.append(memory)
+            with profiler.span('validate image'):
+                error = self.validation.validate_image(result)
+            if error is not None:
+                raise StageError(f"Stage {i + 1} ({stage['name']}): {error}")
+            return result
+
+        result, _ = pipeline['method'].run(self.data['image_before'], parameters, run_stage=run_stage,
+                                           cache=self.result_cache)
+        return result, max(stage_memory, key=lambda memory: memory.get('peak_traced', None) or 0, default=None)
+
+    def get_algorithm_options(self, method):
+        # optional keyword arguments, passed only to the algorithms accepting them.
+        # The worker pool adds 'preview' and 'progress' (see src/progress.py) to the algorithms accepting them.
+        options = {
+            'checkpoint': True      # keep the state of iterative algorithms in the worker to resume it
+        }
+        accepted = get_keyword_parameters(method)
+        return {name: value for name, value in options.items() if name in accepted}
+
+    def on_algorithm_preview(self, image, iterations):
+        # called from the processing thread, the image is rendered by check_processing_thread
+        self.data['preview'] = image
 
     def check_processing_thread(self):
+        progress = self.processing_progress
         if self.processing_image_thread.is_alive():
+            preview, self.data['preview'] = self.data['preview'], None
+            if preview is not None and not progress.cancelled and self.validation.validate_image(preview) is None:
+                self.render_right_image(preview)
+            self.update_progress_bar(progress)
             self.after(20, self.check_processing_thread)
-        else:
-            self.stop_loading_animation()
+            return
+
+        outcome = self.processing_outcome
+        if outcome is None or outcome['progress'].cancelled:
+            # cancelled runs leave the canvas as cleared
+            return
+        self.stop_progress_bar()
+        self.data['preview'] = None
+
+        if outcome['error'] is not None:
+            self.data['image_after'] = None
+            messagebox.showerror('Error', outcome['error'])
+        elif outcome['result'] is not None:
+            self.data['image_after'] = outcome['result']
+            with profiler.span('display'):
+                self.render_right_image(outcome['result'])
+            title = f"Last run of '{outcome['algorithm']['name']}'"
+            if outcome['requested'] is not outcome['algorithm']:
+                title += f" (memory fallback of '{outcome['requested']['name']}')"
+            stopped = outcome['progress'].stopped_early()
+            if stopped is not None:
+                title += f', {stopped}'
+            self.show_stage_times(title, outcome['memory'])
+
+    def update_progress_bar(self, progress):
+        fraction = progress.fraction()
+        if fraction is None:
+            return
+        if str(self.progress_bar['mode']) != 'determinate':
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate')
+        self.progress_bar['value'] = fraction
+
+    def stop_progress_bar(self):
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode='determinate', value=0)
+        self.cancel_btn['state'] = tk.DISABLED
+        self.algorithm_btn['state'] = tk.NORMAL
+
+    def on_close(self):
+        self.cancel_processing()
+        self.cancel_live_preview()
+        self.worker_pool.close()
+        self.preview_pool.close()
+        self.destroy()
+
+    def cancel_processing(self):
+        # the worker running the algorithm is terminated and replaced
+        if self.processing_progress is not None:
+            self.processing_progress.cancel()
+        self.stop_progress_bar()
+        self.data['preview'] = None
 
     def open_select_parameters_window(self):
         self.select_parameters_btn['state'] = tk.DISABLED
@@ -348,19 +576,318 @@ class App(TkinterDnD.Tk):
                 entry = tk.Entry(parameters_frame, textvariable=var, width=50)
                 entry.grid(row=i, column=1, padx=10, pady=10, sticky=tk.W)
                 self.parameter_variables.append(var)
+            var.trace_add('write', lambda *args: self.schedule_live_preview())
+
+        live_preview_checkbox = tk.Checkbutton(parameters_window_main_frame, text='Live preview', font=self.my_font,
+                                               variable=self.live_preview_var, bg=self.BG_COLOR,
+                                               command=self.schedule_live_preview)
+        live_preview_checkbox.pack()
+        self.CustomToolTip(live_preview_checkbox, text='Runs the algorithm on a downscaled copy of the image\n'
+                                                       'whenever a parameter changes. Save runs it on the full image.')
+        self.schedule_live_preview()
 
         self.CustomButton(parameters_window_main_frame, text='Save', font=self.my_font_bigger, width=10,
                           command=self.validate_and_set_parameters).pack(pady=10)
 
+    def schedule_live_preview(self):
+        # previews are debounced, a change cancels the pending and the running ones
+        self.cancel_live_preview()
+        if self.parameters_window is None or not self.live_preview_var.get() or self.data['image_before'] is None:
+            return
+        self.preview_job = self.after(self.PREVIEW_DEBOUNCE_MS, self.start_live_preview)
+
+    def cancel_live_preview(self):
+        if self.preview_job is not None:
+            self.after_cancel(self.preview_job)
+            self.preview_job = None
+        if self.preview_progress is not None:
+            self.preview_progress.cancel()
+            self.preview_progress = None
+
+    def start_live_preview(self):
+        self.preview_job = None
+        selected = self.get_selected_algorithm_object()
+        if selected['pending']:
+            return
+        try:
+            parameters = [self.evaluate_string_parameter(param['type'], str(variable.get()))
+                          for variable, param in zip(self.parameter_variables, selected['params'])]
+        except Exception:
+            return      # the value is still being typed, Save reports the errors
+        if any(p is None for p in parameters):
+            return
+
+        progress = ProgressToken()
+        self.preview_progress = progress
+        thread = threading.Thread(target=self.run_live_preview, args=(selected, parameters, progress), daemon=True)
+        thread.start()
+        self.after(20, lambda: self.check_live_preview(thread, progress))
+
+    def run_live_preview(self, selected, parameters, progress):
+        image = self.data['image_before']
+        try:
+            if self.proxy is None or self.proxy[0] is not image:
+                self.proxy = (image, *make_proxy(image, int(self.IMG_SIZE)))
+            _, proxy, scale = self.proxy
+            proxy_parameters = get_proxy_parameters(selected, parameters, scale)
+            if isinstance(selected['method'], Pipeline):
+                # stage outputs of the proxy are cached, a change of a later stage previews from that stage on
+                result, _ = selected['method'].run(
+                    proxy, proxy_parameters, cache=self.result_cache,
+                    run_stage=lambda i, stage, img, stage_parameters: self.preview_pool.run(
+                        stage['module'], stage['method'], img, stage_parameters, progress=progress,
+                        grace=self.PREVIEW_CANCEL_GRACE))
+            else:
+                result = self.preview_pool.run(selected['module'], selected['config']['method'], proxy,
+                                               proxy_parameters, progress=progress, grace=self.PREVIEW_CANCEL_GRACE)
+        except Exception:
+            return      # cancelled or failed, failures are reported by the full resolution run
+        if self.validation.validate_image(result) is None:
+            self.data['live_preview'] = (progress, result)
+
+    def check_live_preview(self, thread, progress):
+        if thread.is_alive():
+            self.after(20, lambda: self.check_live_preview(thread, progress))
+            return
+
+        live_preview, self.data['live_preview'] = self.data['live_preview'], None
+        processing = self.processing_image_thread is not None and self.processing_image_thread.is_alive()
+        if live_preview is None or live_preview[0] is not progress or progress.cancelled or processing:
+            return
+        self.output_canvas.itemconfigure(self.output_canvas_button, state=tk.HIDDEN)
+        self.data['image_after'] = None     # only full resolution results are saved
+        self.render_right_image(live_preview[1])
+
     def on_parameters_window_close(self):
+        self.cancel_live_preview()
         if self.parameters_window:
             self.select_parameters_btn['state'] = tk.NORMAL
             self.select_algorithm_combobox['state'] = "readonly"
             self.parameters_window.destroy()
 
+    def open_sweep_window(self):
+        self.sweep_btn['state'] = tk.DISABLED
+        self.select_algorithm_combobox['state'] = tk.DISABLED
+
+        self.sweep_window = tk.Toplevel(self)
+        self.sweep_window.protocol("WM_DELETE_WINDOW", lambda: self.on_sweep_window_close())
+
+        self.sweep_window.title("Parameter sweep")
+        self.sweep_window.geometry("800x400")
+        self.sweep_window.configure(bg=self.BG_COLOR)
+
+        self.sweep_window.rowconfigure(0, weight=1)
+        self.sweep_window.columnconfigure(0, weight=1)
+        self.sweep_window.rowconfigure(2, weight=1)
+        self.sweep_window.columnconfigure(2, weight=1)
+
+        self.sweep_variables = []
+
+        sweep_window_main_frame = tk.Frame(self.sweep_window, bg=self.BG_COLOR)
+        sweep_window_main_frame.grid(row=1, column=1)
+
+        tk.Label(sweep_window_main_frame, text='Scalar parameters take a list of values, '
+                                               'e.g. np.linspace(0.001, 0.1, 50)',
+                 font=self.my_font, bg=self.BG_COLOR).pack(pady=10)
+
+        parameters_frame = tk.Frame(sweep_window_main_frame, bg=self.BG_COLOR)
+        parameters_frame.pack(pady=10)
+
+        for i, param in enumerate(self.get_selected_algorithm_object()['params']):
+            param_name = param['name'] if len(param['name']) <= self.PARAM_NAME_MAX_LENGTH \
+                    else param['name'][:self.PARAM_NAME_MAX_LENGTH-3] + '...'
+            label = tk.Label(parameters_frame, text=param_name, font=self.my_font, bg=self.BG_COLOR)
+            label.grid(row=i, column=0, padx=10, sticky=tk.W)
+
+            if param.get('description', None):
+                self.CustomToolTip(label, text=param['name'] + ':\n' + param['description'])
+
+            var = tk.StringVar()
+            if self.data['parameters'][i] is not None:
+                var.set(self.data['parameters'][i])
+            entry = tk.Entry(parameters_frame, textvariable=var, width=50)
+            entry.grid(row=i, column=1, padx=10, pady=10, sticky=tk.W)
+            self.sweep_variables.append(var)
+
+        self.sweep_run_btn = self.CustomButton(sweep_window_main_frame, text='Run', font=self.my_font_bigger, width=10,
+                                               command=self.on_start_sweep)
+        self.sweep_run_btn.pack(pady=10)
+
+    def on_sweep_window_close(self):
+        if self.sweep_data is not None:
+            self.sweep_data['progress'].cancel()
+        if self.sweep_window:
+            self.sweep_btn['state'] = tk.NORMAL
+            self.select_algorithm_combobox['state'] = "readonly"
+            self.sweep_window.destroy()
+            self.sweep_window = None
+
+    def on_start_sweep(self):
+        if self.loading_path is not None:
+            messagebox.showinfo('Info', 'The image is still being loaded.', parent=self.sweep_window)
+            return
+        if self.data.get('image_before', None) is None:
+            messagebox.showerror('Error', 'No image selected.', parent=self.sweep_window)
+            return
+        if self.get_selected_algorithm_object()['pending']:
+            messagebox.showinfo('Info', 'The algorithm is still being validated.', parent=self.sweep_window)
+            return
+
+        selected = self.get_selected_algorithm_object()
+        param_strings = [str(variable.get()) for variable in self.sweep_variables]
+        values = []
+        for i, (param, value) in enumerate(zip(selected['params'], param_strings)):
+            try:
+                values.append(evaluate_sweep_values(param['type'], value))
+            except Exception as e:
+                messagebox.showerror('Evaluation error', f"'Parameter #{i+1} ({param['name']}): {e}",
+                                     parent=self.sweep_window)
+                return
+
+        results_count = int(np.prod(get_sweep_shape(values)))
+        if results_count > self.SWEEP_MAX_RESULTS:
+            messagebox.showerror('Error', f'The sweep has {results_count} results. '
+                                          f'Expected at most {self.SWEEP_MAX_RESULTS}.', parent=self.sweep_window)
+            return
+
+        self.sweep_run_btn['state'] = tk.DISABLED
+        self.sweep_data = {'algorithm': selected, 'param_strings': param_strings, 'values': values,
+                           'progress': ProgressToken()}
+        self.sweep_thread = threading.Thread(target=self.run_sweep, daemon=True)
+        self.sweep_thread.start()
+        self.after(20, self.check_sweep_thread)
+
+    def run_sweep(self):
+        try:
+            self.sweep_data['grid'] = run_sweep(self.sweep_data['algorithm'], self.data['image_before'],
+                                                self.sweep_data['values'], progress=self.sweep_data['progress'])
+        except Cancelled:
+            pass
+        except Exception as e:
+            self.sweep_data['error'] = f"Error while sweeping parameters of algorithm " \
+                                       f"'{self.sweep_data['algorithm']['name']}':\n" \
+                                       f"{get_traceback_data(e, ignore_file=sys.argv[0])}"
+
+    def check_sweep_thread(self):
+        if self.sweep_thread.is_alive():
+            self.after(20, self.check_sweep_thread)
+            return
+
+        if self.sweep_data['progress'].cancelled:
+            return
+        self.on_sweep_window_close()
+        if self.sweep_data.get('error', None):
+            messagebox.showerror('Error', self.sweep_data['error'])
+        else:
+            self.show_sweep_results()
+
+    def show_sweep_results(self):
+        algorithm, values, grid = self.sweep_data['algorithm'], self.sweep_data['values'], self.sweep_data['grid']
+        swept = [i for i, v in enumerate(values) if len(v) > 1]
+
+        results_window = tk.Toplevel(self)
+        results_window.title(f"Sweep results - {algorithm['name']}")
+        results_window.geometry("1000x700")
+        results_window.configure(bg=self.BG_COLOR)
+
+        canvas = tk.Canvas(results_window, bg=self.BG_COLOR, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(results_window, orient=tk.VERTICAL, command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        results_frame = tk.Frame(canvas, bg=self.BG_COLOR)
+        canvas.create_window(0, 0, anchor=tk.NW, window=results_frame)
+        results_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox(tk.ALL)))
+
+        self.sweep_thumbnails = []
+        for n, index in enumerate(np.ndindex(grid.shape)):
+            result = grid[index]
+            label = ', '.join(f"{algorithm['params'][i]['name']}={self.format_sweep_value(values[i][index[i]])}"
+                              for i in swept)
+            cell = tk.Frame(results_frame, bg=self.BG_COLOR)
+            cell.grid(row=n // self.SWEEP_COLUMNS, column=n % self.SWEEP_COLUMNS, padx=5, pady=5)
+
+            error = self.validation.validate_image(result)
+            if error is None:
+                thumbnail = ImageTk.PhotoImage(image=Image.fromarray(self.get_sweep_thumbnail(result)))
+                self.sweep_thumbnails.append(thumbnail)
+                tk.Button(cell, image=thumbnail, command=lambda i=index: self.select_sweep_result(i)).pack()
+            else:
+                tk.Label(cell, text=error, wraplength=self.SWEEP_THUMBNAIL_SIZE, bg=self.BG_COLOR).pack()
+            tk.Label(cell, text=label, bg=self.BG_COLOR).pack()
+
+    def select_sweep_result(self, index):
+        algorithm, values = self.sweep_data['algorithm'], self.sweep_data['values']
+        parameters = []
+        for i, (param, param_string) in enumerate(zip(algorithm['params'], self.sweep_data['param_strings'])):
+            if len(values[i]) > 1:
+                value = values[i][index[i]]
+                param_string = str(int(value)) if param['type'] == ParamType.BOOL else repr(value)
+            parameters.append(param_string)
+
+        self.data['parameters'] = parameters
+        self.clear_output_canvas()
+        self.data['image_after'] = self.sweep_data['grid'][index]
+        self.render_right_image(self.data['image_after'])
+
+    def format_sweep_value(self, value):
+        return f'{value:.4g}' if isinstance(value, float) else str(value)
+
+    def get_sweep_thumbnail(self, image):
+        image = to_display(image)
+        scale = self.SWEEP_THUMBNAIL_SIZE / max(*(image.shape[:2]))
+        if scale < 1:
+            return cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return image
+
     def get_selected_algorithm_object(self):
         selected_algorithm = self.select_algorithm_combobox.get()
-        return list(filter(lambda a: a['name'] == selected_algorithm, self.ALGORITHMS))[0]
+        return list(filter(lambda a: self.get_algorithm_display_name(a) == selected_algorithm, self.ALGORITHMS))[0]
+
+    def get_algorithm_display_name(self, algorithm):
+        return algorithm['name'] + (self.PENDING_SUFFIX if algorithm['pending'] else '')
+
+    def start_pending_validation(self):
+        pending = [a for a in self.ALGORITHMS if a['pending']]
+        if pending:
+            self.validation_thread = threading.Thread(target=self.validate_pending_algorithms, args=(pending,),
+                                                      daemon=True)
+            self.validation_thread.start()
+            self.after(100, self.check_validation_thread)
+
+    def validate_pending_algorithms(self, algorithms):
+        self.validation.validate_pending(algorithms, cache_file=VALIDATION_CACHE_FILE,
+                                         on_validated=lambda algorithm, error: self.validation_results.put((algorithm, error)))
+
+    def check_validation_thread(self):
+        updated = False
+        while not self.validation_results.empty():
+            algorithm, error = self.validation_results.get()
+            if error:
+                self.validation_errors.append({'detail': algorithm['name'], 'errors': [error]})
+                self.ALGORITHMS.remove(algorithm)
+            updated = True
+
+        if updated:
+            self.update_algorithm_combobox()
+
+        if self.validation_thread.is_alive() or not self.validation_results.empty():
+            self.after(100, self.check_validation_thread)
+        elif self.validation_errors:
+            messagebox.showerror('Config error', format_errors('Validation errors occurred:\n', self.validation_errors))
+            self.validation_errors = []
+            if len(self.ALGORITHMS) == 0:
+                self.on_close()
+                exit()
+
+    def update_algorithm_combobox(self):
+        selected = [a for a in self.ALGORITHMS if a['name'] == self.selected_algorithm_name]
+        self.select_algorithm_combobox['values'] = [self.get_algorithm_display_name(a) for a in self.ALGORITHMS]
+        if selected:
+            self.selected_algorithm_var.set(self.get_algorithm_display_name(selected[0]))
+        elif self.ALGORITHMS:
+            self.selected_algorithm_var.set(self.select_algorithm_combobox['values'][0])
 
     def validate_and_set_parameters(self):
         param_values = []
@@ -377,32 +904,24 @@ class App(TkinterDnD.Tk):
         self.data['parameters'] = param_values
         self.parameter_variables = []
         self.on_parameters_window_close()
+        if self.live_preview_var.get() and self.data['image_before'] is not None:
+            self.on_start_processing_image()
 
     def evaluate_string_parameter(self, param_type: ParamType, value: str):
-        if value is None:
-            return None
-        return {
-            ParamType.INT: int,
-            ParamType.FLOAT: float,
-            ParamType.BOOL: bool,
-            ParamType.NPARRAY: np.asarray,
-        }.get(param_type, int)(eval(value))
+        return evaluate_string_parameter(param_type, value)
 
     def clear_data(self):
         self.clear_input_canvas()
         self.clear_output_canvas()
 
-        self.stop_loading_animation()
+        self.cancel_processing()
         self.init_params_by_algorithm()
 
         self.on_parameters_window_close()
+        self.on_sweep_window_close()
 
-        self.algorithm_btn['state'] = tk.NORMAL
         # self.selected_algorithm_var.set(self.select_algorithm_combobox['values'][0])
 
-        if self.processing_image_thread:
-            self.processing_image_thread.kill()
-
     def show_save_output_button(self):
         if self.data['image_after'] is not None:
             self.output_canvas.itemconfigure(self.output_canvas_button, state=tk.NORMAL)
@@ -412,51 +931,42 @@ class App(TkinterDnD.Tk):
             self.output_canvas.itemconfigure(self.output_canvas_button, state=tk.HIDDEN)
 
     def render_right_image(self, image):
-        self.output_image_displayed = ImageTk.PhotoImage(image=Image.fromarray(image))
-        self.output_canvas_image = self.output_canvas.create_image(self.IMG_SIZE / 2, self.IMG_SIZE / 2,
-                                                                   anchor=tk.CENTER, image=self.output_image_displayed)
+        self.output_view.set_image(image)
+
+    def make_tile_photo(self, tile):
+        with profiler.span('tile conversion', 'display'):
+            return ImageTk.PhotoImage(image=Image.fromarray(tile))
+
+    def show_stage_times(self, title, memory=None):
+        events = profiler.get_events(since=self.stages_started, category=STAGE)
+        text = f'{title}: {format_summary(summarize(events))}'
+        if memory:
+            text += f'; {format_memory_stats(memory)}'
+        self.status_var.set(text)
+
+    def open_export_trace_dialog(self):
+        path = filedialog.asksaveasfilename(initialdir=os.getcwd(), initialfile='trace.json',
+                                            defaultextension='.json', filetypes=[('Chrome trace (*.json)', '.json')])
+        if path:
+            try:
+                profiler.save_chrome_trace(path)
+            except OSError as e:
+                messagebox.showerror('Error', f'An error occurred while exporting the trace:\n{e}')
 
     def clear_input_canvas(self):
-        self.input_canvas.delete(self.input_canvas_image)
-        self.input_canvas_image = None
-        self.input_image_displayed = None
+        self.input_view.clear()
+        self.loading_path = None
         self.data['image_before'] = None
 
     def clear_output_canvas(self):
-        self.output_canvas.delete(self.output_canvas_image)
-        self.output_canvas_image = None
-        self.output_image_displayed = None
+        self.output_view.clear()
         self.output_canvas.itemconfigure(self.output_canvas_button, state=tk.HIDDEN)
-        self.output_canvas.delete(self.current_gif_frame)
-        self.current_gif_frame = None
         self.data['image_after'] = None
-
-    def init_loading_indicator(self, file):
-        gif = Image.open(file)
-        frames = gif.n_frames
-        self.gif_frames = [tk.PhotoImage(file=file, format=f"gif -index {i}") for i in range(frames)]
-        self.gif_frames_count = gif.n_frames
-
-    def loading_animation(self, i):
-        gif_frame = self.gif_frames[i]
-
-        self.output_canvas.delete(self.current_gif_frame)
-        self.current_gif_frame = self.output_canvas.create_image(self.IMG_SIZE / 2, self.IMG_SIZE / 2,
-                                                                 anchor=tk.CENTER, image=gif_frame)
-        i += 1
-        if i == self.gif_frames_count:
-            i = 0
-        self.loading_indicator_animation_obj = self.after(20, lambda: self.loading_animation(i))
-
-    def stop_loading_animation(self):
-        if self.loading_indicator_animation_obj:
-            self.after_cancel(self.loading_indicator_animation_obj)
-            self.output_canvas.delete(self.current_gif_frame)
-            self.current_gif_frame = None
+        self.data['preview'] = None
 
     def open_in_external_program(self, image):
         if image is not None:
-            to_be_shown = Image.fromarray(image)
+            to_be_shown = Image.fromarray(to_display(image))
             to_be_shown.show()
 
     def CustomToolTip(self, widget, text):
@@ -502,40 +1012,6 @@ class ToolTip(object):
             tw.destroy()
 
 
-class KillableThread(threading.Thread):
-    """A subclass of threading.Thread, with a kill() method."""
-    def __init__(self, *args, **keywords):
-        threading.Thread.__init__(self, *args, **keywords)
-        self.killed = False
-
-    def start(self):
-        """Start the thread."""
-        self.__run_backup = self.run
-        self.run = self.__run      # Force the Thread to install our trace.
-        threading.Thread.start(self)
-
-    def __run(self):
-        """Hacked run function, which installs the trace."""
-        sys.settrace(self.globaltrace)
-        self.__run_backup()
-        self.run = self.__run_backup
-
-    def globaltrace(self, frame, why, arg):
-        if why == 'call':
-            return self.localtrace
-        else:
-            return None
-
-    def localtrace(self, frame, why, arg):
-        if self.killed:
-            if why == 'line':
-                raise SystemExit()
-            return self.localtrace
-
-    def kill(self):
-        self.killed = True
-
-
 if __name__ == "__main__":
     app = App()
     app.mainloop()
@@ -1,5 +1,13 @@
 from enum import Enum
+import inspect
 import traceback
+import math
+import numpy as np
+import cv2
+import skimage
+
+# modules available in parameter value expressions
+PARAMETER_NAMESPACE = {'np': np, 'math': math, 'cv2': cv2, 'skimage': skimage}
 
 
 class ParamType(Enum):
@@ -16,22 +24,60 @@ class ParamType(Enum):
 class ErrorType(Enum):
     PARSING = 0
     VALIDATION = 1
+    TIMEOUT = 2
+    CRASH = 3
 
     def __str__(self):
         return {
             ErrorType.PARSING: 'Parsing',
-            ErrorType.VALIDATION: 'Validation'
+            ErrorType.VALIDATION: 'Validation',
+            ErrorType.TIMEOUT: 'Timeout',
+            ErrorType.CRASH: 'Crash'
         }.get(self)
 
 
 def get_traceback_data(e: Exception, ignore_file: str):
-    data = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
+    data = traceback.format_exception(type(e), e, e.__traceback__)
     return ''.join((filter(lambda elem: ignore_file not in elem, data)))
 
 
+def get_keyword_parameters(method):
+    # parameters of a method, empty for builtins such as cv2.filter2D which have no signature and take no options
+    try:
+        return inspect.signature(method).parameters
+    except (ValueError, TypeError):
+        return {}
+
+
 def format_errors(title, errors):
     errors_grouped = []
     for data in errors:
         errors_grouped.append('ALGORITHM: ' + data['detail'] + '\n' + '\n'.join(['- ' + error for error in data['errors']]))
 
     return title + '\n\n' + '\n\n'.join(errors_grouped)
+
+
+PARAMETER_CONVERTERS = {
+    ParamType.INT: int,
+    ParamType.FLOAT: float,
+    ParamType.BOOL: bool,
+    ParamType.NPARRAY: np.asarray,
+}
+
+
+def evaluate_string_parameter(param_type: ParamType, value: str):
+    if value is None:
+        return None
+    return PARAMETER_CONVERTERS.get(param_type, int)(eval(value, dict(PARAMETER_NAMESPACE)))
+
+
+def evaluate_sweep_values(param_type: ParamType, value: str):
+    """Values of a swept parameter. Scalar parameters take a list, range or 1-D array of values,
+    any other value is a single one."""
+    if value is None:
+        return [None]
+    convert = PARAMETER_CONVERTERS.get(param_type, int)
+    value = eval(value, dict(PARAMETER_NAMESPACE))
+    if param_type != ParamType.NPARRAY and np.ndim(value) == 1:
+        return [convert(v) for v in value]
+    return [convert(value)]
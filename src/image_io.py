@@ -0,0 +1,110 @@
+import os
+import cv2
+import numpy as np
+from PIL import Image
+try:
+    import tifffile
+except ImportError:     # TIFF files are decoded by OpenCV, without memory mapping
+    tifffile = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.npy')
+# reduction factors OpenCV can apply while decoding
+REDUCED_READ_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def get_extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def read_image(path):
+    """Reads an RGB or grayscale image at full resolution, keeping its bit depth.
+
+    .npy files and uncompressed TIFF files are memory-mapped read-only instead of being read into memory,
+    other files are decoded by OpenCV. Alpha channels are dropped."""
+    extension = get_extension(path)
+    img = None
+    if extension == '.npy':
+        img = np.load(path, mmap_mode='r')
+    elif extension in ('.tif', '.tiff') and tifffile is not None:
+        try:
+            img = tifffile.memmap(path, mode='r')
+        except ValueError:
+            pass    # compressed or not contiguous, decoded by OpenCV
+
+    if img is None:
+        img = cv2.imread(path, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_ANYCOLOR)
+        if img is None:
+            raise ValueError(f"Could not read image '{path}'.")
+        if img.ndim == 3:
+            # the decoded array is converted in place, no second full size copy is made
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB if img.shape[2] == 4 else cv2.COLOR_BGR2RGB,
+                               dst=img if img.shape[2] == 3 else None)
+    elif img.ndim == 3 and img.shape[2] == 4:
+        img = img[:, :, :3]
+    return img
+
+
+def read_image_shape(path):
+    """Shape of the array read_image returns for a file, from the file header without decoding the image."""
+    extension = get_extension(path)
+    if extension == '.npy':
+        shape = np.load(path, mmap_mode='r').shape
+    elif extension in ('.tif', '.tiff') and tifffile is not None:
+        with tifffile.TiffFile(path) as tiff:
+            shape = tiff.pages[0].shape
+    else:
+        with Image.open(path) as image:
+            width, height = image.size
+            shape = (height, width) if len(image.getbands()) == 1 else (height, width, 3)
+    # alpha channels are dropped
+    return tuple(shape[:2]) + (3,) if len(shape) == 3 and shape[2] == 4 else tuple(shape)
+
+
+def read_reduced_image(path, max_size):
+    """Reads an image for display with its longest side at least max_size, or at full resolution when smaller.
+
+    JPEG and PNG files are decoded at a reduced resolution (JPEG by DCT scaling), memory-mapped files are
+    subsampled. The result is meant for showing the image while read_image loads it and may be 8-bit."""
+    extension = get_extension(path)
+    if extension in ('.npy', '.tif', '.tiff'):
+        img = read_image(path)
+        step = max(1, max(img.shape[:2]) // max_size)
+        return img[::step, ::step]
+
+    with Image.open(path) as image:
+        size = max(image.size)
+    factors = [factor for factor in REDUCED_READ_FLAGS if size // factor >= max_size]
+    if not factors:
+        return read_image(path)
+    img = cv2.imread(path, REDUCED_READ_FLAGS[max(factors)])
+    if img is None:
+        raise ValueError(f"Could not read image '{path}'.")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+
+
+def write_image(path, img):
+    """Writes an RGB or grayscale image. .npy files keep the array as it is. PNG and TIFF files keep uint8
+    and uint16 images, JPEG files uint8 ones; other values are clipped to [0, 255] and stored as uint8.
+    TIFF files are written uncompressed when possible, so read_image can memory-map them."""
+    extension = get_extension(path)
+    if extension == '.npy':
+        np.save(path, img)
+        return
+    tiff = extension in ('.tif', '.tiff') and tifffile is not None
+
+    depths = (np.uint8,) if extension in ('.jpg', '.jpeg') else (np.uint8, np.uint16)
+    if img.dtype == np.uint16 and np.uint16 not in depths:
+        img = (img // 257).astype(np.uint8)
+    elif img.dtype not in depths:
+        img = np.clip(img, 0, 255).astype(np.uint8)
+    if tiff:
+        tifffile.imwrite(path, img, photometric='rgb' if img.ndim == 3 else 'minisblack')
+        return
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    if not cv2.imwrite(path, img):
+        raise ValueError(f"Could not write image '{path}'.")
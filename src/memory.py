@@ -0,0 +1,128 @@
+import tracemalloc
+import numpy as np
+from algorithms.channels import GRAYSCALE
+from algorithms.memory import get_memory_status
+from src.helpers import evaluate_string_parameter
+
+# parameter of the algorithms converting RGB images to grayscale in the GRAYSCALE mode
+COLOR_MODE_PARAMETER = 'color mode'
+
+
+class MemoryBudgetError(Exception):
+    """Raised when an algorithm is predicted to need more memory than its budget on an image
+    and none of its fallbacks fits in theirs."""
+
+
+def reset_peak_rss():
+    # makes VmHWM start again from the current RSS, Linux only
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def format_bytes(size):
+    return f'{size / 2 ** 30:.1f} GiB' if size >= 2 ** 30 else f'{size / 2 ** 20:.0f} MiB'
+
+
+class MemoryTracker:
+    """Peak memory used while the block runs.
+
+    peak_traced is the peak of the memory allocated by the block as traced by tracemalloc, which includes
+    the arrays of NumPy, SciPy and OpenCV. peak_rss is the peak resident set size of the process above the one
+    at the start of the block, it also counts memory allocated outside of Python; it is None where the peak
+    cannot be reset, as a long-lived process would report its earlier peaks."""
+
+    def __init__(self):
+        self.peak_traced = None
+        self.peak_rss = None
+
+    def __enter__(self):
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.traced_start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.rss_start = get_memory_status('VmRSS') if reset_peak_rss() else None
+        return self
+
+    def __exit__(self, *exc_info):
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        if self.started_tracing:
+            tracemalloc.stop()
+        self.peak_traced = max(peak_traced - self.traced_start, 0)
+        peak_rss = get_memory_status('VmHWM')
+        if self.rss_start is not None and peak_rss is not None:
+            self.peak_rss = max(peak_rss - self.rss_start, 0)
+
+    def stats(self):
+        return {'peak_traced': self.peak_traced, 'peak_rss': self.peak_rss}
+
+
+def format_memory_stats(stats):
+    text = f"NumPy {format_bytes(stats['peak_traced'])}"
+    return f"peak RSS {format_bytes(stats['peak_rss'])}, {text}" if stats['peak_rss'] is not None else text
+
+
+def predict_footprint(algorithm, shape, parameters=None):
+    """Predicted peak memory in bytes of an algorithm on an image of the given shape, None without a memory entry.
+    An RGB image deconvolved in grayscale color mode counts as one channel."""
+    memory = algorithm.get('memory', None)
+    if memory is None:
+        return None
+    if len(shape) == 3 and parameters is not None:
+        values = {param['name']: value for param, value in zip(algorithm['params'], parameters)}
+        if values.get(COLOR_MODE_PARAMETER, None) == GRAYSCALE:
+            shape = shape[:2]
+    return memory['bytes_per_value'] * int(np.prod(shape))
+
+
+def get_fallback_parameters(algorithm, fallback, parameters):
+    # parameters of the fallback named like parameters of the algorithm take their values, the others their defaults
+    values = {param['name']: value for param, value in zip(algorithm['params'], parameters)}
+    fallback_names = {param['name'] for param in fallback['params']}
+    for param in algorithm['params']:
+        # the fallback would silently give another result than the one asked for
+        if param['name'] not in fallback_names and param['name'] in values and not np.array_equal(
+                values[param['name']], evaluate_string_parameter(param['type'], param.get('default', None))):
+            raise MemoryBudgetError(f"Parameter '{param['name']}' of '{algorithm['name']}' is not supported by its "
+                                    f"memory fallback '{fallback['name']}', which only runs with its default value.")
+    fallback_parameters = []
+    for param in fallback['params']:
+        value = values[param['name']] if param['name'] in values \
+            else evaluate_string_parameter(param['type'], param.get('default', None))
+        if value is None:
+            raise MemoryBudgetError(f"Parameter '{param['name']}' of the memory fallback '{fallback['name']}' "
+                                    f"has no default value.")
+        fallback_parameters.append(value)
+    return fallback_parameters
+
+
+def fit_memory_budget(algorithm, algorithms, shape, parameters):
+    """The algorithm and parameters to run on an image of the given shape within the memory budgets.
+
+    An algorithm predicted to need more than its budget is replaced by its fallback from algorithms, e.g. a tiled
+    variant, which is checked against its own budget in turn. Returns (algorithm, parameters).
+    Raises MemoryBudgetError when the image does not fit and there is no fallback left."""
+    tried = []
+    while True:
+        footprint = predict_footprint(algorithm, shape, parameters)
+        budget = algorithm['memory']['budget'] * 2 ** 20 if footprint is not None else None
+        if footprint is None or footprint <= budget:
+            return algorithm, parameters
+
+        tried.append(algorithm['name'])
+        fallback_of = f", the memory fallback of '{tried[0]}'," if len(tried) > 1 else ''
+        message = f"'{algorithm['name']}'{fallback_of} would need about {format_bytes(footprint)} for an image of " \
+                  f"{'x'.join(str(size) for size in shape)} values, over its memory budget of {format_bytes(budget)}"
+        fallback_name = algorithm['memory'].get('fallback', None)
+        if fallback_name is None:
+            raise MemoryBudgetError(message + '.')
+        fallback = next((a for a in algorithms if a['name'] == fallback_name), None)
+        if fallback is None or fallback_name in tried:
+            raise MemoryBudgetError(message + f", and its fallback '{fallback_name}' is not available.")
+
+        parameters = get_fallback_parameters(algorithm, fallback, parameters)
+        algorithm = fallback
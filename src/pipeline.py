@@ -0,0 +1,64 @@
+import importlib
+from src.cache import get_method_identity
+
+
+class StageError(Exception):
+    """Raised by the callers of Pipeline.run when a stage returned an invalid image."""
+
+
+class Pipeline:
+    """Algorithms of the config file run one after the other, each stage on the output of the previous one.
+
+    stages are dicts with the 'name', 'module' and 'method' of the stage algorithm and 'params', its number of
+    parameters. The parameters of a pipeline are the parameters of its stages in order. The methods are imported
+    when first needed, so pipelines can be sent to worker processes."""
+
+    def __init__(self, stages):
+        self.stages = [dict(stage) for stage in stages]
+        self._methods = None
+
+    def __getstate__(self):
+        return {'stages': self.stages, '_methods': None}
+
+    def __call__(self, img, *parameters):
+        return self.run(img, parameters)[0]
+
+    def get_methods(self):
+        if self._methods is None:
+            self._methods = [getattr(importlib.import_module(stage['module']), stage['method'])
+                             for stage in self.stages]
+        return self._methods
+
+    def split_parameters(self, parameters):
+        split, start = [], 0
+        for stage in self.stages:
+            split.append(list(parameters[start:start + stage['params']]))
+            start += stage['params']
+        return split
+
+    def cache_identity(self):
+        # results of a pipeline change with the source of any of its stages
+        return ''.join(get_method_identity(method) for method in self.get_methods())
+
+    def run(self, img, parameters, run_stage=None, cache=None):
+        """Runs the stages on img. run_stage(index, stage, img, parameters) runs one stage, by default the stage
+        method is called in this process.
+
+        With a ResultCache, the output of every stage is cached under a key chained from the key of the previous
+        stage, so a run whose first stages have the same input and parameters as an earlier run starts at the first
+        changed stage. Returns the output of the last stage and the indices of the stages that ran."""
+        key = None
+        ran = []
+        for i, (stage, method, stage_parameters) in enumerate(zip(self.stages, self.get_methods(),
+                                                                   self.split_parameters(parameters))):
+            if cache is not None:
+                key = cache.key(method, img if key is None else key, stage_parameters)
+                result = cache.get(key)
+                if result is not None:
+                    img = result
+                    continue
+            img = run_stage(i, stage, img, stage_parameters) if run_stage is not None else method(img, *stage_parameters)
+            ran.append(i)
+            if cache is not None:
+                cache.put(key, img)
+        return img, ran
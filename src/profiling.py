@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# spans kept by a profiler, the oldest ones are dropped first
+PROFILER_MAX_EVENTS = 100000
+# category of the spans of the stages of a run, e.g. decoding or validating the result
+STAGE = 'stage'
+
+
+class Profiler:
+    """Records timed spans of a session, from any thread.
+
+    Spans are timed with time.perf_counter, a clock shared by the processes of the machine, so the spans
+    of worker processes added with extend() line up with the spans of this one in the exported trace."""
+
+    def __init__(self, max_events=PROFILER_MAX_EVENTS):
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category=STAGE, args=None):
+        # the span is recorded also when the block raises
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, time.perf_counter() - start, args)
+
+    def add(self, name, category, start, duration, args=None):
+        event = {
+            'name': name,
+            'category': category,
+            'start': start,
+            'duration': duration,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': args or {}
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def extend(self, events):
+        with self.lock:
+            self.events.extend(events)
+
+    def get_events(self, since=None, category=None):
+        """Spans started at or after the perf_counter time since, of the given category, in start order."""
+        with self.lock:
+            events = list(self.events)
+        return sorted((event for event in events
+                       if (since is None or event['start'] >= since)
+                       and (category is None or event['category'] == category)), key=lambda event: event['start'])
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+
+    def to_chrome_trace(self):
+        """The spans as Chrome trace events, viewable in chrome://tracing or Perfetto."""
+        return {
+            'traceEvents': [{
+                'name': event['name'],
+                'cat': event['category'],
+                'ph': 'X',
+                'ts': event['start'] * 1e6,
+                'dur': event['duration'] * 1e6,
+                'pid': event['pid'],
+                'tid': event['tid'],
+                'args': event['args']
+            } for event in self.get_events()],
+            'displayTimeUnit': 'ms'
+        }
+
+    def save_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def summarize(events):
+    """Total duration of the spans of every name, in the order of their first span."""
+    totals = {}
+    for event in events:
+        totals[event['name']] = totals.get(event['name'], 0.0) + event['duration']
+    return list(totals.items())
+
+
+def format_duration(seconds):
+    return f'{seconds:.2f} s' if seconds >= 1 else f'{seconds * 1000:.1f} ms'
+
+
+def format_summary(summary):
+    return ', '.join(f'{name} {format_duration(duration)}' for name, duration in summary)
+
+
+# spans of this process, shared by the GUI, the validation and the worker pool
+profiler = Profiler()
@@ -0,0 +1,41 @@
+class Cancelled(Exception):
+    """Raised inside an algorithm reporting progress once its run was cancelled."""
+
+
+class ProgressToken:
+    """Cooperative cancellation and progress reporting of an algorithm run.
+
+    Algorithms opting in accept a 'progress' keyword argument and call update(done, total) at iteration
+    or tile boundaries. update raises Cancelled once cancel() was called, so the algorithm stops at the next
+    boundary. Both only set and read plain attributes, nothing is traced or locked."""
+
+    def __init__(self):
+        self.cancelled = False
+        self.done = 0
+        self.total = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def update(self, done, total=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        self.check()
+
+    def stopped_early(self):
+        """Description of a finished run which stopped before its total, e.g. an iterative algorithm
+        reaching its tolerance, None for a run which did all of it or did not report progress."""
+        if self.cancelled or not self.total or self.done >= self.total:
+            return None
+        return f'stopped after {self.done} of {self.total} iterations'
+
+    def fraction(self):
+        """Completed fraction of the run, None while the algorithm has not reported its total."""
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+# longest side in pixels of the downscaled copy live previews run on
+PROXY_MAX_SIZE = 512
+
+
+def get_proxy_scale(shape, max_size=PROXY_MAX_SIZE):
+    return min(1.0, max_size / max(shape[:2]))
+
+
+def make_proxy(img, max_size=PROXY_MAX_SIZE):
+    """Downscales an image so its longest side is at most max_size, returns the proxy and its scale."""
+    scale = get_proxy_scale(img.shape, max_size)
+    if scale >= 1:
+        return img, 1.0
+    height, width = img.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+
+def scale_psf(psf, scale):
+    """Resamples a PSF for an image scaled by scale.
+
+    The PSF keeps an odd size, so it stays centred, and its sum, so the brightness of the result does not change."""
+    psf = np.asarray(psf)
+    if scale >= 1 or psf.ndim != 2:
+        return psf
+    height, width = (max(1, 2 * round(n * scale / 2 - 0.5) + 1) for n in psf.shape)
+    scaled = cv2.resize(psf.astype(np.float64), (width, height), interpolation=cv2.INTER_AREA)
+    total = psf.sum()
+    if scaled.sum() != 0:
+        scaled *= total / scaled.sum()
+    return scaled
+
+
+PROXY_SCALINGS = {
+    'psf': scale_psf
+}
+
+
+def get_proxy_parameters(algorithm, parameters, scale):
+    # parameters whose config entry sets 'proxy' are scaled along with the image
+    return [PROXY_SCALINGS[param['proxy']](value, scale) if param.get('proxy', None) is not None else value
+            for param, value in zip(algorithm['params'], parameters)]
@@ -0,0 +1,35 @@
+import itertools
+import numpy as np
+
+
+def get_sweep_shape(values):
+    return tuple(len(v) for v in values)
+
+
+def run_sweep(algorithm, img, values, progress=None):
+    """Runs an algorithm for every combination of parameter values.
+
+    values holds the list of values of every parameter. Returns the results grid, an object array
+    indexed by the positions of the values, e.g. grid[i, j] is the result for values[0][i] and values[1][j].
+    Algorithms with a sweep method get all values of their swept parameter in one call.
+    progress.update(results, total) is called after every call of the algorithm."""
+    shape = get_sweep_shape(values)
+    grid = np.empty(shape, dtype=object)
+    sweep = algorithm.get('sweep', None)
+    swept = sweep['param'] if sweep is not None and shape[sweep['param']] > 1 else None
+
+    axes = [range(n) if i != swept else [None] for i, n in enumerate(shape)]
+    done = 0
+    for index in itertools.product(*axes):
+        if swept is None:
+            grid[index] = algorithm['method'](img, *[v[i] for v, i in zip(values, index)])
+            done += 1
+        else:
+            parameters = [v[i] if i is not None else v for v, i in zip(values, index)]
+            results = sweep['method'](img, *parameters)
+            for j, result in enumerate(results):
+                grid[index[:swept] + (j,) + index[swept + 1:]] = result
+            done += len(results)
+        if progress is not None:
+            progress.update(done, grid.size)
+    return grid
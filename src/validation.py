@@ -1,12 +1,84 @@
 import numpy as np
 import math
 import importlib
+import importlib.util
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import multiprocessing
+import multiprocessing.connection
 import yaml
 from src.helpers import ParamType, ErrorType, get_traceback_data
+from src.cache import get_source_digest
+from src.proxy import PROXY_SCALINGS
+from src.profiling import profiler
+from src.memory import MemoryTracker
+from src.pipeline import Pipeline
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+VALIDATION_CACHE_FILE_NAME = '.validation_cache.json'
+
+
+# seconds an algorithm may run on the validation image
+VALIDATION_TIMEOUT = 30
+# bytes of memory a validation process may allocate, enforced where the resource module is available
+VALIDATION_MEMORY_LIMIT = 2 * 2 ** 30
+# seconds between checks of the running validation processes
+PROCESS_POLL_INTERVAL = 0.05
+
+
+def get_validation_cache_file(config_file_name):
+    # validation results are stored next to the config file
+    return os.path.join(os.path.dirname(config_file_name), VALIDATION_CACHE_FILE_NAME)
+
+
+def get_process_context():
+    # forkserver starts processes without copying the threads of the caller, spawn is the portable fallback
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def get_error_type(errors):
+    types = [error.get('type', ErrorType.VALIDATION) for error in errors]
+    for error_type in (ErrorType.VALIDATION, ErrorType.CRASH, ErrorType.TIMEOUT):
+        if error_type in types:
+            return error_type
+    return None
+
+
+def execution_worker(connection, memory_limit):
+    # executes the algorithms received through the connection until it receives None
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_limit, memory_limit))
+    validation = Validation(isolated=False)
+    try:
+        for algorithm_object in iter(connection.recv, None):
+            # the spans of the execution are sent with its result
+            error = validation.execute_with_defaults(algorithm_object)
+            connection.send((error, profiler.get_events()))
+            profiler.clear()
+    except EOFError:
+        pass
+    finally:
+        connection.close()
 
 
 class Validation:
-    def __init__(self):
+    cache_lock = threading.Lock()
+
+    def __init__(self, isolated=True, workers=0, timeout=VALIDATION_TIMEOUT, memory_limit=VALIDATION_MEMORY_LIMIT):
+        # algorithms are executed in separate processes unless isolated is False, workers <= 0 uses every CPU core
+        self.isolated = isolated
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
         self.image_to_validate = np.ones((100, 100)).astype(np.uint8) * 128
         self.TYPES = {
             ParamType.INT: {
@@ -27,13 +99,36 @@ class Validation:
             }
         }
 
-    def get_algorithms(self, config_file_name):
-        algorithms, parsing_errors = self.__parse_algorithms_from_config(config_file_name)
+    def get_algorithms(self, config_file_name, cache_file=None, lazy=False):
+        # With a cache file, the results of executing the algorithms are stored there, keyed by the config entry
+        # and the module source, and algorithms with a stored result are not executed again.
+        # With lazy=True, algorithms without a stored result are not executed but returned as pending,
+        # validate_pending executes them later.
+        with profiler.span('parse config', 'validation', {'config': config_file_name}):
+            algorithms, parsing_errors = self.__parse_algorithms_from_config(config_file_name)
 
         if len(parsing_errors) > 0:
             return algorithms, ErrorType.PARSING, parsing_errors
 
-        return self.__validate_algorithms(algorithms)
+        return self.__validate_algorithms(algorithms, cache_file, lazy)
+
+    def validate_pending(self, algorithms, cache_file=None, on_validated=None):
+        # executes pending algorithms, on_validated(algorithm, error) is called as soon as each one is done
+        def on_result(i, result):
+            error_type, error = result
+            if cache_file is not None and error_type == ErrorType.VALIDATION:
+                key = self.__get_validation_key(algorithms[i]['config'])
+                self.__save_validation_results(cache_file, {key: {'error': error}})
+            algorithms[i]['pending'] = False
+            if on_validated is not None:
+                on_validated(algorithms[i], error)
+
+        results = self.__execute_algorithms([algorithm['config'] for algorithm in algorithms], on_result)
+        return [error for _, error in results]
+
+    def execute_with_defaults(self, algorithm_object):
+        _, _, error = self.__validate_algorithm(algorithm_object)
+        return error
 
     def validate_image(self, img: np.ndarray):
 
@@ -88,6 +183,8 @@ class Validation:
                     })
                     return [], errors
 
+                # memory fallbacks refer to other algorithms by name
+                names = [str(a['name']) for a in config['algorithms'] if isinstance(a, dict) and a.get('name', None) is not None]
                 for i, a in enumerate(config['algorithms']):
                     alg_errors = []
                     output_alg = {
@@ -147,6 +244,13 @@ class Validation:
                                 if param.get('description', None) is not None:
                                     output_param['description'] = str(param['description'])
 
+                                if param.get('proxy', None) is not None:
+                                    if str(param['proxy']) in PROXY_SCALINGS:
+                                        output_param['proxy'] = str(param['proxy'])
+                                    else:
+                                        alg_errors.append(f"Parameter #{j + 1} - Proxy scaling '{param['proxy']}' "
+                                                          f"is not one of: {', '.join(PROXY_SCALINGS)}.")
+
                                 if param.get('default', None) is not None:
                                     if output_param['type'] == ParamType.NPARRAY:
                                         output_param['default'] = f"np.asarray({param['default']})"
@@ -160,6 +264,41 @@ class Validation:
 
                         output_alg['params'] = output_params
 
+                    if a.get('sweep', None) is not None:
+                        sweep = a['sweep']
+                        if not isinstance(sweep, dict) or sweep.get('method', None) is None \
+                                or sweep.get('param', None) is None:
+                            alg_errors.append("Configure key 'sweep' is not an object with keys 'method' and 'param'.")
+                        else:
+                            param_names = [param['name'] for param in output_alg.get('params', [])]
+                            if str(sweep['param']) not in param_names:
+                                alg_errors.append(f"Sweep parameter '{sweep['param']}' is not a parameter of the algorithm.")
+                            elif output_alg['params'][param_names.index(str(sweep['param']))].get('type', None) == ParamType.NPARRAY:
+                                alg_errors.append(f"Sweep parameter '{sweep['param']}' is not a scalar parameter.")
+                            else:
+                                output_alg['sweep'] = {
+                                    'method': str(sweep['method']),
+                                    'param': param_names.index(str(sweep['param']))
+                                }
+
+                    if a.get('memory', None) is not None:
+                        memory = a['memory']
+                        if not isinstance(memory, dict) or memory.get('budget', None) is None \
+                                or memory.get('bytes_per_value', None) is None:
+                            alg_errors.append("Configure key 'memory' is not an object with keys 'budget' and 'bytes_per_value'.")
+                        elif not all(isinstance(memory[key], (int, float)) and memory[key] > 0
+                                     for key in ('budget', 'bytes_per_value')):
+                            alg_errors.append("Memory 'budget' and 'bytes_per_value' are not positive numbers.")
+                        elif memory.get('fallback', None) is not None and (str(memory['fallback']) not in names
+                                                                           or str(memory['fallback']) == output_alg['name']):
+                            alg_errors.append(f"Memory fallback '{memory['fallback']}' is not another algorithm of the config file.")
+                        else:
+                            output_alg['memory'] = {
+                                'budget': float(memory['budget']),
+                                'bytes_per_value': float(memory['bytes_per_value']),
+                                'fallback': str(memory['fallback']) if memory.get('fallback', None) is not None else None
+                            }
+
                     if len(alg_errors) == 0:
                         output_algs.append(output_alg)
                     else:
@@ -168,7 +307,8 @@ class Validation:
                             'errors': alg_errors
                         })
 
-                return output_algs, errors
+                pipelines, pipeline_errors = self.__parse_pipelines(config.get('pipelines', None), output_algs)
+                return output_algs + pipelines, errors + pipeline_errors
         except Exception as e:
             errors.append({
                 'detail': 'Config file error:',
@@ -176,38 +316,297 @@ class Validation:
             })
             return [], errors
 
-    def __validate_algorithms(self, algorithms):
+    def __parse_pipelines(self, pipelines, algorithms):
+        # stages refer to the parsed algorithms by name, the parameters of a pipeline are those of its stages
+        # with the values of the stage 'params' as defaults
+        if pipelines is None:
+            return [], []
+        if not isinstance(pipelines, list):
+            return [], [{
+                'detail': 'Config file pipelines error:',
+                'errors': ["Configure key 'pipelines' is not a list."]
+            }]
+
+        by_name = {alg['name']: alg for alg in algorithms}
+        output_pipelines, errors = [], []
+        for i, p in enumerate(pipelines):
+            pipeline_errors = []
+            output_pipeline = {
+                'name': f'Pipeline #{i + 1}',
+                'module': Pipeline.__module__,
+                'stages': [],
+                'params': []
+            }
+            if not isinstance(p, dict):
+                errors.append({'detail': output_pipeline['name'], 'errors': ['Pipeline is not an object.']})
+                continue
+
+            if p.get('name', None) is None:
+                pipeline_errors.append("Could not find config key 'name'.")
+            elif str(p['name']) in by_name:
+                pipeline_errors.append(f"Pipeline name '{p['name']}' is already the name of an algorithm.")
+            else:
+                output_pipeline['name'] = str(p['name'])
+
+            stages = p.get('stages', None)
+            if not isinstance(stages, list) or len(stages) == 0:
+                pipeline_errors.append("Configure key 'stages' is not a non-empty list.")
+                stages = []
+
+            for j, stage in enumerate(stages):
+                stage_details = f'Stage #{j + 1}'
+                if not isinstance(stage, dict) or stage.get('algorithm', None) is None:
+                    pipeline_errors.append(f"{stage_details} - Could not find config key 'algorithm'.")
+                    continue
+                algorithm = by_name.get(str(stage['algorithm']), None)
+                if algorithm is None:
+                    pipeline_errors.append(f"{stage_details} - Algorithm '{stage['algorithm']}' is not a valid "
+                                           f"algorithm of the config file.")
+                    continue
+                overrides = stage.get('params', None) or {}
+                if not isinstance(overrides, dict):
+                    pipeline_errors.append(f"{stage_details} - Configure key 'params' is not an object.")
+                    continue
+                overrides = {str(name): value for name, value in overrides.items()}
+                param_names = [param['name'] for param in algorithm['params']]
+                unknown = [name for name in overrides if name not in param_names]
+                pipeline_errors += [f"{stage_details} - '{name}' is not a parameter of algorithm '{algorithm['name']}'."
+                                    for name in unknown]
+                if unknown:
+                    continue
+
+                output_pipeline['stages'].append({
+                    'name': algorithm['name'],
+                    'module': algorithm['module'],
+                    'method': algorithm['method'],
+                    'params': len(algorithm['params'])
+                })
+                for param in algorithm['params']:
+                    output_param = dict(param, name=f"{j + 1}: {param['name']}")
+                    output_param['description'] = f"Stage {j + 1}, {algorithm['name']}." + \
+                        (f"\n{param['description']}" if param.get('description', None) else '')
+                    if overrides.get(param['name'], None) is not None:
+                        if param['type'] == ParamType.NPARRAY:
+                            output_param['default'] = f"np.asarray({overrides[param['name']]})"
+                        else:
+                            output_param['default'] = str(overrides[param['name']])
+                    output_pipeline['params'].append(output_param)
+
+            if len(pipeline_errors) == 0:
+                output_pipelines.append(output_pipeline)
+            else:
+                errors.append({
+                    'detail': output_pipeline['name'],
+                    'errors': pipeline_errors
+                })
+        return output_pipelines, errors
+
+    def __validate_algorithms(self, algorithms, cache_file=None, lazy=False):
         errors = []
         output_algorithms = []
+        cached_results = self.__load_validation_results(cache_file)
+        checked = []
         for alg in algorithms:
-            alg_errors = []
+            check = {'algorithm': alg, 'errors': [], 'error_type': ErrorType.VALIDATION, 'pending': False,
+                     'execute': False}
+            checked.append(check)
             default_values_validation_erorrs = self.__validate_default_values(alg)
             if default_values_validation_erorrs:
-                alg_errors += default_values_validation_erorrs
-            else:
-                module, method, validate_error = self.__validate_algorithm(alg)
-                if validate_error:
-                    alg_errors.append(validate_error)
-
-            if len(alg_errors) == 0:
+                check['errors'] += default_values_validation_erorrs
+                continue
+
+            check['key'] = self.__get_validation_key(alg) if cache_file is not None else None
+            cached = cached_results.get(check['key'], None) if check['key'] is not None else None
+            check['module'], check['method'], validate_error = self.__import_algorithm(alg)
+            if validate_error is None and cached is not None:
+                validate_error = cached['error']
+            if validate_error:
+                check['errors'].append(validate_error)
+            elif cached is None:
+                check['pending'] = lazy
+                check['execute'] = not lazy
+
+        # the algorithms without a stored result are executed together, each in its own process
+        to_execute = [check for check in checked if check['execute']]
+        new_results = {}
+        for check, (error_type, error) in zip(to_execute, self.__execute_algorithms([c['algorithm'] for c in to_execute])):
+            if error:
+                check['errors'].append(error)
+                check['error_type'] = error_type
+            if check['key'] is not None and error_type == ErrorType.VALIDATION:
+                new_results[check['key']] = {'error': error}
+
+        for check in checked:
+            alg = check['algorithm']
+            sweep = None
+            if len(check['errors']) == 0:
+                sweep, sweep_error = self.__validate_sweep(alg, check['module'])
+                if sweep_error:
+                    check['errors'].append(sweep_error)
+
+            if len(check['errors']) == 0:
                 output_algorithms.append({
                     'name': alg['name'],
-                    # 'module': module,
-                    'method': method,
-                    'params': alg['params']
+                    'module': alg['module'],
+                    'method': check['method'],
+                    'params': alg['params'],
+                    'sweep': sweep,
+                    'memory': alg.get('memory', None),
+                    'pending': check['pending'],
+                    'config': alg
                 })
             else:
                 errors.append({
                     'detail': alg['name'],
-                    'errors': alg_errors
+                    'errors': check['errors'],
+                    'type': check['error_type']
                 })
 
-        return output_algorithms, ErrorType.VALIDATION if errors else None, errors
+        if new_results:
+            self.__save_validation_results(cache_file, new_results)
+        return output_algorithms, get_error_type(errors), errors
+
+    def __execute_algorithms(self, algorithms, on_result=None):
+        """Executes the algorithms with their default values, returns an (error type, error) pair for each.
+
+        With isolated=True the algorithms run in up to workers worker processes, each limited to memory_limit bytes
+        of memory where the system supports it. A worker running an algorithm for longer than timeout seconds
+        is killed, as is one that crashed, and replaced by a new worker for the remaining algorithms."""
+        if not self.isolated:
+            results = []
+            for i, alg in enumerate(algorithms):
+                results.append((ErrorType.VALIDATION, self.execute_with_defaults(alg)))
+                if on_result is not None:
+                    on_result(i, results[i])
+            return results
+
+        context = get_process_context()
+        workers = min(self.workers if self.workers > 0 else os.cpu_count() or 1, len(algorithms))
+        results = [None] * len(algorithms)
+        waiting = list(enumerate(algorithms))
+        idle, busy = [], {}
+        try:
+            while waiting or busy:
+                while waiting and len(busy) < workers:
+                    connection, process = idle.pop() if idle else self.__start_worker(context)
+                    i, alg = waiting.pop(0)
+                    connection.send(alg)
+                    busy[connection] = (process, i, time.monotonic())
+
+                ready = multiprocessing.connection.wait(list(busy), timeout=PROCESS_POLL_INTERVAL)
+                for connection in list(busy):
+                    process, i, start = busy[connection]
+                    if connection in ready:
+                        try:
+                            error, events = connection.recv()
+                            profiler.extend(events)
+                            results[i] = (ErrorType.VALIDATION, error)
+                            idle.append((connection, process))
+                            del busy[connection]
+                            if on_result is not None:
+                                on_result(i, results[i])
+                            continue
+                        except (EOFError, OSError):
+                            process.join()
+                            results[i] = (ErrorType.CRASH, f'Validation process crashed with exit code '
+                                                           f'{process.exitcode}.')
+                    elif time.monotonic() - start > self.timeout:
+                        results[i] = (ErrorType.TIMEOUT, f'Execution with default values did not finish '
+                                                         f'within {self.timeout} seconds.')
+                    else:
+                        continue
+
+                    process.kill()
+                    process.join()
+                    connection.close()
+                    del busy[connection]
+                    if on_result is not None:
+                        on_result(i, results[i])
+        finally:
+            for connection, process in idle:
+                connection.send(None)
+                connection.close()
+            for connection, (process, _, _) in busy.items():
+                process.kill()
+                connection.close()
+            for _, process in idle:
+                process.join()
+        return results
+
+    def __start_worker(self, context):
+        connection, worker_connection = context.Pipe()
+        process = context.Process(target=execution_worker, args=(worker_connection, self.memory_limit), daemon=True)
+        process.start()
+        worker_connection.close()
+        return connection, process
+
+    def __load_algorithm(self, algorithm_object):
+        # pipelines are run by a Pipeline of the methods of their stages
+        if 'stages' in algorithm_object:
+            pipeline = Pipeline(algorithm_object['stages'])
+            pipeline.get_methods()
+            return importlib.import_module(algorithm_object['module']), pipeline
+        module = importlib.import_module(algorithm_object['module'])
+        return module, getattr(module, algorithm_object['method'])
+
+    def __import_algorithm(self, algorithm_object):
+        try:
+            module, method = self.__load_algorithm(algorithm_object)
+            return module, method, None
+        except (ModuleNotFoundError, AttributeError) as e:
+            return None, None, str(e) + '.'
+        except Exception as e:
+            return None, None, f'Error while importing algorithm module:\n' \
+                               f'{get_traceback_data(e, ignore_file=__file__)}'.rstrip() + '.'
+
+    def __get_validation_key(self, algorithm_object):
+        # a pipeline is keyed by the modules of its stages
+        digests = []
+        for stage in algorithm_object.get('stages', [algorithm_object]):
+            try:
+                spec = importlib.util.find_spec(stage['module'])
+            except (ImportError, ValueError):
+                return None
+            if spec is None or spec.origin is None:
+                return None
+            digests.append(get_source_digest(spec.origin))
+
+        entry = {
+            'module': algorithm_object['module'],
+            'method': algorithm_object.get('method', None),
+            'params': [{'type': param['type'].value, 'default': param.get('default', None)}
+                       for param in algorithm_object['params']]
+        }
+        if 'stages' in algorithm_object:
+            entry['stages'] = [[stage['module'], stage['method']] for stage in algorithm_object['stages']]
+        return hashlib.sha1((json.dumps(entry, sort_keys=True) + ''.join(digests)).encode()).hexdigest()
 
-    def __execute_algorithm(self, module_name: str, method: str, params):
+    def __load_validation_results(self, cache_file):
+        if cache_file is None:
+            return {}
         try:
-            module = importlib.import_module(module_name)
-            algorithm = getattr(module, method)
+            with open(cache_file, mode='r', encoding='utf-8') as f:
+                results = json.load(f)
+            return results if isinstance(results, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def __save_validation_results(self, cache_file, new_results):
+        with Validation.cache_lock:
+            results = self.__load_validation_results(cache_file)
+            results.update(new_results)
+            try:
+                descriptor, temporary_path = tempfile.mkstemp(suffix='.json',
+                                                              dir=os.path.dirname(os.path.abspath(cache_file)))
+                with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, indent=1)
+                os.replace(temporary_path, cache_file)
+            except OSError:
+                pass
+
+    def __execute_algorithm(self, algorithm_object, params):
+        try:
+            module, algorithm = self.__load_algorithm(algorithm_object)
             result = algorithm(self.image_to_validate, *params)
             return result, module, algorithm, None
         except ModuleNotFoundError as e:
@@ -219,19 +618,36 @@ class Validation:
                                      f'{get_traceback_data(e, ignore_file=__file__)}'
 
     def __validate_algorithm(self, algorithm_object):
-        alg_params_values = [eval(param['default']) if param.get('default', None)
-                             else self.TYPES[param['type']]['default']
-                             for param in algorithm_object['params']]
-
-        result, module, method, error = self.__execute_algorithm(algorithm_object['module'], algorithm_object['method'], alg_params_values)
+        args = {'algorithm': algorithm_object['name']}
+        with profiler.span('evaluate defaults', 'validation', args):
+            alg_params_values = [eval(param['default']) if param.get('default', None)
+                                 else self.TYPES[param['type']]['default']
+                                 for param in algorithm_object['params']]
+
+        # the peak memory of the execution is recorded with its span
+        execute_args = dict(args)
+        with profiler.span('execute', 'validation', execute_args):
+            with MemoryTracker() as memory:
+                result, module, method, error = self.__execute_algorithm(algorithm_object, alg_params_values)
+            execute_args.update(memory.stats())
         if error:
             return None, None, error[:-1] + '.'
 
-        error = self.validate_image(result)
+        with profiler.span('validate image', 'validation', args):
+            error = self.validate_image(result)
         if error is not None:
             return None, None, error
         return module, method, None
 
+    def __validate_sweep(self, algorithm_object, module):
+        if algorithm_object.get('sweep', None) is None:
+            return None, None
+        try:
+            method = getattr(module, algorithm_object['sweep']['method'])
+        except AttributeError as e:
+            return None, f'Sweep method error: {e}.'
+        return {'method': method, 'param': algorithm_object['sweep']['param']}, None
+
     def __validate_default_values(self, algorithm_object):
         errors = []
         for i, param in enumerate(algorithm_object['params']):
@@ -0,0 +1,225 @@
+import math
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# size in pixels of the square tiles of every pyramid level
+VIEWER_TILE_SIZE = 256
+# converted tiles kept by each view
+VIEWER_TILE_CACHE_SIZE = 256
+# zoom limits, relative to fitting the image in the canvas and in canvas pixels per image pixel
+VIEWER_MIN_FIT_ZOOM = 0.5
+VIEWER_MAX_ZOOM = 16
+VIEWER_ZOOM_STEP = 1.25
+
+
+def to_display(image):
+    # 8-bit copy of an image as PIL displays it
+    if image.dtype == np.uint16:
+        image = image / 257
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+    return image
+
+
+class ImagePyramid:
+    """Mip-map of an image, every level halves the previous one. Levels are built when first requested."""
+
+    def __init__(self, image, tile_size=VIEWER_TILE_SIZE):
+        self.shape = image.shape
+        self.tile_size = tile_size
+        self.levels = [to_display(image)]
+        self.level_count = 1 + max(0, math.ceil(math.log2(max(image.shape[:2]) / tile_size)))
+
+    def level(self, index):
+        while len(self.levels) <= index:
+            previous = self.levels[-1]
+            height, width = previous.shape[:2]
+            self.levels.append(cv2.resize(previous, ((width + 1) // 2, (height + 1) // 2),
+                                          interpolation=cv2.INTER_AREA))
+        return self.levels[index]
+
+    def level_for_zoom(self, zoom):
+        # the smallest level still at least as detailed as the canvas
+        if zoom >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / zoom))), self.level_count - 1)
+
+    def tile(self, level, row, column):
+        t = self.tile_size
+        return self.level(level)[row * t:(row + 1) * t, column * t:(column + 1) * t]
+
+    def visible_tiles(self, zoom, center, canvas_size):
+        """Tiles covering the canvas when the image is shown at zoom canvas pixels per image pixel with
+        the image point center = (x, y) in the middle of the canvas.
+
+        Returns the level and (row, column, (x0, y0, x1, y1)) of every visible tile, with its canvas box."""
+        level = self.level_for_zoom(zoom)
+        height, width = self.level(level).shape[:2]
+        # image pixels per level pixel, exact for the level sizes rounded up when halving
+        scale_y, scale_x = self.shape[0] / height, self.shape[1] / width
+        canvas_width, canvas_height = canvas_size
+        t = self.tile_size
+
+        def canvas_x(x):
+            return int(round(canvas_width / 2 + (x * scale_x - center[0]) * zoom))
+
+        def canvas_y(y):
+            return int(round(canvas_height / 2 + (y * scale_y - center[1]) * zoom))
+
+        def tile_range(start, size, count, scale):
+            first = max(0, int(start / (scale * zoom * t)))
+            last = min(count - 1, int((start + size) / (scale * zoom * t)))
+            return range(first, last + 1)
+
+        left = center[0] * zoom - canvas_width / 2
+        top = center[1] * zoom - canvas_height / 2
+        tiles = []
+        for row in tile_range(top, canvas_height, math.ceil(height / t), scale_y):
+            for column in tile_range(left, canvas_width, math.ceil(width / t), scale_x):
+                box = (canvas_x(column * t), canvas_y(row * t),
+                       canvas_x(min((column + 1) * t, width)), canvas_y(min((row + 1) * t, height)))
+                if box[0] < min(box[2], canvas_width) and box[1] < min(box[3], canvas_height) \
+                        and box[2] > 0 and box[3] > 0:
+                    tiles.append((row, column, box))
+        return level, tiles
+
+
+class TileCache:
+    """Least recently used cache of converted tiles, bounded by their count."""
+
+    def __init__(self, max_tiles=VIEWER_TILE_CACHE_SIZE):
+        self.max_tiles = max_tiles
+        self._entries = OrderedDict()
+
+    def get(self, key, convert):
+        tile = self._entries.get(key)
+        if tile is None:
+            tile = convert()
+            self._entries[key] = tile
+            while len(self._entries) > self.max_tiles:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return tile
+
+    def clear(self):
+        self._entries.clear()
+
+
+class PyramidView:
+    """Zoomable and pannable view of an image pyramid on a Tk canvas, drawing only the visible tiles.
+
+    Views linked with link() show the same part of their images, in coordinates relative to the image size,
+    so a downscaled preview stays aligned with the full resolution input."""
+
+    def __init__(self, canvas, size, make_photo, tile_size=VIEWER_TILE_SIZE, cache_size=VIEWER_TILE_CACHE_SIZE):
+        # make_photo(array) converts an 8-bit tile to an image the canvas draws, e.g. an ImageTk.PhotoImage
+        self.canvas = canvas
+        self.size = size
+        self.make_photo = make_photo
+        self.tile_size = tile_size
+        self.cache = TileCache(cache_size)
+        self.pyramid = None
+        self.zoom = 1.0
+        self.center = (0.0, 0.0)
+        self.linked = []
+        self.drag_start = None
+
+    def link(self, other):
+        self.linked.append(other)
+        other.linked.append(self)
+
+    def bind(self):
+        self.canvas.bind('<ButtonPress-1>', self.on_drag_start)
+        self.canvas.bind('<B1-Motion>', self.on_drag)
+        self.canvas.bind('<Double-Button-1>', lambda event: self.fit())
+        self.canvas.bind('<MouseWheel>', lambda event: self.zoom_at(event.delta > 0, event.x, event.y))
+        # X11 reports the wheel as buttons 4 and 5
+        self.canvas.bind('<Button-4>', lambda event: self.zoom_at(True, event.x, event.y))
+        self.canvas.bind('<Button-5>', lambda event: self.zoom_at(False, event.x, event.y))
+
+    def set_image(self, image, keep_view=False):
+        # a view linked to a view showing an image takes over its position, otherwise the image is fitted.
+        # With keep_view, a replaced image of the same content (e.g. a higher resolution of it) keeps the position.
+        state = self.get_state() if keep_view and self.pyramid is not None else None
+        self.pyramid = ImagePyramid(image, self.tile_size)
+        self.cache.clear()
+        shown = [view for view in self.linked if view.pyramid is not None]
+        if state is not None:
+            self.set_state(state)
+        elif shown:
+            self.set_state(shown[0].get_state())
+        else:
+            self.fit()
+
+    def clear(self):
+        self.pyramid = None
+        self.cache.clear()
+        self.canvas.delete('tile')
+
+    def get_state(self):
+        height, width = self.pyramid.shape[:2]
+        return self.center[0] / width, self.center[1] / height, self.zoom * width
+
+    def set_state(self, state):
+        height, width = self.pyramid.shape[:2]
+        self.center = (state[0] * width, state[1] * height)
+        self.zoom = state[2] / width
+        self.render()
+
+    def fit_zoom(self):
+        return min(self.size[0] / self.pyramid.shape[1], self.size[1] / self.pyramid.shape[0])
+
+    def fit(self):
+        if self.pyramid is None:
+            return
+        self.zoom = self.fit_zoom()
+        self.center = (self.pyramid.shape[1] / 2, self.pyramid.shape[0] / 2)
+        self.changed()
+
+    def zoom_at(self, zoom_in, x, y):
+        # zooms keeping the image point under the cursor in place
+        if self.pyramid is None:
+            return
+        zoom = self.zoom * (VIEWER_ZOOM_STEP if zoom_in else 1 / VIEWER_ZOOM_STEP)
+        zoom = min(max(zoom, self.fit_zoom() * VIEWER_MIN_FIT_ZOOM), VIEWER_MAX_ZOOM)
+        dx, dy = x - self.size[0] / 2, y - self.size[1] / 2
+        self.center = (self.center[0] + dx / self.zoom - dx / zoom, self.center[1] + dy / self.zoom - dy / zoom)
+        self.zoom = zoom
+        self.changed()
+
+    def on_drag_start(self, event):
+        self.drag_start = (event.x, event.y)
+
+    def on_drag(self, event):
+        if self.pyramid is None or self.drag_start is None:
+            return
+        dx, dy = event.x - self.drag_start[0], event.y - self.drag_start[1]
+        self.drag_start = (event.x, event.y)
+        height, width = self.pyramid.shape[:2]
+        self.center = (min(max(self.center[0] - dx / self.zoom, 0), width),
+                       min(max(self.center[1] - dy / self.zoom, 0), height))
+        self.changed()
+
+    def changed(self):
+        self.render()
+        for view in self.linked:
+            if view.pyramid is not None:
+                view.set_state(self.get_state())
+
+    def render(self):
+        self.canvas.delete('tile')
+        if self.pyramid is None:
+            return
+        level, tiles = self.pyramid.visible_tiles(self.zoom, self.center, self.size)
+        for row, column, (x0, y0, x1, y1) in tiles:
+            photo = self.cache.get((level, row, column, x1 - x0, y1 - y0),
+                                   lambda: self.make_photo(self.get_tile(level, row, column, x1 - x0, y1 - y0)))
+            self.canvas.create_image(x0, y0, anchor='nw', image=photo, tags='tile')
+        self.canvas.tag_lower('tile')
+
+    def get_tile(self, level, row, column, width, height):
+        tile = self.pyramid.tile(level, row, column)
+        interpolation = cv2.INTER_AREA if width < tile.shape[1] else cv2.INTER_NEAREST
+        return cv2.resize(tile, (width, height), interpolation=interpolation)
@@ -0,0 +1,305 @@
+import importlib
+import os
+import queue
+import signal
+import threading
+import time
+import weakref
+from contextlib import nullcontext
+from multiprocessing import shared_memory
+import numpy as np
+from src.helpers import get_traceback_data, get_keyword_parameters
+from src.progress import ProgressToken, Cancelled
+from src.profiling import Profiler
+from src.memory import MemoryTracker
+from src.validation import get_process_context, PROCESS_POLL_INTERVAL
+
+# worker processes of the GUI, algorithms run there so they never hold the GIL of the Tk process
+WORKER_POOL_SIZE = 1
+
+
+class WorkerError(Exception):
+    """Raised by WorkerPool.run when the algorithm raised in the worker or the worker crashed.
+    The message holds the traceback from the worker process."""
+
+
+def share_array(array):
+    """Copies an array into a new shared memory block, returns the block and the descriptor attach_array takes."""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(descriptor):
+    # the array is a view of the block, it has to be deleted before the block is closed
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def send_array(connection, kind, array, *payload):
+    # the block stays until the receiving process frees it
+    block, descriptor = share_array(array)
+    block.close()
+    connection.send((kind, descriptor, *payload))
+
+
+def receive_array(descriptor):
+    # copies an array shared by the other process and frees its block
+    block, array = attach_array(descriptor)
+    result = array.copy()
+    del array
+    block.close()
+    block.unlink()
+    return result
+
+
+class ConnectionProgress(ProgressToken):
+    # progress token of the worker, updates are forwarded to the calling process which may send 'cancel' back
+
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+
+    def update(self, done, total=None):
+        while self.connection.poll():
+            if self.connection.recv() == 'cancel':
+                self.cancel()
+        super().update(done, total)
+        self.connection.send(('progress', self.done, self.total))
+
+
+def kill_worker(process):
+    # the worker leads a process group with the processes it started, e.g. the tile workers of algorithms/tiled.py
+    if hasattr(os, 'killpg') and process.pid is not None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass    # the group is gone, or the worker did not start it yet
+    process.kill()
+    process.join()
+
+
+def stop_workers(idle, processes):
+    # idle workers are asked to exit, the others are killed with their processes
+    while not idle.empty():
+        connection, process = idle.get()
+        try:
+            connection.send(None)
+            connection.close()
+        except OSError:
+            pass
+        process.join()
+        processes.discard(process)
+    for process in list(processes):
+        kill_worker(process)
+    processes.clear()
+
+
+def pool_worker(connection, modules):
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    # the algorithm modules are imported once, tasks only look their methods up
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass    # reported by the task using the module
+
+    image_block, image = None, None
+    try:
+        for task in iter(connection.recv, None):
+            if task == 'cancel':
+                continue    # the task it was meant for finished first
+            if image_block is None or image_block.name != task['image'][0]:
+                del image
+                if image_block is not None:
+                    image_block.close()
+                image_block, image = attach_array(task['image'])
+
+            try:
+                method = getattr(importlib.import_module(task['module']), task['method'])
+                options = dict(task['options'])
+                accepted = get_keyword_parameters(method)
+                if task['progress'] and 'progress' in accepted:
+                    options['progress'] = ConnectionProgress(connection)
+                if task['preview'] and 'preview' in accepted:
+                    options['preview'] = lambda preview, iterations: \
+                        send_array(connection, 'preview', preview, iterations)
+                # the peak memory and the spans of the run are sent back before its result
+                memory = MemoryTracker() if task['memory'] else None
+                profiler = Profiler() if task['profile'] else None
+                if profiler is not None and 'profiler' in accepted:
+                    options['profiler'] = profiler
+
+                with profiler.span(task['method'], 'algorithm') if profiler is not None else nullcontext():
+                    with memory if memory is not None else nullcontext():
+                        result = method(image, *task['parameters'], **options)
+                if memory is not None:
+                    connection.send(('memory', memory.stats()))
+                if profiler is not None:
+                    connection.send(('spans', profiler.get_events()))
+                if isinstance(result, np.ndarray):
+                    send_array(connection, 'result', result)
+                else:
+                    connection.send(('object', result))
+            except Cancelled:
+                connection.send(('cancelled',))
+            except Exception as e:
+                connection.send(('error', get_traceback_data(e, ignore_file=__file__)))
+    except EOFError:
+        pass
+    finally:
+        del image
+        if image_block is not None:
+            image_block.close()
+        connection.close()
+
+
+class WorkerPool:
+    """Long-lived worker processes running algorithms outside of the calling process.
+
+    The algorithm modules are imported by every worker when it starts. Images are exchanged through shared
+    memory blocks: the input image is copied into a block once and reused by the following runs on the same
+    image, results and previews are copied out of the blocks the worker made. Cancelling a run terminates
+    its worker, a new one is started in its place. With a grace period, algorithms reporting progress are asked
+    to stop first and the worker is kept if they do so in time.
+    Workers are not daemonic, so algorithms can start processes of their own (e.g. the tile workers of
+    algorithms/tiled.py); close stops them, as does the exit of the interpreter when close was not called."""
+
+    def __init__(self, modules, workers=WORKER_POOL_SIZE):
+        self.modules = list(dict.fromkeys(modules))
+        self.context = get_process_context()
+        self.idle = queue.Queue()
+        self.input_lock = threading.Lock()
+        self.input = None      # shared block of the last input image
+        self.closed = False
+        self.processes = set()
+        for _ in range(workers):
+            self.idle.put(self.__start_worker())
+        # non-daemonic workers left running would keep the interpreter from exiting
+        self.finalizer = weakref.finalize(self, stop_workers, self.idle, self.processes)
+
+    def run(self, module, method, img, parameters, options=None, progress=None, preview=None, grace=0,
+            profiler=None, memory=None):
+        """Runs module.method(img, *parameters, **options) in a worker and returns its result.
+
+        progress receives the updates of algorithms accepting a 'progress' argument, the run is cancelled
+        with Cancelled once progress is cancelled, after waiting up to grace seconds for the algorithm to stop.
+        preview(image, iterations) is called with the previews of algorithms accepting a 'preview' argument.
+        profiler receives the span of the run in the worker and the spans of algorithms accepting a 'profiler' argument.
+        memory, a dict, is updated with the peak memory of the run in the worker (see MemoryTracker.stats).
+        Raises WorkerError when the algorithm failed."""
+        shared_input = self.__acquire_input(img)
+        task = {
+            'module': module,
+            'method': method,
+            'image': shared_input['descriptor'],
+            'parameters': parameters,
+            'options': options or {},
+            'progress': progress is not None,
+            'preview': preview is not None,
+            'profile': profiler is not None,
+            'memory': memory is not None
+        }
+        connection, process = self.idle.get()
+        released = False    # the worker finished the task and is idle again
+        cancelled_at = None
+        try:
+            connection.send(task)
+            while True:
+                if progress is not None and progress.cancelled and cancelled_at is None:
+                    if grace <= 0:
+                        raise Cancelled()
+                    connection.send('cancel')
+                    cancelled_at = time.monotonic()
+                if cancelled_at is not None and time.monotonic() - cancelled_at > grace:
+                    raise Cancelled()
+                if not connection.poll(PROCESS_POLL_INTERVAL):
+                    if not process.is_alive():
+                        raise WorkerError(f'Worker process crashed with exit code {process.exitcode}.')
+                    continue
+
+                try:
+                    kind, *payload = connection.recv()
+                except (EOFError, OSError):
+                    process.join()
+                    raise WorkerError(f'Worker process crashed with exit code {process.exitcode}.')
+
+                if kind == 'progress':
+                    progress.done, progress.total = payload
+                    continue
+                if kind == 'memory':
+                    memory.update(payload[0])
+                    continue
+                if kind == 'spans':
+                    profiler.extend(payload[0])
+                    continue
+                if kind == 'preview':
+                    image, iterations = receive_array(payload[0]), payload[1]
+                    if cancelled_at is None:
+                        preview(image, iterations)
+                    continue
+
+                result = receive_array(payload[0]) if kind == 'result' else payload[0] if payload else None
+                self.idle.put((connection, process))
+                released = True
+                if cancelled_at is not None or kind == 'cancelled':
+                    # the algorithm stopped, or finished before it noticed the cancellation
+                    raise Cancelled()
+                if kind == 'error':
+                    raise WorkerError(result)
+                return result
+        except BaseException:
+            if not released:
+                self.__replace_worker(connection, process)
+            raise
+        finally:
+            self.__release_input(shared_input)
+
+    def close(self):
+        self.closed = True
+        self.finalizer()
+        with self.input_lock:
+            previous, self.input = self.input, None
+            if previous is not None and previous['users'] == 0:
+                self.__free_input(previous)
+
+    def __acquire_input(self, img):
+        # runs on the same image object reuse its block, the image must not be modified in place between them
+        with self.input_lock:
+            if self.input is None or self.input['image'] is not img:
+                previous = self.input
+                block, descriptor = share_array(img)
+                self.input = {'image': img, 'block': block, 'descriptor': descriptor, 'users': 0}
+                if previous is not None and previous['users'] == 0:
+                    self.__free_input(previous)
+            self.input['users'] += 1
+            return self.input
+
+    def __release_input(self, shared_input):
+        # blocks of replaced images are freed once no run uses them
+        with self.input_lock:
+            shared_input['users'] -= 1
+            if shared_input is not self.input and shared_input['users'] == 0:
+                self.__free_input(shared_input)
+
+    def __free_input(self, shared_input):
+        shared_input['block'].close()
+        shared_input['block'].unlink()
+
+    def __replace_worker(self, connection, process):
+        kill_worker(process)
+        connection.close()
+        self.processes.discard(process)
+        if not self.closed:
+            self.idle.put(self.__start_worker())
+
+    def __start_worker(self):
+        connection, worker_connection = self.context.Pipe()
+        process = self.context.Process(target=pool_worker, args=(worker_connection, self.modules))
+        process.start()
+        worker_connection.close()
+        self.processes.add(process)
+        return connection, process
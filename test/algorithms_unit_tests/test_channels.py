@@ -0,0 +1,58 @@
+from unittest import TestCase
+import numpy as np
+from algorithms.channels import split_channels, merge_channels, GRAYSCALE, RGB, LUMINANCE
+from algorithms.wiener import my_wiener
+
+
+class ChannelsTest(TestCase):
+
+    def get_test_image(self, dtype=np.uint8):
+        img = np.random.default_rng(0).integers(0, 256, size=(12, 16, 3)).astype(dtype)
+        img[0, 0] = [0, 0, 0]
+        img[0, 1] = [255, 255, 255]
+        return img
+
+    def test_grayscale_planes(self):
+        planes, state = split_channels(self.get_test_image(), GRAYSCALE)
+
+        self.assertEqual((1, 12, 16), planes.shape)
+        self.assertEqual(np.float32, planes.dtype)
+        self.assertEqual((12, 16), merge_channels(planes, state).shape)
+
+    def test_grayscale_round_trip(self):
+        img = self.get_test_image(np.uint16)[:, :, 0] * 257
+        planes, state = split_channels(img, GRAYSCALE)
+        result = merge_channels(planes, state)
+
+        self.assertEqual(np.uint16, result.dtype)
+        np.testing.assert_array_equal(img, result)
+
+    def test_rgb_round_trip(self):
+        img = self.get_test_image()
+        planes, state = split_channels(img, RGB)
+
+        self.assertEqual((3, 12, 16), planes.shape)
+        np.testing.assert_array_equal(img, merge_channels(planes, state))
+
+    def test_luminance_round_trip(self):
+        img = self.get_test_image(np.uint16) * 257
+        planes, state = split_channels(img, LUMINANCE)
+        result = merge_channels(planes, state)
+
+        self.assertEqual((1, 12, 16), planes.shape)
+        self.assertEqual(np.uint16, result.dtype)
+        np.testing.assert_allclose(img, result, atol=32)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            split_channels(self.get_test_image(), 5)
+
+    def test_batched_planes_match_single_plane(self):
+        img = self.get_test_image()
+        result = my_wiener(img, np.ones((5, 5)) / 25, 0.01, RGB)
+        single = my_wiener(np.dstack([img[:, :, 1]] * 3), np.ones((5, 5)) / 25, 0.01, RGB)
+
+        self.assertEqual(img.shape, result.shape)
+        self.assertEqual(np.uint8, result.dtype)
+        self.assertFalse(np.array_equal(result[:, :, 0], result[:, :, 1]))
+        np.testing.assert_array_equal(single[:, :, 0], single[:, :, 2])
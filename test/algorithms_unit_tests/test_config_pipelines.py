@@ -0,0 +1,38 @@
+import os
+from unittest import TestCase
+import numpy as np
+import cv2
+from src.validation import Validation
+from src.batch import get_parameter_strings, evaluate_parameters
+from src.cache import ResultCache
+from src.workers import WorkerPool
+from src.progress import ProgressToken
+from src.profiling import Profiler
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'config.yaml')
+PIPELINE = 'Denoise, Richardson-Lucy, sharpen'
+
+
+class ConfigPipelinesTest(TestCase):
+
+    def test_pipeline_in_worker_pool(self):
+        # the stages run in the pool as in the GUI, with progress and a profiler for the algorithms taking them
+        algorithms, _, errors = Validation(isolated=False).get_algorithms(CONFIG_FILE)
+        pipeline = [a for a in algorithms if a['name'] == PIPELINE][0]
+        parameters = evaluate_parameters(pipeline, get_parameter_strings(pipeline))
+        noise = np.random.default_rng(0).integers(0, 256, size=(64, 80, 3)).astype(np.uint8)
+        img = cv2.GaussianBlur(noise, (0, 0), 2)
+
+        pool = WorkerPool([stage['module'] for stage in pipeline['config']['stages']])
+        try:
+            result, ran = pipeline['method'].run(
+                img, parameters, cache=ResultCache(),
+                run_stage=lambda i, stage, image, stage_parameters: pool.run(
+                    stage['module'], stage['method'], image, stage_parameters, progress=ProgressToken(),
+                    profiler=Profiler()))
+        finally:
+            pool.close()
+
+        self.assertEqual([0, 1, 2], ran)
+        np.testing.assert_array_equal(pipeline['method'](img, *parameters), result)
+        self.assertIsNone(Validation().validate_image(result))
@@ -0,0 +1,125 @@
+from unittest import TestCase, mock
+import numpy as np
+import cv2
+from algorithms.convolution import my_convolution, separate_kernel, correlate_same, direct_fft_crossover, \
+    FFT_KERNEL_SIZE
+from src.progress import ProgressToken, Cancelled
+
+
+class ConvolutionTest(TestCase):
+
+    # region helpers
+    def get_test_image(self, shape, dtype=np.uint8):
+        return np.random.default_rng(0).integers(0, 256, size=shape).astype(dtype)
+
+    def reference_convolution(self, img, kernel):
+        # per-pixel loop of the original implementation
+        result = img.copy()
+        offset = kernel.shape[0] // 2
+        for j in range(offset, img.shape[0] - offset):
+            for i in range(offset, img.shape[1] - offset):
+                context = img[j - offset:j + offset + 1, i - offset:i + offset + 1]
+                result[j][i] = np.sum(context * kernel)
+        return result
+    # endregion
+
+    def test_sharpen_matches_reference(self):
+        img = self.get_test_image((20, 30))
+        kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+
+        np.testing.assert_array_equal(self.reference_convolution(img, kernel), my_convolution(img, kernel))
+
+    def test_box_kernel_matches_exact_average(self):
+        # the averages are truncated like the original, whichever path the kernel size takes
+        img = self.get_test_image((60, 70))
+        for size in (3, 5, FFT_KERNEL_SIZE + 2):
+            offset = size // 2
+            sums = self.reference_convolution(img.astype(np.int64), np.ones((size, size), dtype=np.int64))
+            expected = img.copy()
+            expected[offset:-offset, offset:-offset] = sums[offset:-offset, offset:-offset] // size ** 2
+
+            np.testing.assert_array_equal(expected, my_convolution(img, np.ones((size, size)) / size ** 2))
+
+    def test_float_image_matches_filter2d_inside_border(self):
+        img = self.get_test_image((40, 40), np.float32)
+        kernel = np.random.default_rng(1).random((5, 5))
+        result = my_convolution(img, kernel)
+
+        np.testing.assert_allclose(cv2.filter2D(img, -1, kernel)[2:-2, 2:-2], result[2:-2, 2:-2], rtol=1e-4)
+        np.testing.assert_array_equal(img[:2], result[:2])
+        np.testing.assert_array_equal(img[:, -2:], result[:, -2:])
+
+    def test_fft_path_matches_reference(self):
+        img = self.get_test_image((40, 50), np.float64)
+        size = FFT_KERNEL_SIZE + 2
+        kernel = np.random.default_rng(1).random((size, size))
+
+        np.testing.assert_allclose(self.reference_convolution(img, kernel), my_convolution(img, kernel))
+
+    def test_color_image(self):
+        img = self.get_test_image((10, 12, 3))
+        kernel = np.ones((3, 3)) / 9
+        result = my_convolution(img, kernel)
+
+        self.assertEqual(img.shape, result.shape)
+        self.assertEqual(img.dtype, result.dtype)
+        np.testing.assert_array_equal(self.reference_convolution(img[:, :, 1], kernel), result[:, :, 1])
+
+    def test_invalid_kernels(self):
+        img = self.get_test_image((10, 10))
+
+        with self.assertRaises(ValueError):
+            my_convolution(img, np.ones((3, 5)))
+        with self.assertRaises(ValueError):
+            my_convolution(img, np.ones((4, 4)))
+
+    def test_separable_kernels_are_factorized(self):
+        gaussian = cv2.getGaussianKernel(9, 2)
+        factors = separate_kernel(gaussian @ gaussian.T)
+
+        self.assertEqual(1, len(factors))
+        np.testing.assert_allclose(gaussian @ gaussian.T, np.outer(*factors[0]), atol=1e-12)
+        self.assertIs(factors, separate_kernel(gaussian @ gaussian.T))
+
+    def test_dense_kernels_are_not_factorized(self):
+        self.assertIsNone(separate_kernel(np.random.default_rng(1).random((5, 5))))
+        self.assertIsNone(separate_kernel(np.zeros((5, 5))))
+
+    def test_separable_path_matches_reference(self):
+        img = self.get_test_image((30, 40), np.float64)
+        kernel = np.ones((7, 7)) / 49 + np.outer(np.arange(7), np.arange(7)) / 100
+
+        np.testing.assert_allclose(self.reference_convolution(img, kernel), my_convolution(img, kernel))
+
+    def test_row_bands_match_single_band(self):
+        img = self.get_test_image((301, 97, 3), np.float32)
+        for kernel in (np.random.default_rng(1).random((3, 3)), np.random.default_rng(1).random((9, 9))):
+            np.testing.assert_allclose(my_convolution(img, kernel, 1), my_convolution(img, kernel, 4), rtol=1e-6)
+
+    def test_progress_and_cancellation(self):
+        img = self.get_test_image((301, 97), np.float32)
+        kernel = np.ones((3, 3)) / 9
+        for workers in (1, 4):
+            progress = ProgressToken()
+            my_convolution(img, kernel, workers, progress=progress)
+            self.assertEqual(1.0, progress.fraction())
+
+            progress = ProgressToken()
+            progress.cancel()
+            with self.assertRaises(Cancelled):
+                my_convolution(img, kernel, workers, progress=progress)
+
+    def test_correlate_same_paths_agree(self):
+        img = self.get_test_image((50, 60), np.float32)
+        kernel = np.random.default_rng(1).random((7, 7)).astype(np.float32)
+        expected = cv2.filter2D(img, -1, kernel, borderType=cv2.BORDER_CONSTANT)
+
+        for crossover in (3, float('inf')):
+            with mock.patch('algorithms.convolution.direct_fft_crossover', return_value=crossover):
+                np.testing.assert_allclose(expected, correlate_same(img, kernel), rtol=1e-4, atol=1e-2)
+
+    def test_crossover_is_measured_once(self):
+        crossover = direct_fft_crossover()
+
+        self.assertGreaterEqual(crossover, 3)
+        self.assertEqual(1, direct_fft_crossover.cache_info().currsize)
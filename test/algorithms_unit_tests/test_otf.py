@@ -0,0 +1,65 @@
+from unittest import TestCase
+import numpy as np
+from algorithms.otf import OTFCache, psf2otf, zero_pad, fast_shape, pad_to_shape
+
+
+class OTFCacheTest(TestCase):
+
+    def test_hits_and_misses(self):
+        cache = OTFCache()
+        psf = np.ones((3, 3)) / 9
+        first = cache.get('fft2', psf, (8, 8), np.complex128, lambda: np.fft.fft2(psf, s=(8, 8)))
+        second = cache.get('fft2', psf.copy(), (8, 8), np.complex128, lambda: self.fail('Recomputed cached OTF.'))
+
+        self.assertIs(first, second)
+        self.assertFalse(first.flags.writeable)
+        self.assertEqual({'hits': 1, 'misses': 1, 'entries': 1, 'bytes': first.nbytes}, cache.stats())
+
+    def test_key_includes_shape_and_kind(self):
+        cache = OTFCache()
+        psf = np.ones((3, 3)) / 9
+        cache.get('fft2', psf, (8, 8), np.complex128, lambda: np.fft.fft2(psf, s=(8, 8)))
+        cache.get('fft2', psf, (8, 16), np.complex128, lambda: np.fft.fft2(psf, s=(8, 16)))
+        cache.get('other', psf, (8, 8), np.complex128, lambda: np.fft.fft2(psf, s=(8, 8)))
+
+        self.assertEqual(0, cache.stats()['hits'])
+        self.assertEqual(3, cache.stats()['entries'])
+
+    def test_byte_size_eviction(self):
+        entry_bytes = np.zeros((8, 8), dtype=np.complex128).nbytes
+        cache = OTFCache(max_bytes=2 * entry_bytes)
+        psfs = [np.full((3, 3), i, dtype=np.float64) for i in range(3)]
+        for psf in psfs:
+            cache.get('fft2', psf, (8, 8), np.complex128, lambda: np.zeros((8, 8), dtype=np.complex128))
+        cache.get('fft2', psfs[2], (8, 8), np.complex128, lambda: self.fail('Evicted most recent OTF.'))
+
+        self.assertEqual(2, cache.stats()['entries'])
+        self.assertEqual(2 * entry_bytes, cache.stats()['bytes'])
+
+    def test_psf2otf_matches_padded_fft(self):
+        psf = np.random.default_rng(0).random((5, 5))
+        padded = np.roll(zero_pad(psf, (16, 20)), (-2, -2), axis=(0, 1))
+
+        np.testing.assert_allclose(np.fft.fft2(padded), psf2otf(psf, (16, 20)), atol=1e-12)
+
+    def test_real_otf_matches_half_spectrum(self):
+        for psf in (np.random.default_rng(0).random((5, 5)), np.ones((5, 5)) / 25):
+            np.testing.assert_allclose(psf2otf(psf, (16, 21))[:, :11], psf2otf(psf, (16, 21), real=True), atol=1e-12)
+
+    def test_fast_shape_is_5_smooth(self):
+        self.assertEqual((1024, 2000), fast_shape((1021, 1999)))
+        self.assertEqual((64, 81), fast_shape((64, 81)))
+
+    def test_pad_to_shape_mirrors_edges(self):
+        img = np.arange(12).reshape(3, 4)
+        padded = pad_to_shape(img, (5, 5))
+
+        np.testing.assert_array_equal(img, padded[:3, :4])
+        np.testing.assert_array_equal(img[2:0:-1], padded[3:, :4])
+        np.testing.assert_array_equal(img[:, 3], padded[:3, 4])
+
+    def test_zero_pad_center(self):
+        padded = zero_pad(np.ones((2, 2)), (4, 6), position='center')
+
+        self.assertEqual(4, padded.sum())
+        np.testing.assert_array_equal(np.ones((2, 2)), padded[1:3, 2:4])
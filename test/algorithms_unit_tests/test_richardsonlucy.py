@@ -0,0 +1,168 @@
+from unittest import TestCase
+import numpy as np
+import cv2
+from algorithms.richardsonlucy import RLWorkspace, AcceleratedRLWorkspace, richardson_lucy, \
+    richardson_lucy_accelerated, my_RL_deconvolution_FFT, my_RL_deconvolution, my_RL_deconvolution_accelerated, \
+    rl_checkpoints
+from src.progress import ProgressToken, Cancelled
+from src.profiling import Profiler
+
+
+class RichardsonLucyTest(TestCase):
+
+    # region helpers
+    def get_blurred_planes(self, psf):
+        img = np.zeros((64, 80), dtype=np.float32)
+        img[20:40, 30:50] = 1
+        img[50, 10] = 2
+        blurred = cv2.filter2D(img, -1, psf, borderType=cv2.BORDER_REFLECT) + 0.01
+        return img, blurred[np.newaxis]
+    # endregion
+
+    def test_reduces_residual(self):
+        psf = np.ones((5, 5)) / 25
+        img, planes = self.get_blurred_planes(psf)
+        workspace = RLWorkspace(planes, psf)
+        richardson_lucy(workspace, 30)
+
+        self.assertEqual(np.float32, workspace.estimate.dtype)
+        self.assertLess(np.abs(workspace.estimate[0, :64, :80] - img - 0.01).mean(),
+                        np.abs(planes[0] - img - 0.01).mean())
+
+    def test_early_stopping(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        workspace = RLWorkspace(planes, psf)
+        used = richardson_lucy(workspace, 500, tolerance=1e-3)
+
+        self.assertLess(used, 500)
+        self.assertEqual(used, workspace.iterations)
+        self.assertLess(workspace.relative_change, 1e-3)
+
+    def test_residual_stopping(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        workspace = RLWorkspace(planes, psf)
+        used = richardson_lucy(workspace, 500, residual_tolerance=0.05)
+
+        self.assertLess(used, 500)
+        self.assertLess(workspace.residual, 0.05)
+
+    def test_resuming_matches_single_run(self):
+        psf = np.triu(np.ones((5, 5))) / 15
+        _, planes = self.get_blurred_planes(psf)
+        resumed, single = RLWorkspace(planes, psf), RLWorkspace(planes, psf)
+        richardson_lucy(resumed, 5)
+        richardson_lucy(resumed, 5)
+        richardson_lucy(single, 10)
+
+        self.assertEqual(10, resumed.iterations)
+        np.testing.assert_allclose(single.estimate, resumed.estimate, rtol=1e-5)
+
+    def test_black_image_stays_finite(self):
+        result = my_RL_deconvolution_FFT(np.zeros((20, 20), dtype=np.uint8), np.ones((5, 5)) / 25, 3)
+
+        self.assertTrue(np.all(np.isfinite(result)))
+
+    def test_accelerated_needs_fewer_iterations(self):
+        psf = np.ones((7, 7)) / 49
+        _, planes = self.get_blurred_planes(psf)
+        plain, accelerated = RLWorkspace(planes, psf), AcceleratedRLWorkspace(planes, psf)
+        plain_iterations = richardson_lucy(plain, 500, residual_tolerance=0.002)
+        accelerated_iterations = richardson_lucy_accelerated(accelerated, 500, residual_tolerance=0.002)
+
+        self.assertLess(accelerated_iterations, plain_iterations)
+        self.assertTrue(np.all(accelerated.estimate >= 0))
+        self.assertGreater(accelerated.alpha, 0)
+
+    def test_spatial_matches_fft_inside_border(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        spatial = my_RL_deconvolution(planes[0], psf, 10).astype(np.float32)
+        fft = my_RL_deconvolution_FFT(planes[0], psf, 10)
+        fft = (fft - fft.min()) / (fft.max() - fft.min()) * 255
+
+        self.assertEqual((64, 80), spatial.shape)
+        self.assertLess(np.abs(spatial - fft)[10:-10, 10:-10].max(), 8)
+
+    def test_checkpoint_resumes(self):
+        psf = np.triu(np.ones((5, 5))) / 15
+        _, planes = self.get_blurred_planes(psf)
+        img = (planes[0] * 100).astype(np.uint8)
+        rl_checkpoints.clear()
+
+        for method in (my_RL_deconvolution_FFT, my_RL_deconvolution_accelerated):
+            single = method(img, psf, 10)
+            method(img, psf, 4, checkpoint=True)
+            resumed = method(img, psf, 10, checkpoint=True)
+            np.testing.assert_allclose(single, resumed, rtol=1e-4, atol=1e-3)
+
+            # fewer iterations than the checkpoint start over
+            np.testing.assert_allclose(method(img, psf, 3), method(img, psf, 3, checkpoint=True), rtol=1e-5)
+
+        self.assertEqual(2, len(rl_checkpoints._entries))
+        rl_checkpoints.clear()
+
+    def test_previews(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        previews = []
+        result = my_RL_deconvolution_FFT(planes[0], psf, 12, preview=lambda image, i: previews.append((image, i)),
+                                         preview_every=5)
+
+        self.assertEqual([5, 10], [i for _, i in previews])
+        self.assertEqual(result.shape, previews[0][0].shape)
+        self.assertFalse(np.allclose(result, previews[-1][0]))
+
+    def test_cancelled_run_keeps_checkpoint(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        img = (planes[0] * 100).astype(np.uint8)
+        rl_checkpoints.clear()
+        progress = ProgressToken()
+
+        with self.assertRaises(Cancelled):
+            my_RL_deconvolution_FFT(img, psf, 10, preview=lambda image, i: progress.cancel(), preview_every=4,
+                                    checkpoint=True, progress=progress)
+        self.assertEqual(4, progress.done)
+        self.assertEqual(10, progress.total)
+
+        progress = ProgressToken()
+        resumed = my_RL_deconvolution_FFT(img, psf, 10, checkpoint=True, progress=progress)
+        np.testing.assert_allclose(my_RL_deconvolution_FFT(img, psf, 10), resumed, rtol=1e-4, atol=1e-3)
+        self.assertEqual(1.0, progress.fraction())
+        rl_checkpoints.clear()
+
+    def test_iteration_spans(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        for method in (my_RL_deconvolution_FFT, my_RL_deconvolution_accelerated, my_RL_deconvolution):
+            profiler = Profiler()
+            method(planes[0], psf, 3, profiler=profiler)
+
+            iterations = [event['args']['iteration'] for event in profiler.get_events()
+                          if event['name'] == 'RL iteration']
+            self.assertEqual([1, 2, 3], iterations)
+
+    def test_residual_tolerance_stops_early(self):
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        for method in (my_RL_deconvolution_FFT, my_RL_deconvolution_accelerated):
+            profiler = Profiler()
+            method(planes[0], psf, 500, residual_tolerance=0.05, profiler=profiler)
+
+            merge = [event for event in profiler.get_events() if event['name'] == 'RL merge'][0]
+            self.assertLess(merge['args']['iterations'], 500)
+            self.assertEqual(0, merge['args']['resumed'])
+
+    def test_tolerance_stop_reported_by_progress(self):
+        # with a progress token every iteration runs on its own, the tolerance still ends the run
+        psf = np.ones((5, 5)) / 25
+        _, planes = self.get_blurred_planes(psf)
+        for method in (my_RL_deconvolution_FFT, my_RL_deconvolution_accelerated):
+            for tolerances in ({'tolerance': 0.01}, {'residual_tolerance': 0.05}):
+                progress = ProgressToken()
+                method(planes[0], psf, 500, progress=progress, **tolerances)
+
+                self.assertLess(progress.done, 500)
+                self.assertEqual(f'stopped after {progress.done} of 500 iterations', progress.stopped_early())
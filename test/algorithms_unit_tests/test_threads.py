@@ -0,0 +1,13 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from algorithms.threads import get_cpu_count, THREADS_VARIABLE
+
+
+class ThreadsTest(TestCase):
+
+    def test_cpu_count(self):
+        with patch.dict(os.environ, {THREADS_VARIABLE: '3'}):
+            self.assertEqual(3, get_cpu_count())
+        with patch.dict(os.environ, {THREADS_VARIABLE: ''}):
+            self.assertEqual(os.cpu_count(), get_cpu_count())
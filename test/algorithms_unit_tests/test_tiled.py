@@ -0,0 +1,91 @@
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+import cv2
+from algorithms.tiled import tiled_deconvolution, tiled_wiener, get_tiles, seam_error
+from algorithms.wiener import my_wiener
+from algorithms.channels import GRAYSCALE, RGB, LUMINANCE
+from src.progress import ProgressToken, Cancelled
+from src.workers import WorkerPool
+
+
+class TiledDeconvolutionTest(TestCase):
+
+    def get_test_image(self, shape):
+        noise = np.random.default_rng(0).integers(0, 256, size=shape).astype(np.uint8)
+        return cv2.GaussianBlur(noise, (0, 0), 2)
+
+    def test_tiles_cover_image(self):
+        covered = np.zeros((70, 100), dtype=int)
+        for y0, y1, x0, x1 in get_tiles(covered.shape, 32):
+            covered[y0:y1, x0:x1] += 1
+
+        np.testing.assert_array_equal(1, covered)
+
+    def test_matches_full_frame_at_seams(self):
+        img = self.get_test_image((200, 260)).astype(np.float32)
+        psf = np.ones((5, 5)) / 25
+        result = tiled_wiener(img, psf, 0.01, tile_size=64, workers=2)
+        error = seam_error(result, my_wiener(img, psf, 0.01), 64, border=40)
+
+        self.assertEqual(np.float32, result.dtype)
+        self.assertLess(error['max'], 2)
+
+    def test_tile_workers_in_worker_pool(self):
+        # the tile workers are started by a worker of the pool, as when the GUI runs a tiled algorithm
+        img = self.get_test_image((200, 260))
+        psf = np.ones((5, 5)) / 25
+        pool = WorkerPool(['algorithms.tiled'])
+        try:
+            result = pool.run('algorithms.tiled', 'tiled_wiener', img, [psf, 0.01, GRAYSCALE, 64, 2])
+        finally:
+            pool.close()
+
+        np.testing.assert_allclose(tiled_wiener(img, psf, 0.01, tile_size=64, workers=1), result, atol=1e-3)
+
+    def test_color_tiles(self):
+        img = np.dstack([self.get_test_image((100, 90))] * 3)
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'source.npy'), os.path.join(directory, 'target.npy')
+            np.save(source, img)
+            tiled_deconvolution(source, target, np.ones((3, 3)) / 9, 'richardson_lucy', (3,), 48, workers=1)
+            result = np.load(target)
+
+        self.assertEqual(img.shape, result.shape)
+        np.testing.assert_array_equal(result[:, :, 0], result[:, :, 2])
+
+    def test_color_modes_match_full_frame(self):
+        noise = np.random.default_rng(0).integers(0, 256, size=(120, 100, 3)).astype(np.uint8)
+        img = cv2.GaussianBlur(noise, (0, 0), 2).astype(np.float32)
+        psf = np.ones((5, 5)) / 25
+        for color_mode in (GRAYSCALE, RGB, LUMINANCE):
+            with self.subTest(color_mode=color_mode):
+                result = tiled_wiener(img, psf, 0.01, color_mode, tile_size=48, workers=1)
+                reference = my_wiener(img, psf, 0.01, color_mode)
+
+                self.assertEqual(reference.shape, result.shape)
+                self.assertLess(seam_error(result, reference, 48, border=40)['max'], 2)
+
+    def test_float_image(self):
+        img = self.get_test_image((100, 90))
+        psf = np.ones((3, 3)) / 9
+        result = tiled_wiener(img.astype(np.float32), psf, 0.01, tile_size=48, workers=1)
+        integer = tiled_wiener(img, psf, 0.01, tile_size=48, workers=1)
+
+        self.assertEqual(np.uint8, integer.dtype)
+        np.testing.assert_allclose(np.clip(result, 0, 255), integer, atol=0.501)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            tiled_deconvolution('source.npy', 'target.npy', np.ones((3, 3)), 'unknown', ())
+
+    def test_progress_and_cancellation(self):
+        img = self.get_test_image((100, 90))
+        progress = ProgressToken()
+        tiled_wiener(img, np.ones((3, 3)) / 9, 0.01, tile_size=48, workers=1, progress=progress)
+        self.assertEqual((6, 6), (progress.done, progress.total))
+
+        progress.cancel()
+        with self.assertRaises(Cancelled):
+            tiled_wiener(img, np.ones((3, 3)) / 9, 0.01, tile_size=48, workers=2, progress=progress)
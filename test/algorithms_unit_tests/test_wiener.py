@@ -0,0 +1,41 @@
+from unittest import TestCase
+import numpy as np
+import cv2
+from algorithms.wiener import my_wiener, my_wiener_sweep
+from algorithms.wiener_original import wiener_original, wiener_original_sweep
+from algorithms.otf import sweep_chunks
+from algorithms.channels import GRAYSCALE, RGB
+
+
+class WienerSweepTest(TestCase):
+
+    # region helpers
+    def get_blurred_image(self, psf):
+        rng = np.random.default_rng(0)
+        img = (rng.random((60, 70, 3)) * 255).astype(np.uint8)
+        return cv2.filter2D(img, -1, psf, borderType=cv2.BORDER_REFLECT)
+    # endregion
+
+    def test_chunks(self):
+        self.assertEqual([slice(0, 3), slice(3, 6), slice(6, 7)], sweep_chunks(7, 10, max_bytes=30))
+        self.assertEqual([slice(0, 1), slice(1, 2)], sweep_chunks(2, 100, max_bytes=30))
+
+    def test_my_wiener_sweep(self):
+        psf = np.ones((5, 5)) / 25
+        img = self.get_blurred_image(psf)
+        Ks = [0.001, 0.01, 0.1]
+
+        for color_mode in (GRAYSCALE, RGB):
+            results = my_wiener_sweep(img, psf, Ks, color_mode)
+            self.assertEqual(len(Ks), len(results))
+            for K, result in zip(Ks, results):
+                np.testing.assert_array_equal(my_wiener(img, psf, K, color_mode), result)
+
+    def test_wiener_original_sweep(self):
+        balances = [0.001, 0.1, 1.0]
+
+        for psf in (np.ones((5, 5)) / 25, np.triu(np.ones((5, 5))) / 15):
+            img = self.get_blurred_image(psf)
+            results = wiener_original_sweep(img, psf, balances)
+            for balance, result in zip(balances, results):
+                np.testing.assert_allclose(wiener_original(img, psf, balance), result, atol=1e-2)
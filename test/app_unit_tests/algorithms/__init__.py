@@ -0,0 +1,4 @@
+import os
+
+# modules not found among the test algorithms are the ones of the application
+__path__.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'algorithms'))
@@ -1,4 +1,8 @@
+import multiprocessing
+import os
+import time
 import numpy as np
+from algorithms.threads import THREADS_VARIABLE
 
 # region ValidationTests
 
@@ -24,3 +28,86 @@ def test5(img, a, b, c, d, e, f, g, h):
 
 
 
+# endregion
+
+# region SweepTests
+
+
+def test2_sweep(img, x1, x2s: list):      # sweep method of test2
+    return [np.full((3, 3), x1 + x2).astype(np.uint8) for x2 in x2s]
+
+
+def test2_values(img, x1: int, x2: int):    # test2 returning its parameters
+    return np.full((3, 3), x1 + x2).astype(np.uint8)
+# endregion
+
+# region ValidationCacheTests
+
+executions = 0
+
+
+def test_counted(img, x: int):      # counts its executions
+    global executions
+    executions += 1
+    return np.zeros((3, 3)).astype(np.uint8)
+# endregion
+
+# region IsolatedExecutionTests
+
+
+def test_sleeping(img, seconds: float):     # runs for the given time
+    time.sleep(seconds)
+    return np.zeros((3, 3)).astype(np.uint8)
+
+
+def test_exit(img):                         # terminates its process
+    os._exit(3)
+
+
+def test_memory(img):                       # allocates more memory than allowed
+    return np.ones((2 ** 30,)).astype(np.uint8)[:9].reshape((3, 3))
+# endregion
+
+# region WorkerPoolTests
+
+
+def test_threads(img):                      # the CPU cores its caller allows
+    return np.full((3, 3), int(os.environ.get(THREADS_VARIABLE, 0))).astype(np.uint8)
+
+
+def test_reporting(img, steps: int, progress=None, preview=None, profiler=None):     # reports progress and previews
+    for i in range(steps):
+        if profiler is not None:
+            profiler.add('step', 'algorithm', time.perf_counter(), 0, {'step': i})
+        if preview is not None:
+            preview(img + i, i)
+        if progress is not None:
+            progress.update(i + 1, steps)
+    return img + steps
+
+
+def test_reporting_slowly(img, seconds: float, progress=None):    # reports progress while it runs
+    steps = int(seconds / 0.05)
+    for i in range(steps):
+        time.sleep(0.05)
+        if progress is not None:
+            progress.update(i + 1, steps)
+    return img
+
+
+def test_child_process(img, path: str, progress=None):      # starts a process of its own, runs until cancelled
+    child = multiprocessing.get_context('spawn').Process(target=time.sleep, args=(60,))
+    child.start()
+    with open(path, 'w') as f:
+        f.write(str(child.pid))
+    while True:
+        time.sleep(0.05)
+        if progress is not None:
+            progress.update(0, 1)
+# endregion
+
+# region PipelineTests
+
+
+def test_add(img, x: int):      # adds x to the image
+    return (img + x).astype(np.uint8)
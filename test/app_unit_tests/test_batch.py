@@ -0,0 +1,131 @@
+import os
+import tempfile
+from unittest import TestCase
+import cv2
+import numpy as np
+from src.batch import get_parameter_strings, evaluate_parameters, parse_overrides, get_input_paths, run_batch
+from src.helpers import ParamType
+from src.image_io import read_image
+from src.memory import MemoryBudgetError
+from algorithms.test_algorithms import test1, test4, test_reporting, test_threads
+
+
+class BatchTest(TestCase):
+
+    # region helpers
+    def get_algorithm(self):
+        return {
+            'name': 'name',
+            'method': test1,
+            'params': [
+                {'name': 'x', 'type': ParamType.INT, 'default': '3'},
+                {'name': 'flag', 'type': ParamType.BOOL, 'default': 'True'},
+                {'name': 'kernel', 'type': ParamType.NPARRAY, 'default': 'np.asarray(np.ones((3, 3)))'}
+            ]
+        }
+
+    def write_images(self, directory, count):
+        for i in range(count):
+            cv2.imwrite(os.path.join(directory, f'image{i}.png'), np.full((8, 8, 3), 100 + i, dtype=np.uint8))
+        with open(os.path.join(directory, 'notes.txt'), 'w') as f:
+            f.write('not an image')
+    # endregion
+
+    def test_parameter_defaults_and_overrides(self):
+        param_strings = get_parameter_strings(self.get_algorithm(), parse_overrides(['x = 5']))
+        self.assertEqual(['5', '1', 'np.asarray(np.ones((3, 3)))'], param_strings)
+
+        parameters = evaluate_parameters(self.get_algorithm(), param_strings)
+        self.assertEqual(5, parameters[0])
+        self.assertTrue(parameters[1])
+        self.assertEqual((3, 3), parameters[2].shape)
+
+    def test_unknown_parameter(self):
+        with self.assertRaises(ValueError):
+            get_parameter_strings(self.get_algorithm(), {'y': '1'})
+        with self.assertRaises(ValueError):
+            parse_overrides(['x'])
+
+    def test_run_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_images(directory, 3)
+            paths = get_input_paths([directory])
+            self.assertEqual(3, len(paths))
+            self.assertEqual(paths, get_input_paths([os.path.join(directory, '*.png'), directory]))
+
+            output_dir = os.path.join(directory, 'output')
+            timings, failures = run_batch(test1, [1], paths, output_dir, workers=1, log=lambda message: None)
+
+            self.assertEqual(3, len(timings))
+            self.assertEqual(0, len(failures))
+            self.assertEqual(['image0.png', 'image1.png', 'image2.png'], sorted(os.listdir(output_dir)))
+
+    def test_run_batch_failure(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_images(directory, 2)
+            timings, failures = run_batch(test4, [], get_input_paths([directory]), directory, workers=1,
+                                          log=lambda message: None)
+
+            self.assertEqual(0, len(timings))
+            self.assertEqual(2, len(failures))
+
+    def test_run_batch_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_images(directory, 2)
+            paths = get_input_paths([directory])
+            cache_directory = os.path.join(directory, 'cache')
+            output_dir = os.path.join(directory, 'output')
+
+            first, _ = run_batch(test1, [1], paths, output_dir, workers=1, cache_directory=cache_directory,
+                                 log=lambda message: None)
+            second, _ = run_batch(test1, [1], paths, output_dir, workers=1, cache_directory=cache_directory,
+                                  log=lambda message: None)
+
+            self.assertEqual([False, False], [timing['cached'] for timing in first])
+            self.assertEqual([True, True], [timing['cached'] for timing in second])
+
+
+    def test_run_batch_keeps_16_bit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            img = np.full((8, 8, 3), 1000, dtype=np.uint16)
+            np.save(os.path.join(directory, 'image.npy'), img)
+            output_dir = os.path.join(directory, 'output')
+
+            timings, failures = run_batch(test_reporting, [1], get_input_paths([directory]), output_dir, workers=1,
+                                          extension='tif', log=lambda message: None)
+
+            self.assertEqual(0, len(failures))
+            self.assertEqual(np.uint16, read_image(os.path.join(output_dir, 'image.tif')).dtype)
+
+    def test_run_batch_plan(self):
+        def plan(shape):
+            if shape[0] > 8:
+                raise MemoryBudgetError('over budget')
+            return test_reporting, [2]
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_images(directory, 1)
+            cv2.imwrite(os.path.join(directory, 'large.png'), np.zeros((16, 16), dtype=np.uint8))
+            output_dir = os.path.join(directory, 'output')
+
+            timings, failures = run_batch(test1, [1], get_input_paths([directory]), output_dir, workers=1,
+                                          log=lambda message: None, plan=plan)
+
+            self.assertEqual(1, len(timings))
+            self.assertIsNotNone(timings[0]['memory']['peak_traced'])
+            self.assertEqual(['large.png'], [os.path.basename(path) for path, _ in failures])
+            self.assertEqual(102, read_image(os.path.join(output_dir, 'image0.png'))[0, 0, 0])
+
+    def test_run_batch_shares_cores(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_images(directory, 2)
+            output_dir = os.path.join(directory, 'output')
+
+            timings, failures = run_batch(test_threads, [], get_input_paths([directory]), output_dir, workers=2,
+                                          extension='npy', log=lambda message: None)
+
+            self.assertEqual(0, len(failures))
+            threads = max(1, (os.cpu_count() or 1) // 2)
+            for i in range(2):
+                self.assertEqual(threads, read_image(os.path.join(output_dir, f'image{i}.npy'))[0, 0])
+            self.assertNotIn('DECONVOLUTION_THREADS', os.environ)
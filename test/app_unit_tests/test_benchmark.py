@@ -0,0 +1,77 @@
+import copy
+import io
+import os
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import TestCase
+from src.validation import Validation
+from benchmarks.suite import run_suite, compare_results, load_results, main
+
+
+class BenchmarkTest(TestCase):
+
+    # region helpers
+    def get_results(self, wall_time=1.0, peak_rss_mib=200.0, error=None):
+        result = {'algorithm': 'a', 'size': 256, 'channels': 'gray', 'dtype': 'uint8'}
+        if error is not None:
+            result['error'] = error
+        else:
+            result.update({'wall_time': wall_time, 'base_rss_mib': 100.0, 'peak_rss_mib': peak_rss_mib})
+        return {'results': [result]}
+    # endregion
+
+    def test_run_suite(self):
+        algorithms, _, errors = Validation(isolated=False).get_algorithms('mock_configs/config_benchmark.yaml')
+        self.assertEqual(0, len(errors))
+
+        results = run_suite(algorithms, sizes=[16, 32], dtypes=['float32'], repeats=2, log=lambda message: None)
+
+        cases = [(16, 'gray'), (16, 'rgb'), (32, 'gray'), (32, 'rgb')]
+        self.assertEqual([('reporting', *case) for case in cases] + [('reporting twice', *case) for case in cases],
+                         [(result['algorithm'], result['size'], result['channels']) for result in results])
+        for result in results:
+            self.assertNotIn('error', result)
+            self.assertEqual(2, len(result['times']))
+            self.assertGreaterEqual(result['peak_rss_mib'], result['base_rss_mib'])
+
+    def test_run_leaves_out_failing_algorithms(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config, output = os.path.join(directory, 'config.yaml'), os.path.join(directory, 'results.json')
+            with open(config, 'w') as f:
+                f.write('algorithms:\n'
+                        '- {name: reporting, module: algorithms.test_algorithms, method: test_reporting,\n'
+                        '   params: [{name: steps, type: int, default: 2}]}\n'
+                        '- {name: invalid result, module: algorithms.test_algorithms, method: test3}\n')
+
+            with redirect_stderr(io.StringIO()) as errors, redirect_stdout(io.StringIO()):
+                self.assertEqual(0, main(['run', '-c', config, '-o', output, '-s', '16', '--channels', 'gray',
+                                          '--dtypes', 'uint8', '-r', '1']))
+
+            self.assertIn('ALGORITHM: invalid result', errors.getvalue())
+            self.assertEqual(['reporting'], [result['algorithm'] for result in load_results(output)['results']])
+
+    def test_compare_results(self):
+        baseline = self.get_results()
+        self.assertEqual([], compare_results(baseline, copy.deepcopy(baseline)))
+        # within the threshold
+        self.assertEqual([], compare_results(baseline, self.get_results(wall_time=1.05, peak_rss_mib=205)))
+
+        regressions = compare_results(baseline, self.get_results(wall_time=1.5, peak_rss_mib=300))
+        self.assertEqual(2, len(regressions))
+        self.assertEqual(('a', 256, 'gray', 'uint8'), regressions[0][0])
+        self.assertIn('1.50x', regressions[0][1])
+
+        regressions = compare_results(baseline, self.get_results(error='MemoryError: '))
+        self.assertEqual(1, len(regressions))
+        # a case failing in the baseline is not compared
+        self.assertEqual([], compare_results(self.get_results(error='MemoryError: '), baseline))
+
+    def test_memory_not_measured(self):
+        current = self.get_results(peak_rss_mib=None)
+        current['results'][0]['base_rss_mib'] = None
+        self.assertEqual([], compare_results(self.get_results(), current))
+
+    def test_small_increases_are_noise(self):
+        regressions = compare_results(self.get_results(wall_time=0.001, peak_rss_mib=102),
+                                      self.get_results(wall_time=0.002, peak_rss_mib=104))
+        self.assertEqual([], regressions)
@@ -0,0 +1,70 @@
+import os
+import tempfile
+from unittest import TestCase
+import numpy as np
+from src.cache import ResultCache, get_source_digest
+from algorithms.test_algorithms import test1, test2
+
+
+class ResultCacheTest(TestCase):
+
+    # region helpers
+    def get_image(self, value=0):
+        img = np.zeros((10, 10), dtype=np.uint8)
+        img[0, 0] = value
+        return img
+    # endregion
+
+    def test_key(self):
+        cache = ResultCache()
+        key = cache.key(test1, self.get_image(), [1, np.ones((3, 3))])
+
+        self.assertEqual(key, cache.key(test1, self.get_image(), [1, np.ones((3, 3))]))
+        self.assertNotEqual(key, cache.key(test2, self.get_image(), [1, np.ones((3, 3))]))
+        self.assertNotEqual(key, cache.key(test1, self.get_image(1), [1, np.ones((3, 3))]))
+        self.assertNotEqual(key, cache.key(test1, self.get_image(), [1.0, np.ones((3, 3))]))
+        self.assertNotEqual(key, cache.key(test1, self.get_image(), [1, np.ones((3, 3), dtype=np.float32)]))
+
+    def test_source_digest_covers_package(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('__init__.py', 'method.py', 'helpers.py'):
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(f'# {name}\n')
+            digest = get_source_digest(os.path.join(directory, 'method.py'))
+
+            # a helper of the package changes
+            helpers = os.path.join(directory, 'helpers.py')
+            with open(helpers, 'a') as f:
+                f.write('SCALE = 2\n')
+            os.utime(helpers, (0, 1))
+            self.assertNotEqual(digest, get_source_digest(os.path.join(directory, 'method.py')))
+
+    def test_memory_lru(self):
+        cache = ResultCache(max_bytes=350)
+        for i in range(3):
+            cache.put(str(i), np.full(100, i, dtype=np.uint8))
+        cache.get('0')
+        cache.put('3', np.zeros(100, dtype=np.uint8))
+
+        self.assertIsNotNone(cache.get('0'))
+        self.assertIsNone(cache.get('1'))
+        self.assertLessEqual(cache.stats()['bytes'], 350)
+        self.assertFalse(cache.get('0').flags.writeable)
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = np.arange(12, dtype=np.float32).reshape(3, 4)
+            ResultCache(directory=directory).put('key', result)
+
+            cache = ResultCache(directory=directory)
+            np.testing.assert_array_equal(result, cache.get('key'))
+            self.assertEqual(1, cache.stats()['disk hits'])
+            self.assertIsNone(cache.get('missing'))
+
+    def test_disk_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(max_bytes=0, directory=directory, max_disk_bytes=1)
+            cache.put('a', np.zeros(10))
+            cache.put('b', np.zeros(10))
+
+            self.assertLessEqual(len(os.listdir(directory)), 1)
@@ -1,6 +1,11 @@
+import os
+import tempfile
+import time
+import numpy as np
 from unittest import TestCase
 from src.validation import Validation
 from src.helpers import ParamType, ErrorType, format_errors
+from algorithms import test_algorithms
 
 
 class ConfigValidationTest(TestCase):
@@ -115,5 +120,130 @@ class ConfigValidationTest(TestCase):
         self.assertEqual(error_type, ErrorType.PARSING)
         self.assertEqual(1, len(algorithms))
         self.assertTrue("Could not find config key 'module'" in errors)
+
+    def test_sweep_param_not_found(self):
+        algorithms, error_type, errors = self.set_up_validation('mock_configs/config_sweep_param_not_found.yaml')
+
+        self.assertEqual(error_type, ErrorType.PARSING)
+        self.assertEqual(0, len(algorithms))
+        self.assertTrue("Sweep parameter 'int2' is not a parameter of the algorithm" in errors)
+
+    def test_invalid_proxy_scaling(self):
+        algorithms, error_type, errors = self.set_up_validation('mock_configs/config_invalid_proxy.yaml')
+
+        self.assertEqual(error_type, ErrorType.PARSING)
+        self.assertEqual(0, len(algorithms))
+        self.assertTrue("Proxy scaling 'size' is not one of: psf" in errors)
+
+    def test_invalid_memory(self):
+        algorithms, error_type, errors = self.set_up_validation('mock_configs/config_invalid_memory.yaml')
+
+        self.assertEqual(error_type, ErrorType.PARSING)
+        self.assertEqual(0, len(algorithms))
+        self.assertTrue("Configure key 'memory' is not an object with keys 'budget' and 'bytes_per_value'." in errors)
+        self.assertTrue("Memory 'budget' and 'bytes_per_value' are not positive numbers." in errors)
+        self.assertTrue("Memory fallback 'not configured' is not another algorithm of the config file." in errors)
+
+    def test_invalid_pipelines(self):
+        algorithms, error_type, errors = self.set_up_validation('mock_configs/config_invalid_pipelines.yaml')
+
+        self.assertEqual(error_type, ErrorType.PARSING)
+        self.assertTrue("Pipeline name 'add' is already the name of an algorithm." in errors)
+        self.assertTrue("Stage #1 - Algorithm 'not configured' is not a valid algorithm of the config file." in errors)
+        self.assertTrue("Stage #1 - 'y' is not a parameter of algorithm 'add'." in errors)
+        self.assertTrue("Configure key 'stages' is not a non-empty list." in errors)
+
+    def test_pipelines(self):
+        algorithms, error_type, errors = self.set_up_validation('mock_configs/config_pipelines.yaml')
+
+        self.assertEqual(error_type, None)
+        self.assertEqual(['add', 'add twice'], [algorithm['name'] for algorithm in algorithms])
+        pipeline = algorithms[1]
+        self.assertEqual(['1: x', '2: x'], [param['name'] for param in pipeline['params']])
+        self.assertEqual(['2', '1'], [param['default'] for param in pipeline['params']])
+        self.assertEqual(135, pipeline['method'](np.full((3, 3), 128, dtype=np.uint8), 3, 4)[0, 0])
+
+    def test_sweep(self):
+        algorithms, error_type, errors = self.set_up_validation('mock_configs/config_sweep.yaml')
+
+        self.assertEqual(error_type, ErrorType.VALIDATION)
+        self.assertEqual(1, len(algorithms))
+        self.assertEqual('test2_sweep', algorithms[0]['sweep']['method'].__name__)
+        self.assertEqual(1, algorithms[0]['sweep']['param'])
+        self.assertTrue("has no attribute 'test2_sweep_not_found'" in errors)
+    # endregion
+
+    # region validation cache tests
+    def test_validation_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_file = os.path.join(directory, 'cache.json')
+            executions = test_algorithms.executions
+
+            v = Validation(isolated=False)
+
+            for _ in range(2):
+                algorithms, error_type, errors = v.get_algorithms('mock_configs/config_counted.yaml', cache_file=cache_file)
+                self.assertEqual(1, len(algorithms))
+                self.assertFalse(algorithms[0]['pending'])
+                self.assertIsNone(error_type)
+
+            self.assertEqual(executions + 1, test_algorithms.executions)
+
+    def test_lazy_validation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_file = os.path.join(directory, 'cache.json')
+            executions = test_algorithms.executions
+            v = Validation(isolated=False)
+
+            algorithms, _, _ = v.get_algorithms('mock_configs/config_counted.yaml', cache_file=cache_file, lazy=True)
+            self.assertTrue(algorithms[0]['pending'])
+            self.assertEqual(executions, test_algorithms.executions)
+
+            validated = []
+            self.assertEqual([None], v.validate_pending(algorithms, cache_file=cache_file,
+                                                        on_validated=lambda a, error: validated.append(a['name'])))
+            self.assertEqual(['counted'], validated)
+            self.assertFalse(algorithms[0]['pending'])
+            self.assertEqual(executions + 1, test_algorithms.executions)
+
+            algorithms, _, _ = v.get_algorithms('mock_configs/config_counted.yaml', cache_file=cache_file, lazy=True)
+            self.assertFalse(algorithms[0]['pending'])
+            self.assertEqual(executions + 1, test_algorithms.executions)
+
+    def test_validation_cache_keeps_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_file = os.path.join(directory, 'cache.json')
+            Validation().get_algorithms('mock_configs/config_invalid_result.yaml', cache_file=cache_file)
+
+            algorithms, error_type, errors = Validation().get_algorithms('mock_configs/config_invalid_result.yaml',
+                                                                         cache_file=cache_file, lazy=True)
+            self.assertEqual(0, len(algorithms))
+            self.assertEqual(error_type, ErrorType.VALIDATION)
+            self.assertTrue('Object is NoneType' in format_errors('Errors:', errors))
+    
+    # endregion
+
+    # region isolated execution tests
+    def test_timeout_and_crash(self):
+        v = Validation(timeout=2, memory_limit=256 * 2 ** 20)
+        start = time.monotonic()
+        algorithms, error_type, errors_obj = v.get_algorithms('mock_configs/config_isolated_errors.yaml')
+        errors = format_errors('Errors:', errors_obj)
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(1, len(algorithms))
+        self.assertEqual(ErrorType.VALIDATION, error_type)
+        self.assertEqual([ErrorType.TIMEOUT, ErrorType.CRASH, ErrorType.VALIDATION],
+                         [error['type'] for error in errors_obj])
+        self.assertTrue('did not finish within 2 seconds' in errors)
+        self.assertTrue('crashed with exit code 3' in errors)
+        self.assertTrue('MemoryError' in errors)
+
+    def test_parallel_execution(self):
+        start = time.monotonic()
+        algorithms, error_type, errors = Validation(workers=2).get_algorithms('mock_configs/config_parallel.yaml')
+
+        self.assertEqual(2, len(algorithms))
+        self.assertLess(time.monotonic() - start, 1.9)
     # endregion
 
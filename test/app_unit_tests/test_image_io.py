@@ -0,0 +1,64 @@
+import os
+import tempfile
+from unittest import TestCase
+import cv2
+import numpy as np
+from src.image_io import read_image, read_image_shape, read_reduced_image, write_image
+
+
+class ImageIOTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.img = np.random.default_rng(0).integers(0, 65536, size=(120, 160, 3)).astype(np.uint16)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_16_bit_round_trip(self):
+        for name in ('image.png', 'image.tif', 'image.npy'):
+            write_image(self.get_path(name), self.img)
+            img = read_image(self.get_path(name))
+
+            self.assertEqual(np.uint16, img.dtype)
+            np.testing.assert_array_equal(self.img, img)
+
+    def test_memory_mapped_files(self):
+        for name in ('image.tif', 'image.npy'):
+            write_image(self.get_path(name), self.img)
+            img = read_image(self.get_path(name))
+
+            self.assertIsInstance(img, np.memmap)
+            self.assertFalse(img.flags.writeable)
+
+    def test_compressed_tiff_is_decoded(self):
+        cv2.imwrite(self.get_path('image.tif'), self.img[:, :, ::-1])
+        np.testing.assert_array_equal(self.img, read_image(self.get_path('image.tif')))
+
+    def test_conversions(self):
+        write_image(self.get_path('image.jpg'), self.img)
+        self.assertEqual(np.uint8, read_image(self.get_path('image.jpg')).dtype)
+
+        write_image(self.get_path('float.png'), np.full((4, 4), 300.0))
+        np.testing.assert_array_equal(255, read_image(self.get_path('float.png')))
+
+        cv2.imwrite(self.get_path('alpha.png'), np.zeros((4, 4, 4), dtype=np.uint8))
+        self.assertEqual((4, 4, 3), read_image(self.get_path('alpha.png')).shape)
+
+    def test_shape_from_header(self):
+        gray = self.img[:, :, 0]
+        rgba = np.dstack([self.img, self.img[:, :, :1]])
+        for name, img in [('gray.png', gray), ('rgba.png', rgba), ('color.jpg', self.img), ('color.tif', self.img),
+                          ('color.npy', self.img)]:
+            path = self.get_path(name)
+            write_image(path, img)
+            self.assertEqual(read_image(path).shape, read_image_shape(path), name)
+
+    def test_reduced_resolution(self):
+        for name in ('image.jpg', 'image.png', 'image.npy'):
+            write_image(self.get_path(name), self.img)
+            self.assertEqual((60, 80, 3), read_reduced_image(self.get_path(name), 70).shape)
+            self.assertEqual((120, 160, 3), read_reduced_image(self.get_path(name), 100).shape)
@@ -0,0 +1,79 @@
+from unittest import TestCase
+import numpy as np
+from src.memory import MemoryTracker, MemoryBudgetError, fit_memory_budget, predict_footprint, reset_peak_rss
+from src.helpers import ParamType
+
+
+class MemoryTest(TestCase):
+
+    # region helpers
+    def get_algorithms(self):
+        full = {
+            'name': 'full',
+            'params': [{'name': 'PSF', 'type': ParamType.NPARRAY}, {'name': 'K', 'type': ParamType.FLOAT}],
+            'memory': {'budget': 1, 'bytes_per_value': 16, 'fallback': 'tiled'}
+        }
+        tiled = {
+            'name': 'tiled',
+            'params': [{'name': 'PSF', 'type': ParamType.NPARRAY}, {'name': 'K', 'type': ParamType.FLOAT},
+                       {'name': 'tile size', 'type': ParamType.INT, 'default': '256'}],
+            'memory': {'budget': 1, 'bytes_per_value': 4, 'fallback': None}
+        }
+        return full, tiled
+    # endregion
+
+    def test_tracker(self):
+        # larger than the blocks the allocator reuses, so the pages are mapped anew
+        with MemoryTracker() as memory:
+            np.ones((3000, 3000)).sum()
+        self.assertGreaterEqual(memory.peak_traced, 72 * 10 ** 6)
+        if reset_peak_rss():
+            self.assertGreaterEqual(memory.peak_rss, 60 * 10 ** 6)
+        else:
+            self.assertIsNone(memory.peak_rss)
+
+    def test_within_budget(self):
+        full, tiled = self.get_algorithms()
+        self.assertEqual(16 * 256 * 256, predict_footprint(full, (256, 256)))
+        self.assertIsNone(predict_footprint({'name': 'no budget'}, (256, 256)))
+
+        algorithm, parameters = fit_memory_budget(full, [full, tiled], (256, 256), ['psf', 0.1])
+        self.assertIs(full, algorithm)
+        self.assertEqual(['psf', 0.1], parameters)
+
+    def test_fallback(self):
+        full, tiled = self.get_algorithms()
+        algorithm, parameters = fit_memory_budget(full, [full, tiled], (256, 256, 3), ['psf', 0.1])
+
+        self.assertIs(tiled, algorithm)
+        self.assertEqual(['psf', 0.1, 256], parameters)
+
+    def test_grayscale_footprint(self):
+        full, _ = self.get_algorithms()
+        full['params'].append({'name': 'color mode', 'type': ParamType.INT, 'default': '0'})
+
+        self.assertEqual(16 * 256 * 256, predict_footprint(full, (256, 256, 3), ['psf', 0.1, 0]))
+        self.assertEqual(16 * 256 * 256 * 3, predict_footprint(full, (256, 256, 3), ['psf', 0.1, 1]))
+
+    def test_fallback_ignoring_parameter(self):
+        full, tiled = self.get_algorithms()
+        full['params'].append({'name': 'tolerance', 'type': ParamType.FLOAT, 'default': '0.0'})
+
+        algorithm, parameters = fit_memory_budget(full, [full, tiled], (256, 256, 3), ['psf', 0.1, 0.0])
+        self.assertIs(tiled, algorithm)
+        with self.assertRaises(MemoryBudgetError) as context:
+            fit_memory_budget(full, [full, tiled], (256, 256, 3), ['psf', 0.1, 0.001])
+        self.assertIn("Parameter 'tolerance' of 'full' is not supported by its memory fallback 'tiled'",
+                      str(context.exception))
+
+    def test_refused(self):
+        full, tiled = self.get_algorithms()
+        with self.assertRaises(MemoryBudgetError) as context:
+            fit_memory_budget(full, [full, tiled], (1024, 1024), ['psf', 0.1])
+        self.assertIn("'tiled', the memory fallback of 'full', would need about 4 MiB for an image of 1024x1024 values",
+                      str(context.exception))
+
+        # the fallback failed the validation
+        with self.assertRaises(MemoryBudgetError) as context:
+            fit_memory_budget(full, [full], (512, 512), ['psf', 0.1])
+        self.assertIn("its fallback 'tiled' is not available", str(context.exception))
@@ -0,0 +1,53 @@
+import pickle
+from unittest import TestCase
+import numpy as np
+from src.cache import ResultCache
+from src.pipeline import Pipeline
+
+
+class PipelineTest(TestCase):
+
+    # region helpers
+    def get_pipeline(self):
+        stage = {'name': 'add', 'module': 'algorithms.test_algorithms', 'method': 'test_add', 'params': 1}
+        return Pipeline([stage, dict(stage, name='add again')])
+    # endregion
+
+    def test_run(self):
+        img = np.zeros((3, 3), dtype=np.uint8)
+        result = self.get_pipeline()(img, 2, 3)
+        self.assertTrue((result == 5).all())
+
+        pipeline = pickle.loads(pickle.dumps(self.get_pipeline()))
+        self.assertTrue((pipeline(img, 1, 1) == 2).all())
+
+    def test_run_stage(self):
+        calls = []
+
+        def run_stage(i, stage, img, parameters):
+            calls.append((i, stage['name'], parameters))
+            return img + parameters[0]
+
+        result, ran = self.get_pipeline().run(np.zeros((3, 3), dtype=np.uint8), [2, 3], run_stage=run_stage)
+        self.assertTrue((result == 5).all())
+        self.assertEqual([0, 1], ran)
+        self.assertEqual([(0, 'add', [2]), (1, 'add again', [3])], calls)
+
+    def test_stage_cache(self):
+        pipeline, cache = self.get_pipeline(), ResultCache()
+        img = np.zeros((3, 3), dtype=np.uint8)
+
+        self.assertEqual([0, 1], pipeline.run(img, [1, 2], cache=cache)[1])
+        # a change of the last stage reruns only that stage
+        result, ran = pipeline.run(img, [1, 5], cache=cache)
+        self.assertEqual([1], ran)
+        self.assertTrue((result == 6).all())
+        self.assertEqual([], pipeline.run(img, [1, 5], cache=cache)[1])
+        self.assertEqual([0, 1], pipeline.run(img, [2, 5], cache=cache)[1])
+        self.assertEqual([0, 1], pipeline.run(img + 1, [1, 5], cache=cache)[1])
+
+    def test_cache_key(self):
+        cache = ResultCache()
+        img = np.zeros((3, 3), dtype=np.uint8)
+        self.assertEqual(cache.key(self.get_pipeline(), img, [1, 2]), cache.key(self.get_pipeline(), img, [1, 2]))
+        self.assertNotEqual(cache.key(self.get_pipeline(), img, [1, 2]), cache.key(self.get_pipeline(), img, [2, 1]))
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase
+from src.profiling import Profiler, STAGE, summarize, format_summary
+
+
+class ProfilingTest(TestCase):
+
+    def test_spans(self):
+        profiler = Profiler()
+        with profiler.span('outer', args={'path': 'a.png'}):
+            with profiler.span('inner', 'algorithm'):
+                time.sleep(0.01)
+        with self.assertRaises(ValueError):
+            with profiler.span('failing'):
+                raise ValueError()
+
+        events = profiler.get_events()
+        self.assertEqual(['outer', 'inner', 'failing'], [event['name'] for event in events])
+        self.assertGreaterEqual(events[0]['duration'], events[1]['duration'])
+        self.assertGreaterEqual(events[1]['duration'], 0.01)
+        self.assertEqual({'path': 'a.png'}, events[0]['args'])
+        self.assertEqual(['outer', 'failing'], [event['name'] for event in profiler.get_events(category=STAGE)])
+        self.assertEqual(['failing'], [event['name'] for event in profiler.get_events(since=events[2]['start'])])
+
+    def test_oldest_spans_are_dropped(self):
+        profiler = Profiler(max_events=2)
+        for name in 'abc':
+            profiler.add(name, STAGE, 0, 0)
+        self.assertEqual(['b', 'c'], [event['name'] for event in profiler.get_events()])
+
+    def test_summary(self):
+        profiler = Profiler()
+        profiler.add('decode', STAGE, 0, 0.5)
+        profiler.add('algorithm', STAGE, 1, 2)
+        profiler.add('decode', STAGE, 2, 0.25)
+
+        summary = summarize(profiler.get_events())
+        self.assertEqual([('decode', 0.75), ('algorithm', 2)], summary)
+        self.assertEqual('decode 750.0 ms, algorithm 2.00 s', format_summary(summary))
+
+    def test_chrome_trace(self):
+        profiler = Profiler()
+        profiler.add('algorithm', STAGE, 1.5, 0.25, {'algorithm': 'a'})
+        profiler.extend([{'name': 'RL iteration', 'category': 'algorithm', 'start': 1.6, 'duration': 0.1,
+                          'pid': 1, 'tid': 2, 'args': {'iteration': 1}}])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            profiler.save_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+
+        events = trace['traceEvents']
+        self.assertEqual(2, len(events))
+        self.assertEqual({'name': 'algorithm', 'cat': STAGE, 'ph': 'X', 'ts': 1.5e6, 'dur': 0.25e6,
+                          'pid': os.getpid(), 'tid': events[0]['tid'], 'args': {'algorithm': 'a'}}, events[0])
+        self.assertEqual((1, 2), (events[1]['pid'], events[1]['tid']))
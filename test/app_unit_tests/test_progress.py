@@ -0,0 +1,36 @@
+from unittest import TestCase
+from src.progress import ProgressToken, Cancelled
+
+
+class ProgressTokenTest(TestCase):
+
+    def test_fraction(self):
+        progress = ProgressToken()
+        self.assertIsNone(progress.fraction())
+
+        progress.update(1, 4)
+        self.assertEqual(0.25, progress.fraction())
+        progress.update(2)
+        self.assertEqual(0.5, progress.fraction())
+
+    def test_stopped_early(self):
+        progress = ProgressToken()
+        self.assertIsNone(progress.stopped_early())
+
+        progress.update(20, 20)
+        self.assertIsNone(progress.stopped_early())
+        progress.update(12, 20)
+        self.assertEqual('stopped after 12 of 20 iterations', progress.stopped_early())
+        progress.cancel()
+        self.assertIsNone(progress.stopped_early())
+
+    def test_cancel(self):
+        progress = ProgressToken()
+        progress.check()
+        progress.cancel()
+
+        with self.assertRaises(Cancelled):
+            progress.check()
+        with self.assertRaises(Cancelled):
+            progress.update(3, 4)
+        self.assertEqual(3, progress.done)
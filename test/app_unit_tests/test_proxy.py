@@ -0,0 +1,32 @@
+from unittest import TestCase
+import numpy as np
+from src.proxy import make_proxy, scale_psf, get_proxy_parameters
+from src.helpers import ParamType
+
+
+class ProxyTest(TestCase):
+
+    def test_make_proxy(self):
+        img = np.zeros((3000, 4000, 3), dtype=np.uint8)
+        proxy, scale = make_proxy(img, 400)
+
+        self.assertEqual((300, 400, 3), proxy.shape)
+        self.assertEqual(0.1, scale)
+
+        small = np.zeros((30, 40), dtype=np.uint8)
+        self.assertIs(small, make_proxy(small, 400)[0])
+
+    def test_scale_psf(self):
+        psf = np.ones((15, 15)) / 225
+        for scale, size in ((0.5, 7), (0.25, 3), (0.01, 1), (1.0, 15)):
+            scaled = scale_psf(psf, scale)
+            self.assertEqual((size, size), scaled.shape)
+            self.assertAlmostEqual(1.0, scaled.sum())
+
+    def test_only_marked_parameters_are_scaled(self):
+        algorithm = {'params': [{'name': 'PSF', 'type': ParamType.NPARRAY, 'proxy': 'psf'},
+                                {'name': 'kernel', 'type': ParamType.NPARRAY}]}
+        psf, kernel = get_proxy_parameters(algorithm, [np.ones((9, 9)) / 81, np.ones((9, 9))], 0.5)
+
+        self.assertEqual((5, 5), psf.shape)
+        self.assertEqual((9, 9), kernel.shape)
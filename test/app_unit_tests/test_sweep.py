@@ -0,0 +1,53 @@
+from unittest import TestCase
+import numpy as np
+from src.sweep import run_sweep
+from src.progress import ProgressToken, Cancelled
+from src.helpers import ParamType, evaluate_sweep_values
+from algorithms.test_algorithms import test2_sweep, test2_values
+
+
+class SweepTest(TestCase):
+
+    # region helpers
+    def get_algorithm(self, sweep=True):
+        return {
+            'name': 'name',
+            'method': test2_values,
+            'params': [{'name': 'x1', 'type': ParamType.INT}, {'name': 'x2', 'type': ParamType.INT}],
+            'sweep': {'method': test2_sweep, 'param': 1} if sweep else None
+        }
+    # endregion
+
+    def test_sweep_values(self):
+        self.assertEqual([0.5, 1.0], evaluate_sweep_values(ParamType.FLOAT, 'np.linspace(0.5, 1, 2)'))
+        self.assertEqual([1, 2, 3], evaluate_sweep_values(ParamType.INT, 'range(1, 4)'))
+        self.assertEqual([7], evaluate_sweep_values(ParamType.INT, '7'))
+        self.assertEqual([None], evaluate_sweep_values(ParamType.INT, None))
+
+        arrays = evaluate_sweep_values(ParamType.NPARRAY, '[1, 2, 3]')
+        self.assertEqual(1, len(arrays))
+        self.assertEqual((3,), arrays[0].shape)
+
+    def test_grid(self):
+        for sweep in (True, False):
+            grid = run_sweep(self.get_algorithm(sweep), None, [[1, 2], [10, 20, 30]])
+
+            self.assertEqual((2, 3), grid.shape)
+            for (i, j), result in np.ndenumerate(grid):
+                self.assertEqual([1, 2][i] + [10, 20, 30][j], result[0, 0])
+
+    def test_single_value_of_swept_parameter(self):
+        grid = run_sweep(self.get_algorithm(), None, [[1, 2, 3], [10]])
+
+        self.assertEqual((3, 1), grid.shape)
+        self.assertEqual(13, grid[2, 0][0, 0])
+
+    def test_progress_and_cancellation(self):
+        for sweep in (True, False):
+            progress = ProgressToken()
+            run_sweep(self.get_algorithm(sweep), None, [[1, 2], [10, 20, 30]], progress=progress)
+            self.assertEqual((6, 6), (progress.done, progress.total))
+
+            progress.cancel()
+            with self.assertRaises(Cancelled):
+                run_sweep(self.get_algorithm(sweep), None, [[1, 2], [10, 20, 30]], progress=progress)
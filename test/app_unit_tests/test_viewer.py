@@ -0,0 +1,84 @@
+from unittest import TestCase
+import numpy as np
+from src.viewer import ImagePyramid, TileCache, PyramidView
+
+
+class FakeCanvas:
+    # records the tiles a view draws
+    def __init__(self):
+        self.images = []
+
+    def delete(self, tag):
+        self.images = []
+
+    def create_image(self, x, y, anchor, image, tags):
+        self.images.append(((x, y), image))
+
+    def tag_lower(self, tag):
+        pass
+
+
+class ViewerTest(TestCase):
+
+    def test_levels_are_built_lazily(self):
+        pyramid = ImagePyramid(np.zeros((1000, 3000, 3), dtype=np.float32), tile_size=256)
+
+        self.assertEqual(1, len(pyramid.levels))
+        self.assertEqual(5, pyramid.level_count)
+        self.assertEqual((250, 750, 3), pyramid.level(2).shape)
+        self.assertEqual(np.uint8, pyramid.level(2).dtype)
+        self.assertEqual(3, len(pyramid.levels))
+
+        self.assertEqual(0, pyramid.level_for_zoom(2))
+        self.assertEqual(1, pyramid.level_for_zoom(0.4))
+        self.assertEqual(4, pyramid.level_for_zoom(0.001))
+
+    def test_visible_tiles(self):
+        pyramid = ImagePyramid(np.zeros((1000, 1000), dtype=np.uint8), tile_size=100)
+
+        level, tiles = pyramid.visible_tiles(1, (500, 500), (200, 200))
+        self.assertEqual(0, level)
+        self.assertEqual([(4, 4), (4, 5), (5, 4), (5, 5)], [(row, column) for row, column, _ in tiles])
+        self.assertEqual((0, 0, 100, 100), tiles[0][2])
+
+        # the whole image fitted in the canvas, from the level matching the zoom
+        level, tiles = pyramid.visible_tiles(0.2, (500, 500), (200, 200))
+        self.assertEqual(2, level)
+        self.assertEqual(9, len(tiles))
+        self.assertEqual((0, 0), tiles[0][2][:2])
+        self.assertEqual((200, 200), tiles[-1][2][2:])
+
+    def test_tile_cache_evicts_least_recently_used(self):
+        cache = TileCache(max_tiles=2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 3)
+        cache.get('c', lambda: 4)
+
+        self.assertEqual(1, cache.get('a', lambda: 5))
+        self.assertEqual(6, cache.get('b', lambda: 6))
+
+    def test_linked_views_stay_aligned(self):
+        conversions = []
+
+        def make_photo(tile):
+            conversions.append(tile.shape)
+            return tile
+
+        full = PyramidView(FakeCanvas(), (200, 200), make_photo, tile_size=100)
+        proxy = PyramidView(FakeCanvas(), (200, 200), make_photo, tile_size=100)
+        full.link(proxy)
+
+        full.set_image(np.zeros((1000, 1000), dtype=np.uint8))
+        proxy.set_image(np.zeros((100, 100), dtype=np.uint8))
+        self.assertAlmostEqual(0.2, full.zoom)
+        self.assertAlmostEqual(2, proxy.zoom)
+
+        full.zoom_at(True, 0, 0)
+        self.assertAlmostEqual(full.zoom * 10, proxy.zoom)
+        np.testing.assert_allclose(np.divide(full.center, 10), proxy.center)
+
+        converted = len(conversions)
+        full.render()
+        self.assertEqual(converted, len(conversions))
+        self.assertTrue(len(full.canvas.images) > 0)
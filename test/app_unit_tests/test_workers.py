@@ -0,0 +1,135 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase
+import numpy as np
+from src.workers import WorkerPool, WorkerError
+from src.progress import ProgressToken, Cancelled
+from src.profiling import Profiler
+
+MODULE = 'algorithms.test_algorithms'
+
+
+class WorkerPoolTest(TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool([MODULE])
+        self.img = np.arange(12, dtype=np.uint16).reshape((3, 4))
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_result_and_reporting(self):
+        previews = []
+        progress = ProgressToken()
+        result = self.pool.run(MODULE, 'test_reporting', self.img, [3], progress=progress,
+                               preview=lambda image, i: previews.append((image, i)))
+
+        np.testing.assert_array_equal(self.img + 3, result)
+        self.assertEqual(np.uint16, result.dtype)
+        self.assertEqual((3, 3), (progress.done, progress.total))
+        self.assertEqual([0, 1, 2], [i for _, i in previews])
+        np.testing.assert_array_equal(self.img + 2, previews[-1][0])
+
+    def test_builtin_method(self):
+        # builtins have no signature, they get no progress or profiler
+        pool = WorkerPool(['cv2'])
+        try:
+            img = np.arange(16, dtype=np.uint8).reshape((4, 4))
+            result = pool.run('cv2', 'filter2D', img, [-1, np.ones((1, 1))], progress=ProgressToken(),
+                              profiler=Profiler())
+        finally:
+            pool.close()
+        np.testing.assert_array_equal(img, result)
+
+    def test_spans_of_the_worker(self):
+        profiler = Profiler()
+        self.pool.run(MODULE, 'test_reporting', self.img, [2], profiler=profiler)
+
+        events = profiler.get_events()
+        self.assertEqual(['test_reporting', 'step', 'step'], [event['name'] for event in events])
+        self.assertNotEqual(os.getpid(), events[0]['pid'])
+        self.assertEqual({'step': 1}, events[2]['args'])
+
+    def test_peak_memory_of_the_worker(self):
+        memory = {}
+        self.pool.run(MODULE, 'test_reporting', np.zeros((1000, 1000)), [1], memory=memory)
+        self.assertGreaterEqual(memory['peak_traced'], 8 * 10 ** 6)
+
+    def test_input_is_shared_once(self):
+        self.pool.run(MODULE, 'test_reporting', self.img, [1])
+        descriptor = self.pool.input['descriptor']
+        self.pool.run(MODULE, 'test_reporting', self.img, [2])
+        self.assertEqual(descriptor, self.pool.input['descriptor'])
+
+        other = self.img.copy()
+        np.testing.assert_array_equal(other + 1, self.pool.run(MODULE, 'test_reporting', other, [1]))
+        self.assertNotEqual(descriptor, self.pool.input['descriptor'])
+
+    def test_errors_keep_the_pool_usable(self):
+        with self.assertRaises(WorkerError) as context:
+            self.pool.run(MODULE, 'test4', self.img, [])
+        self.assertTrue('ValueError' in str(context.exception))
+
+        with self.assertRaises(WorkerError) as context:
+            self.pool.run(MODULE, 'test_exit', self.img, [])
+        self.assertTrue('crashed with exit code 3' in str(context.exception))
+
+        np.testing.assert_array_equal(self.img + 1, self.pool.run(MODULE, 'test_reporting', self.img, [1]))
+
+    def test_cancel_terminates_worker(self):
+        progress = ProgressToken()
+        threading.Timer(0.2, progress.cancel).start()
+        start = time.monotonic()
+
+        with self.assertRaises(Cancelled):
+            self.pool.run(MODULE, 'test_sleeping', self.img, [30], progress=progress)
+        self.assertLess(time.monotonic() - start, 5)
+
+        np.testing.assert_array_equal(self.img + 1, self.pool.run(MODULE, 'test_reporting', self.img, [1]))
+
+    def test_cancel_with_grace_keeps_worker(self):
+        pid = self.pool.idle.queue[0][1].pid
+        progress = ProgressToken()
+        threading.Timer(0.2, progress.cancel).start()
+        start = time.monotonic()
+
+        with self.assertRaises(Cancelled):
+            self.pool.run(MODULE, 'test_reporting_slowly', self.img, [30], progress=progress, grace=2)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(pid, self.pool.idle.queue[0][1].pid)
+
+        np.testing.assert_array_equal(self.img + 1, self.pool.run(MODULE, 'test_reporting', self.img, [1]))
+
+    def test_cancel_kills_processes_of_the_worker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pid')
+            progress = ProgressToken()
+
+            def cancel_once_started():
+                while not os.path.exists(path) or not os.path.getsize(path):
+                    time.sleep(0.05)
+                progress.cancel()
+            threading.Thread(target=cancel_once_started, daemon=True).start()
+
+            with self.assertRaises(Cancelled):
+                self.pool.run(MODULE, 'test_child_process', self.img, [path], progress=progress)
+            with open(path) as f:
+                pid = int(f.read())
+
+        # the killed child may be left as a zombie until it is reaped
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                state = f.read().rsplit(')', 1)[1].split()[0]
+        except FileNotFoundError:
+            state = None
+        if state is not None and os.path.exists('/proc/self/stat'):
+            self.assertEqual('Z', state)
+
+    def test_pool_not_closed_does_not_block_exit(self):
+        code = f"from src.workers import WorkerPool; pool = WorkerPool(['{MODULE}'])"
+        process = subprocess.run([sys.executable, '-c', code], timeout=60)
+        self.assertEqual(0, process.returncode)